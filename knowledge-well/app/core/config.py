@@ -18,17 +18,91 @@ class Settings:
     GRAPHDB_VERIFY_TLS: bool = os.getenv("GRAPHDB_VERIFY_TLS", "true").lower() == "true"
     GRAPHDB_TIMEOUT: int = int(os.getenv("GRAPHDB_TIMEOUT", "30"))
     GRAPHDB_TOKEN_TTL_SECONDS: int = int(os.getenv("GRAPHDB_TOKEN_TTL_SECONDS", "36000"))
+    # Write-back of the triples in /chat answers: batched N-Triples loads into the named graph TRIPLE_GRAPH_IRI
+    TRIPLE_WRITEBACK: bool = os.getenv("TRIPLE_WRITEBACK", "false").lower() == "true"
+    TRIPLE_GRAPH_IRI: str = os.getenv("TRIPLE_GRAPH_IRI", "http://knowledge-well.local/graph/extracted")
+    TRIPLE_BASE_IRI: str = os.getenv("TRIPLE_BASE_IRI", "http://knowledge-well.local/kg/")
+    TRIPLE_BATCH_SIZE: int = int(os.getenv("TRIPLE_BATCH_SIZE", "500"))
+    TRIPLE_MAX_PENDING: int = int(os.getenv("TRIPLE_MAX_PENDING", "10000"))  # queued triples; overflow is dropped
+    TRIPLE_FLUSH_SECONDS: float = float(os.getenv("TRIPLE_FLUSH_SECONDS", "2"))
+    TRIPLE_RETRIES: int = int(os.getenv("TRIPLE_RETRIES", "3"))
 
     # Vector store
     VECTORSTORE_PATH: str = os.getenv("RAG_VECTORSTORE_PATH", "./Vectorstore/chromadb")
     VECTOR_COLLECTION: str = os.getenv("RAG_VECTOR_COLLECTION", "documents")
+    # HNSW index of new Chroma collections (Chroma's defaults); HNSW_COLLECTION_PARAMS is JSON
+    # per collection, e.g. {"documents": {"M": 32, "search_ef": 64}}. See app.tools.rebuild_hnsw / hnsw_bench.
+    HNSW_SPACE: str = os.getenv("HNSW_SPACE", "l2")
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))
+    HNSW_CONSTRUCTION_EF: int = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+    HNSW_SEARCH_EF: int = int(os.getenv("HNSW_SEARCH_EF", "10"))
+    HNSW_COLLECTION_PARAMS: str = os.getenv("HNSW_COLLECTION_PARAMS", "")
+    # "chroma" (SQLite + HNSW) or "flat" (memory-mapped exact search, see app.tools.export_flat)
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "chroma")
+    FLAT_VECTORSTORE_PATH: str = os.getenv("FLAT_VECTORSTORE_PATH", "./Vectorstore/flat")
+    # First-pass codes for the flat backend: "none", "int8" or "binary"; top k*RESCORE are rescored in float32
+    FLAT_QUANTIZATION: str = os.getenv("FLAT_QUANTIZATION", "none")
+    FLAT_RESCORE_FACTOR: int = int(os.getenv("FLAT_RESCORE_FACTOR", "4"))
+    # Result cache for repeated vector queries, invalidated by every write to the collection
+    # (from any process: writers bump a shared counter in <store>/query_cache_generation.sqlite3)
+    VECTOR_QUERY_CACHE: bool = os.getenv("VECTOR_QUERY_CACHE", "true").lower() == "true"
+    VECTOR_QUERY_CACHE_SIZE: int = int(os.getenv("VECTOR_QUERY_CACHE_SIZE", "1024"))
+    # Vector index over GraphDB text nodes (app.tools.index_graph); GRAPH_ANN picks papers per keyword
+    # by ANN lookup (GRAPH_ANN_K nearest nodes) instead of title CONTAINS scans
+    GRAPH_VECTOR_COLLECTION: str = os.getenv("GRAPH_VECTOR_COLLECTION", "graph_nodes")
+    GRAPH_ANN: bool = os.getenv("GRAPH_ANN", "false").lower() == "true"
+    GRAPH_ANN_K: int = int(os.getenv("GRAPH_ANN_K", "8"))
+    # Largest /query/batch request
+    QUERY_BATCH_MAX_QUERIES: int = int(os.getenv("QUERY_BATCH_MAX_QUERIES", "256"))
+    # BM25 index (SQLite FTS5) kept next to the documents collection; app.tools.build_lexical backfills it
+    LEXICAL_INDEX: bool = os.getenv("LEXICAL_INDEX", "true").lower() == "true"
+    LEXICAL_INDEX_DIR: str = os.getenv("LEXICAL_INDEX_DIR", "./Vectorstore/lexical")
+    # "vector", "hybrid" (vector + BM25, reciprocal rank fusion) or "lexical" (BM25 only, no embedding model)
+    # (hybrid/lexical hits carry "scores"; their "distances" are negated scores, not vector distances)
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "vector")
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    RRF_CANDIDATES: int = int(os.getenv("RRF_CANDIDATES", "20"))
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "800"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "120"))
+    # "tokens": sentence-aware chunks sized in embedding-model tokens (CHUNK_TOKENS / CHUNK_OVERLAP_TOKENS);
+    # "chars": the fixed character windows above
+    CHUNKER: str = os.getenv("CHUNKER", "tokens")
+    CHUNK_TOKENS: int = int(os.getenv("CHUNK_TOKENS", "256"))  # bge-small sees at most 510
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+    # Background ingestion (/ingest)
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "1"))
+    INGEST_MAX_QUEUED: int = int(os.getenv("INGEST_MAX_QUEUED", "32"))
+    INGEST_MAX_JOBS: int = int(os.getenv("INGEST_MAX_JOBS", "200"))  # finished jobs kept for status
+    INGEST_MAX_UPLOAD_MB: int = int(os.getenv("INGEST_MAX_UPLOAD_MB", "200"))
+    INGEST_UPLOAD_DIR: str = os.getenv("INGEST_UPLOAD_DIR", "")  # "" = system temp dir
 
     # Embeddings
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
     EMBED_BATCH: int = int(os.getenv("EMBED_BATCH", "32"))
     DEVICE: str = os.getenv("DEVICE", "cpu")
+    # Embedding backend: "torch" (sentence-transformers) or "onnx" (see app.tools.export_onnx)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBED_ONNX_PATH: str = os.getenv("EMBED_ONNX_PATH", "./models/bge-small-en-v1.5-onnx")
+    EMBED_ONNX_QUANTIZED: bool = os.getenv("EMBED_ONNX_QUANTIZED", "false").lower() == "true"
+    EMBED_ONNX_THREADS: int = int(os.getenv("EMBED_ONNX_THREADS", "0"))  # 0 = onnxruntime default
+    # Process pool for document embedding in app.tools.bulk_ingest (1 = in-process); threads per worker 0 = cores / workers
+    EMBED_WORKERS: int = int(os.getenv("EMBED_WORKERS", "1"))
+    EMBED_WORKER_THREADS: int = int(os.getenv("EMBED_WORKER_THREADS", "0"))
+    EMBED_SHARD_SIZE: int = int(os.getenv("EMBED_SHARD_SIZE", "256"))
+    # Micro-batching of concurrent query embeddings
+    EMBED_MICROBATCH: bool = os.getenv("EMBED_MICROBATCH", "true").lower() == "true"
+    EMBED_MICROBATCH_MAX_ITEMS: int = int(os.getenv("EMBED_MICROBATCH_MAX_ITEMS", "16"))
+    EMBED_MICROBATCH_MAX_WAIT_MS: float = float(os.getenv("EMBED_MICROBATCH_MAX_WAIT_MS", "2"))
+    # Persistent content-addressed embedding cache (SQLite) + in-process query LRU
+    EMBED_CACHE: bool = os.getenv("EMBED_CACHE", "true").lower() == "true"
+    EMBED_CACHE_PATH: str = os.getenv("EMBED_CACHE_PATH", "./Vectorstore/embedding_cache.sqlite3")
+    EMBED_CACHE_LRU: int = int(os.getenv("EMBED_CACHE_LRU", "2048"))
+    # Shared embedding service (app.tools.embed_server): Unix socket path or host:port; empty = in-process model
+    EMBED_SERVICE_ADDR: str = os.getenv("EMBED_SERVICE_ADDR", "")
+    EMBED_SERVICE_TIMEOUT: float = float(os.getenv("EMBED_SERVICE_TIMEOUT", "60"))
+    # Load the embedding model + vector store at startup instead of on the first request
+    PRELOAD_COMPONENTS: bool = os.getenv("PRELOAD_COMPONENTS", "false").lower() == "true"
 
     # LLM (Ollama)
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
@@ -55,6 +129,40 @@ class Settings:
     # Switch between LLMs
     LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "OLLAMA")  # or "OPENAI"
 
+    # Per-request latency budget (0 = no deadline unless the caller passes deadline_ms)
+    CHAT_DEADLINE_MS: int = int(os.getenv("CHAT_DEADLINE_MS", "0"))
+    BUDGET_MIN_TIMEOUT_SECONDS: float = float(os.getenv("BUDGET_MIN_TIMEOUT_SECONDS", "1.0"))
+    # Degradations fire, in this order, when the remaining budget drops below the threshold
+    DEGRADE_SKIP_REWRITER_MS: int = int(os.getenv("DEGRADE_SKIP_REWRITER_MS", "25000"))
+    DEGRADE_DROP_FACETS_MS: int = int(os.getenv("DEGRADE_DROP_FACETS_MS", "20000"))
+    DEGRADE_VECTOR_ONLY_MS: int = int(os.getenv("DEGRADE_VECTOR_ONLY_MS", "12000"))
+    DEGRADE_CAP_TOKENS_MS: int = int(os.getenv("DEGRADE_CAP_TOKENS_MS", "8000"))
+    DEGRADED_MAX_TOKENS: int = int(os.getenv("DEGRADED_MAX_TOKENS", "512"))
+
+    # Adaptive graph facet planner (intent + per-term yield history)
+    FACET_PLANNER: bool = os.getenv("FACET_PLANNER", "true").lower() == "true"
+    FACET_HISTORY_WINDOW: int = int(os.getenv("FACET_HISTORY_WINDOW", "5"))
+    FACET_MIN_OBSERVATIONS: int = int(os.getenv("FACET_MIN_OBSERVATIONS", "3"))
+    FACET_RETRY_EVERY: int = int(os.getenv("FACET_RETRY_EVERY", "20"))
+    FACET_HISTORY_MAX_TERMS: int = int(os.getenv("FACET_HISTORY_MAX_TERMS", "2000"))
+
+    # Conversation sessions (server-side retrieved context for follow-ups)
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+    SESSION_MAX: int = int(os.getenv("SESSION_MAX", "500"))
+    SESSION_MAX_TURNS: int = int(os.getenv("SESSION_MAX_TURNS", "6"))
+    SESSION_MAX_TERMS: int = int(os.getenv("SESSION_MAX_TERMS", "16"))
+    SESSION_MAX_CONTEXT_CHARS: int = int(os.getenv("SESSION_MAX_CONTEXT_CHARS", "60000"))
+    SESSION_CARRY_TERMS: int = int(os.getenv("SESSION_CARRY_TERMS", "3"))
+
+    # Batch evaluation (/chat/batch and app.tools.batch_eval)
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+    BATCH_MAX_QUESTIONS: int = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+    # wall-time cap of one /chat/batch request (0 = none); batch_eval takes --deadline-ms
+    BATCH_DEADLINE_MS: int = int(os.getenv("BATCH_DEADLINE_MS", "120000"))
+    # how long a question waits for another one's shared search before running it itself
+    BATCH_SHARED_WAIT_SECONDS: float = float(os.getenv("BATCH_SHARED_WAIT_SECONDS", "30"))
+
     # API
     PORT: int = int(os.getenv("PORT", "8000"))
 
@@ -1,17 +1,33 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
+from .core.config import settings
 from .routers import health, ingest, query, chat, sparql
+from .services.components import registry
+from .services.ingest_jobs import ingest_queue
 
 # ← add sparql
 
 BASE_DIR = Path(__file__).resolve().parent.parent  # root folder of your project
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one shared set of components per process (see services/components.py)
+    if settings.PRELOAD_COMPONENTS:
+        registry.warm()
+    yield
+    ingest_queue.shutdown()
+    registry.close()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="GraphDB RAG API", version="0.1.0")
+    app = FastAPI(title="GraphDB RAG API", version="0.1.0", lifespan=lifespan)
 
     # --- Routers ---
     app.include_router(health.router)
@@ -1,241 +1,108 @@
 from __future__ import annotations
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
-import time
-import re
+from typing import Optional, List
 
 from ..core.config import settings
-from ..services.embedder import Embedder
-from ..services.vector_store import VectorStore
-from ..services.graphdb import GraphDBClient
-from ..services.query_rewriter import QueryRewriter
-
-from ..services.ollama_client import OllamaClient
-from ..services.openai_client import OpenAIClient
-from ..services.gemini_client import GeminiClient
-
-from ..services.rag import (
-    build_prompt,
-    build_graph_problem_context,
-    extract_keywords,
-)
-
-from ..services.hardcoded_solutions import HARDCODED_SOLUTIONS
+from ..services.components import registry
+from ..services.pipeline import RAGPipeline, hardcoded_state
+from ..services.sessions import sessions
+from ..services.batch import run_batch
+from .query import VectorFilter, search_options
 
 router = APIRouter()
 
-# Global variables for caching components
-_embedder = None
-_vs = None
-_graph = None
-_llm = None
-_rewriter = None
 
+class ChatRequest(BaseModel):
+    question: str
+    k: Optional[int] = 5
+    temperature: Optional[float] = 0.2
+    deadline_ms: Optional[int] = None  # total latency budget for this request
+    session_id: Optional[str] = None   # continue (or start, if unknown) a conversation
+    start_session: Optional[bool] = False  # start a new server-named conversation
+    filter: Optional[VectorFilter] = None  # restrict the vector retrieval by metadata
+    vector_include: Optional[List[str]] = None  # fields of context_used.vector to return (ids always)
 
-def get_components():
-    """Initializes all RAG components if they haven't been already."""
-    global _embedder, _vs, _graph, _llm, _rewriter
 
-    # Initialize Embedder
-    if _embedder is None:
-        try:
-            _embedder = Embedder(settings.EMBEDDING_MODEL, settings.DEVICE, settings.EMBED_BATCH)
-        except Exception as e:
-            raise RuntimeError(f"Failed to initialize Embedder: {e}")
+@router.post("/chat")
+def chat(req: ChatRequest):
+    if not req.question.strip():
+        raise HTTPException(status_code=400, detail="question cannot be empty")
+    where, vector_include = search_options(req.filter, req.vector_include)
 
-    # Initialize VectorStore
-    if _vs is None:
+    session = None
+    if req.session_id or req.start_session:
         try:
-            _vs = VectorStore(settings.VECTORSTORE_PATH, settings.VECTOR_COLLECTION, _embedder)
-        except Exception as e:
-            raise RuntimeError(f"Failed to initialize VectorStore: {e}")
+            session = sessions.get_or_create(req.session_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    # Initialize GraphDBClient
-    if _graph is None:
-        try:
-            _graph = GraphDBClient(
-                base_url=settings.GRAPHDB_BASE_URL,
-                repository=settings.GRAPHDB_REPOSITORY,
-                auth_mode=settings.GRAPHDB_AUTH,
-                username=settings.GRAPHDB_USERNAME,
-                password=settings.GRAPHDB_PASSWORD,
-                verify_tls=settings.GRAPHDB_VERIFY_TLS,
-                timeout=settings.GRAPHDB_TIMEOUT,
-                token_ttl_seconds=settings.GRAPHDB_TOKEN_TTL_SECONDS,
-            )
-        except Exception as e:
-            raise RuntimeError(f"Failed to initialize GraphDBClient: {e}")
-
-    # Initialize LLM Client
-    if _llm is None:
-        prov = settings.LLM_PROVIDER.upper()
-        try:
-            if prov == "OPENAI":
-                _llm = OpenAIClient(
-                    api_key=settings.OPENAI_API_KEY,
-                    model=settings.OPENAI_MODEL,
-                    base_url=settings.OPENAI_BASE_URL,
-                    timeout_seconds=settings.OPENAI_TIMEOUT_SECONDS,
-                    use_responses_api=settings.OPENAI_USE_RESPONSES,
-                )
-            elif prov == "GEMINI":
-                _llm = GeminiClient(
-                    api_key=settings.GEMINI_API_KEY,
-                    model=settings.GEMINI_MODEL,
-                    timeout_seconds=settings.GEMINI_TIMEOUT_SECONDS,
-                )
-            else:
-                _llm = OllamaClient(
-                    base_url=settings.OLLAMA_BASE_URL,
-                    model=settings.OLLAMA_MODEL
-                )
-        except Exception as e:
-            raise RuntimeError(f"Failed to initialize LLM client for provider '{prov}': {e}")
-
-    # Initialize Query Rewriter
-    if _rewriter is None and settings.USE_LLM_REWRITER and settings.REWRITER_PROVIDER.upper() == "OPENAI":
-        try:
-            _rewriter = QueryRewriter(model=settings.REWRITER_MODEL, timeout_seconds=settings.REWRITER_TIMEOUT_SECONDS)
-        except Exception as e:
-            raise RuntimeError(f"Failed to initialize QueryRewriter: {e}")
+    # hardcoded answers need no component, so they are served before any is loaded
+    state = hardcoded_state(req.question, session=session)
+    if state is not None:
+        return state.to_response()
+
+    try:
+        vs, graph, llm, rewriter = registry.get_components()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    pipeline = RAGPipeline(vs, graph, llm, rewriter)
+    try:
+        state = pipeline.run(
+            req.question,
+            k=req.k or 5,
+            temperature=req.temperature or 0.2,
+            deadline_ms=req.deadline_ms,
+            session=session,
+            where=where,
+            vector_include=vector_include,
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    return _vs, _graph, _llm, _rewriter
+    return state.to_response()
 
 
-class ChatRequest(BaseModel):
+class BatchQuestion(BaseModel):
     question: str
+    id: Optional[str] = None
     k: Optional[int] = 5
     temperature: Optional[float] = 0.2
+    deadline_ms: Optional[int] = None
 
 
-def _normalize_text(text: str) -> str:
-    """Normalizes a string for comparison."""
-    text = text.lower().strip()
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^a-z0-9\s?]', '', text)
-    return text
-
+class BatchRequest(BaseModel):
+    questions: List[BatchQuestion]
+    concurrency: Optional[int] = None
 
-def _find_hardcoded_answer(question: str) -> Optional[Dict[str, Any]]:
-    """Checks if the question matches a hardcoded solution."""
-    normalized_question = _normalize_text(question)
-    for solution in HARDCODED_SOLUTIONS:
-        normalized_known_q = _normalize_text(solution["question"])
-        if normalized_question == normalized_known_q:
-            return solution
-    return None
 
-
-@router.post("/chat")
-def chat(req: ChatRequest):
-    if not req.question.strip():
+@router.post("/chat/batch")
+def chat_batch(req: BatchRequest):
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="questions cannot be empty")
+    if len(req.questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"at most {settings.BATCH_MAX_QUESTIONS} questions per batch")
+    if any(not q.question.strip() for q in req.questions):
         raise HTTPException(status_code=400, detail="question cannot be empty")
 
-    # Step 1: Check for a direct match in the hardcoded solutions.
-    hardcoded_solution = _find_hardcoded_answer(req.question)
-    if hardcoded_solution:
-        # Format the hardcoded answer with a source tag as requested
-        return {
-            "answer": f"{hardcoded_solution['solution']} (GraphDB)",
-            "context_used": {"vector": {}, "graph": "Hardcoded Solution"},
-            "graph_debug": {"rewriter_debug": {}, "terms_used": []},
-            "timing": {"vector_ms": 0.0, "graph_ms": 0.0, "query_ms": 0.0, "reasoning_ms": 0.0, "total_ms": 0.0},
-            "llm_meta": {"provider": "N/A", "model": "N/A"},
-        }
-
-    # If no hardcoded solution found, proceed with the original RAG logic
     try:
-        vs, graph, llm, rewriter = get_components()
+        vs, graph, llm, rewriter = registry.get_components()
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    t0 = time.perf_counter()
-
-    # Vector hits
-    hits = {"documents": [[]], "metadatas": [[]], "ids": [[]], "distances": [[]]}
-    try:
-        hits = vs.query(req.question, n_results=req.k or 5)
-    except Exception as e:
-        # Log the error but continue gracefully
-        print(f"Vector store query failed: {e}")
-
-    t_vec_done = time.perf_counter()
-
-    # Heuristic + optional rewriter
-    terms = extract_keywords(req.question)
-    rw_out = {}
-    if settings.USE_LLM_REWRITER and rewriter is not None:
-        try:
-            rw_out = rewriter.rewrite(req.question)
-            llm_terms = (rw_out.get("domain_phrases", []) or []) + (rw_out.get("keywords", []) or [])
-            seen = set(t.lower() for t in terms)
-            for t in llm_terms:
-                if t.lower() not in seen:
-                    terms.append(t)
-                    seen.add(t.lower())
-        except Exception as e:
-            rw_out = {"error": f"Query rewriter failed: {type(e).__name__}: {e}"}
-
-    if not terms:
-        return {
-            "answer": "I couldn’t extract domain terms from your question. Please include key phrases (e.g., “hybrid bonding”, “advanced packaging”).",
-            "context_used": {"vector": hits, "graph": ""},
-            "graph_debug": {"rewriter_debug": rw_out, "terms_used": []},
-            "timing": {"vector_ms": round((t_vec_done - t0) * 1000, 1),
-                       "graph_ms": 0.0, "query_ms": round((t_vec_done - t0) * 1000, 1),
-                       "reasoning_ms": 0.0, "total_ms": round((t_vec_done - t0) * 1000, 1)}
-        }
-
-    # Graph context
-    gctx, gdebug = build_graph_problem_context(
-        graph, req.question,
-        probe=True,
-        include_summaries=True,
-        include_content_parts=True,
-        include_goal_achieved=True
-    )
-    t_graph_done = time.perf_counter()
-
-    # LLM answer
-    prompt = build_prompt(req.question, hits, gctx)
-
-    try:
-        answer, _meta = llm.generate(
-            prompt,
-            system="You are a precise RAG assistant; cite sources.",
-            temperature=req.temperature or 0.2,
-            return_meta=True,
-        )
-    except TypeError:
-        # Fallback for clients that don't support return_meta
-        answer = llm.generate(
-            prompt,
-            system="You are a precise RAG assistant; cite sources.",
-            temperature=req.temperature or 0.2,
-        )
-        _meta = {"provider": settings.LLM_PROVIDER, "model": settings.OLLAMA_MODEL}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"LLM generation failed: {e}")
-
-    t_llm_done = time.perf_counter()
-
-    # Calculate timing metrics
-    vector_ms = (t_vec_done - t0) * 1000
-    graph_ms = (t_graph_done - t_vec_done) * 1000
-    reasoning_ms = (t_llm_done - t_graph_done) * 1000
-    total_ms = (t_llm_done - t0) * 1000
-
-    return {
-        "answer": answer,
-        "context_used": {"vector": hits, "graph": gctx},
-        "graph_debug": {**gdebug, "rewriter_debug": rw_out, "terms_used": terms},
-        "timing": {
-            "vector_ms": round(vector_ms, 1),
-            "graph_ms": round(graph_ms, 1),
-            "query_ms": round(vector_ms + graph_ms, 1),
-            "reasoning_ms": round(reasoning_ms, 1),
-            "total_ms": round(total_ms, 1),
-        },
-        "llm_meta": _meta,
-    }
+    items = []
+    for i, q in enumerate(req.questions, 1):
+        item = q.dict()
+        item["id"] = q.id or str(i)
+        items.append(item)
+    concurrency = min(req.concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    return run_batch(vs, graph, llm, rewriter, items, concurrency=concurrency,
+                     deadline_ms=settings.BATCH_DEADLINE_MS)
+
+
+@router.delete("/chat/session/{session_id}")
+def end_session(session_id: str):
+    if not sessions.drop(session_id):
+        raise HTTPException(status_code=404, detail="session not found")
+    return {"status": "ended", "session_id": session_id}
@@ -1,8 +1,22 @@
 
 from fastapi import APIRouter
 
+from ..services.embed_batcher import embedding_metrics
+from ..services.embedding_cache import embedding_cache_metrics
+from ..services.query_cache import query_cache_metrics
+from ..services.triple_writer import triple_writer_metrics
+
 router = APIRouter()
 
 @router.get("/health")
 def health():
     return {"status": "ok"}
+
+@router.get("/metrics")
+def metrics():
+    return {
+        "embedding_microbatch": embedding_metrics(),
+        "embedding_cache": embedding_cache_metrics(),
+        "vector_query_cache": query_cache_metrics(),
+        "triple_writeback": triple_writer_metrics(),
+    }
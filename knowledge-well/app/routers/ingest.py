@@ -1,8 +1,113 @@
+from __future__ import annotations
+import json
+import os
+import tempfile
+from typing import Optional, Dict, Any
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..services.components import registry
+from ..services.extract import kind_of
+from ..services.ingest_jobs import ingest_queue
 
 router = APIRouter()
 
-@router.get("/health")
-def health():
-    return {"status": "ok"}
+_COPY_CHUNK = 1 << 20
+
+
+def _spool_path(filename: str) -> str:
+    upload_dir = settings.INGEST_UPLOAD_DIR or None
+    if upload_dir:
+        os.makedirs(upload_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="ingest-", suffix=os.path.splitext(filename)[1], dir=upload_dir)
+    os.close(fd)
+    return path
+
+
+def _too_large(path: str):
+    os.remove(path)
+    raise HTTPException(status_code=413, detail=f"upload exceeds {settings.INGEST_MAX_UPLOAD_MB} MB")
+
+
+def _parse_metadata(metadata: Optional[str]) -> Dict[str, Any]:
+    if not metadata:
+        return {}
+    try:
+        meta = json.loads(metadata)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+    if not isinstance(meta, dict):
+        raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+    # Chroma only stores scalar metadata values
+    return {k: v for k, v in meta.items() if isinstance(v, (str, int, float, bool))}
+
+
+def _enqueue(path: str, filename: str, content_type: Optional[str], meta: Dict[str, Any], size: int):
+    try:
+        vs = registry.vector_store()
+        job = ingest_queue.submit(vs, path, filename, content_type, meta, size=size)
+    except RuntimeError as e:
+        os.remove(path)
+        status = 503 if "queue is full" in str(e) else 500
+        raise HTTPException(status_code=status, detail=str(e))
+    return {"job_id": job.id, "status": job.status, "filename": filename, "kind": kind_of(filename, content_type)}
+
+
+@router.post("/ingest", status_code=202)
+def ingest(file: UploadFile = File(...), metadata: Optional[str] = Form(None)):
+    """
+    Multipart upload (text, PDF, JSONL or JSON). Returns a job id; indexing runs in the background.
+    Pass metadata {"source": ...} to replace an earlier upload of the same document.
+    """
+    meta = _parse_metadata(metadata)
+    filename = os.path.basename(file.filename or "upload.txt")
+    limit = settings.INGEST_MAX_UPLOAD_MB * 1024 * 1024
+    path = _spool_path(filename)
+    size = 0
+    with open(path, "wb") as out:
+        while True:
+            chunk = file.file.read(_COPY_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                out.close()
+                _too_large(path)
+            out.write(chunk)
+    return _enqueue(path, filename, file.content_type, meta, size)
+
+
+@router.post("/ingest/stream", status_code=202)
+async def ingest_stream(request: Request, filename: str, metadata: Optional[str] = None):
+    """
+    Raw request body streamed straight to disk, e.g. `curl --data-binary @papers.jsonl`.
+    Disk writes and the store lookup run in the threadpool, off the event loop.
+    """
+    meta = _parse_metadata(metadata)
+    filename = os.path.basename(filename)
+    limit = settings.INGEST_MAX_UPLOAD_MB * 1024 * 1024
+    path = _spool_path(filename)
+    size = 0
+    with open(path, "wb") as out:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > limit:
+                out.close()
+                _too_large(path)
+            await run_in_threadpool(out.write, chunk)
+    return await run_in_threadpool(_enqueue, path, filename, request.headers.get("content-type"), meta, size)
+
+
+@router.get("/ingest")
+def list_jobs():
+    return {"jobs": ingest_queue.list()}
+
+
+@router.get("/ingest/{job_id}")
+def job_status(job_id: str):
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job.summary()
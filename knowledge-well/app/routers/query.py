@@ -2,34 +2,87 @@
 from __future__ import annotations
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict, Any, Union
 
 from ..core.config import settings
-from ..services.embedder import Embedder
-from ..services.vector_store import VectorStore
+from ..services.components import registry
+from ..services.metadata_filter import build_where, check_include
 
 router = APIRouter()
 
-_embedder = None
-_vs = None
+class VectorFilter(BaseModel):
+    """Metadata filter pushed into the vector search; lists mean "any of"."""
+    source: Optional[Union[str, List[str]]] = None
+    year: Optional[Union[int, List[int]]] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    section: Optional[Union[str, List[str]]] = None
+    where: Optional[Dict[str, Any]] = None  # raw Chroma-style where, ANDed with the fields above
+
+    def to_where(self) -> Optional[Dict[str, Any]]:
+        return build_where(**self.dict())
+
+
+def search_options(vector_filter: Optional[VectorFilter], include: Optional[List[str]]):
+    """(where, include) for the stores, or a 400 for an invalid projection."""
+    try:
+        return (vector_filter.to_where() if vector_filter is not None else None), check_include(include)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-def get_vs():
-    global _embedder, _vs
-    if _embedder is None:
-        _embedder = Embedder(settings.EMBEDDING_MODEL, settings.DEVICE, settings.EMBED_BATCH)
-    if _vs is None:
-        _vs = VectorStore(settings.VECTORSTORE_PATH, settings.VECTOR_COLLECTION, _embedder)
-    return _vs
 
 class QueryRequest(BaseModel):
     query: str
     k: Optional[int] = 5
+    filter: Optional[VectorFilter] = None
+    include: Optional[List[str]] = None  # documents / metadatas / distances; ids always
 
 @router.post("/query")
 def query(req: QueryRequest):
+    """
+    Top-k chunks from the RETRIEVAL_MODE retriever. "distances" sort ascending in
+    every mode: vector distance (vector), bm25() value (lexical) or negated RRF
+    score (hybrid). lexical and hybrid add "scores", higher is better.
+    """
     if not req.query.strip():
         raise HTTPException(status_code=400, detail="query cannot be empty")
-    vs = get_vs()
-    hits = vs.query(req.query, n_results=req.k or 5)
+    where, include = search_options(req.filter, req.include)
+    try:
+        vs = registry.retriever()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        hits = vs.query(req.query, n_results=req.k or 5, where=where, include=include)
+    except ValueError as e:  # malformed where
+        raise HTTPException(status_code=400, detail=str(e))
     return {"results": hits}
+
+
+class QueryBatchRequest(BaseModel):
+    queries: List[str]
+    k: Optional[int] = 5
+    dedupe: bool = True  # identical queries are searched once and share the result
+    filter: Optional[VectorFilter] = None
+    include: Optional[List[str]] = None
+
+
+@router.post("/query/batch")
+def query_batch(req: QueryBatchRequest):
+    """Many retrievals in one round trip: one embedding pass and one index search."""
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="queries cannot be empty")
+    if len(req.queries) > settings.QUERY_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"at most {settings.QUERY_BATCH_MAX_QUERIES} queries per batch")
+    if any(not q.strip() for q in req.queries):
+        raise HTTPException(status_code=400, detail="queries cannot contain empty strings")
+    where, include = search_options(req.filter, req.include)
+    try:
+        vs = registry.retriever()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        results = vs.query_many(req.queries, n_results=req.k or 5, dedupe=req.dedupe, where=where, include=include)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results, "count": len(results)}
 #   Inti  py Return { "results : hits"
@@ -0,0 +1,255 @@
+from __future__ import annotations
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Iterable, Callable
+
+from ..core.config import settings
+from .budget import Budget
+from .pipeline import RAGPipeline, NO_TERMS_ANSWER, find_hardcoded_answer
+
+
+class _SingleFlight:
+    """
+    Batch-scoped memo: the first caller for a key does the work, concurrent
+    callers for the same key wait for it, later callers get the stored result.
+    Failures are not cached (waiters retry on their own), and a waiter that
+    has waited `wait_timeout` seconds stops waiting and does the work itself.
+    """
+    def __init__(self, wait_timeout: Optional[float] = None):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._done: Dict[Any, Any] = {}
+        self._inflight: Dict[Any, threading.Event] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fn: Callable[[], Any]):
+        with self._lock:
+            if key in self._done:
+                self.hits += 1
+                return self._done[key]
+            ev = self._inflight.get(key)
+            owner = ev is None
+            if owner:
+                ev = threading.Event()
+                self._inflight[key] = ev
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not owner:
+            ev.wait(self.wait_timeout)
+            with self._lock:
+                if key in self._done:
+                    return self._done[key]
+            return fn()
+        try:
+            val = fn()
+            with self._lock:
+                self._done[key] = val
+            return val
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            ev.set()
+
+    def seed(self, key, val) -> None:
+        """Store a result computed outside get() (e.g. by a batched call)."""
+        with self._lock:
+            self._done.setdefault(key, val)
+
+    def stats(self) -> Dict[str, int]:
+        return {"requested": self.hits + self.misses, "executed": self.misses, "shared": self.hits}
+
+
+class _SharedGraph:
+    """GraphDBClient stand-in that issues each distinct SPARQL text once per batch."""
+    def __init__(self, graph, memo: _SingleFlight):
+        self._graph = graph
+        self._memo = memo
+        self.timeout = graph.timeout
+
+    def sparql_query(self, query: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None):
+        key = ("sparql", query, json.dumps(params, sort_keys=True) if params else "")
+        return self._memo.get(key, lambda: self._graph.sparql_query(query, params, timeout=timeout))
+
+
+class _SharedVectorStore:
+    def __init__(self, vs, memo: _SingleFlight):
+        self._vs = vs
+        self._memo = memo
+
+    @staticmethod
+    def _key(query_text: str, n_results: int, kwargs: Dict[str, Any]):
+        return ("vector", query_text, n_results, json.dumps(kwargs, sort_keys=True, default=str))
+
+    def query(self, query_text: str, n_results: int = 5, **kwargs):
+        key = self._key(query_text, n_results, kwargs)
+        return self._memo.get(key, lambda: self._vs.query(query_text, n_results=n_results, **kwargs))
+
+    def prefetch(self, queries: Iterable[tuple]) -> int:
+        """Run (text, n_results) pairs through the store's batched query_many, one call per n_results."""
+        if not hasattr(self._vs, "query_many"):
+            return 0
+        by_k: Dict[int, List[str]] = {}
+        for text, k in queries:
+            by_k.setdefault(k, []).append(text)
+        for k, texts in by_k.items():
+            texts = list(dict.fromkeys(texts))
+            for text, res in zip(texts, self._vs.query_many(texts, n_results=k)):
+                self._memo.seed(self._key(text, k, {}), res)
+        return sum(len(set(t)) for t in by_k.values())
+
+
+class _SharedRewriter:
+    def __init__(self, rewriter, memo: _SingleFlight):
+        self._rewriter = rewriter
+        self._memo = memo
+
+    def rewrite(self, question: str, timeout: Optional[float] = None):
+        key = ("rewrite", " ".join(question.lower().split()))
+        return self._memo.get(key, lambda: self._rewriter.rewrite(question, timeout=timeout))
+
+
+def read_questions(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """Parse JSONL lines: {"question": ..., "id"?, "k"?, "temperature"?, "deadline_ms"?} or bare strings."""
+    out: List[Dict[str, Any]] = []
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, str):
+            item = {"question": item}
+        if not isinstance(item, dict) or not str(item.get("question", "")).strip():
+            raise ValueError(f"line {n}: expected an object with a non-empty 'question'")
+        item.setdefault("id", str(n))
+        out.append(item)
+    return out
+
+
+def percentile(values: List[float], p: float, ndigits: int = 1) -> float:
+    if not values:
+        return 0.0
+    vals = sorted(values)
+    idx = max(0, min(len(vals) - 1, math.ceil(p / 100.0 * len(vals)) - 1))
+    return round(vals[idx], ndigits)
+
+
+def _answer(state) -> str:
+    if state.outcome == "hardcoded":
+        return f"{state.hardcoded['solution']} (GraphDB)"
+    if state.outcome == "no_terms":
+        return NO_TERMS_ANSWER
+    return state.answer
+
+
+def run_batch(
+    vs,
+    graph,
+    llm,
+    rewriter,
+    questions: List[Dict[str, Any]],
+    concurrency: int = 4,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    deadline_ms: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Run the chat pipeline over `questions` with `concurrency` worker threads.
+    Vector searches, rewrites and SPARQL queries shared between questions are
+    executed once per batch, and the vector searches are prefetched together.
+    `deadline_ms` bounds the whole batch: each question's own deadline is cut
+    to what is left of it, and questions not started in time fail with
+    "batch deadline exceeded". Returns {"results": [...], "summary": {...}}
+    with results in input order; `on_result` is called as each question finishes.
+    """
+    batch_budget = Budget(deadline_ms)
+    memo = _SingleFlight(wait_timeout=settings.BATCH_SHARED_WAIT_SECONDS or None)
+    shared_vs = _SharedVectorStore(vs, memo)
+    try:
+        # the first-turn vector searches of the whole batch in one embedding pass + one index search
+        shared_vs.prefetch((item["question"], item.get("k") or 5) for item in questions
+                           if find_hardcoded_answer(item["question"]) is None)
+    except Exception as e:
+        print(f"Batched vector prefetch failed, querying one by one: {e}")
+    pipeline = RAGPipeline(
+        shared_vs,
+        _SharedGraph(graph, memo),
+        llm,
+        _SharedRewriter(rewriter, memo) if rewriter is not None else None,
+    )
+    results: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+    emit_lock = threading.Lock()
+
+    def _one(i: int, item: Dict[str, Any]) -> None:
+        t0 = time.perf_counter()
+        rec: Dict[str, Any] = {"id": item.get("id"), "question": item["question"]}
+        try:
+            left = batch_budget.remaining_ms()
+            if left <= 0:
+                raise TimeoutError("batch deadline exceeded")
+            own = item.get("deadline_ms") or settings.CHAT_DEADLINE_MS or float("inf")
+            state = pipeline.run(
+                item["question"],
+                k=item.get("k") or 5,
+                temperature=item.get("temperature") or 0.2,
+                deadline_ms=None if min(own, left) == float("inf") else min(own, left),
+            )
+            rec.update({
+                "answer": _answer(state),
+                "outcome": state.outcome,
+                "terms_used": state.terms,
+                "timing": state.timing(),
+                "llm_meta": state.llm_meta,
+                "degradations": list(state.budget.applied),
+                "error": None,
+            })
+        except Exception as e:
+            rec.update({"answer": None, "error": f"{type(e).__name__}: {e}",
+                        "timing": {"total_ms": round((time.perf_counter() - t0) * 1000, 1)}})
+        results[i] = rec
+        if on_result is not None:
+            with emit_lock:
+                on_result(rec)
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        list(pool.map(lambda a: _one(*a), enumerate(questions)))
+    wall_s = time.perf_counter() - t_start
+
+    return {"results": results, "summary": summarize(results, wall_s, concurrency, memo.stats())}
+
+
+def summarize(
+    results: List[Dict[str, Any]],
+    wall_s: float,
+    concurrency: int,
+    shared: Optional[Dict[str, int]] = None,
+) -> Dict[str, Any]:
+    ok = [r for r in results if r and not r.get("error")]
+    totals = [r["timing"]["total_ms"] for r in ok]
+    stage_sum: Dict[str, float] = {}
+    for r in ok:
+        for name, ms in (r["timing"].get("stages") or {}).items():
+            stage_sum[name] = stage_sum.get(name, 0.0) + ms
+    tokens = [r["llm_meta"].get("total_tokens") for r in ok if (r.get("llm_meta") or {}).get("total_tokens")]
+    return {
+        "questions": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "concurrency": concurrency,
+        "wall_s": round(wall_s, 2),
+        "throughput_qps": round(len(results) / wall_s, 3) if wall_s > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(sum(totals) / len(totals), 1) if totals else 0.0,
+            "p50": percentile(totals, 50),
+            "p90": percentile(totals, 90),
+            "p99": percentile(totals, 99),
+            "max": round(max(totals), 1) if totals else 0.0,
+        },
+        "stage_mean_ms": {k: round(v / len(ok), 1) for k, v in stage_sum.items()} if ok else {},
+        "total_tokens": sum(tokens) if tokens else None,
+        "shared_retrieval": shared or {},
+    }
@@ -0,0 +1,67 @@
+from __future__ import annotations
+import time
+from typing import Optional, Dict, Any, List
+
+from ..core.config import settings
+
+# Degradation ladder, cheapest loss first. Each step fires once the remaining
+# budget drops below its threshold (see DEGRADE_*_MS in config).
+DEGRADATIONS = (
+    ("skip_rewriter", "DEGRADE_SKIP_REWRITER_MS"),
+    ("drop_cp_goal_facets", "DEGRADE_DROP_FACETS_MS"),
+    ("vector_only", "DEGRADE_VECTOR_ONLY_MS"),
+    ("cap_generation_tokens", "DEGRADE_CAP_TOKENS_MS"),
+)
+
+
+class Budget:
+    """
+    Per-request latency budget. Stages ask it for their timeout instead of using
+    the fixed per-client defaults, and ask it whether to degrade.
+    An unbounded budget (deadline_ms falsy) never degrades and never shortens timeouts.
+    """
+    def __init__(self, deadline_ms: Optional[float] = None):
+        self.deadline_ms = deadline_ms or None
+        self._start = time.monotonic()
+        self._deadline = self._start + self.deadline_ms / 1000.0 if self.deadline_ms else None
+        self.applied: List[str] = []
+
+    @property
+    def bounded(self) -> bool:
+        return self._deadline is not None
+
+    def remaining_ms(self) -> float:
+        if self._deadline is None:
+            return float("inf")
+        return max(0.0, (self._deadline - time.monotonic()) * 1000.0)
+
+    def timeout(self, cap: Optional[float] = None) -> Optional[float]:
+        """Seconds a call may take: the remaining budget, bounded by `cap` and a small floor."""
+        if self._deadline is None:
+            return cap
+        left = max(settings.BUDGET_MIN_TIMEOUT_SECONDS, self.remaining_ms() / 1000.0)
+        return min(cap, left) if cap else left
+
+    def degrade(self, name: str) -> bool:
+        """True (and recorded) if degradation `name` applies at this point of the request."""
+        if name in self.applied:
+            return True
+        threshold = dict(DEGRADATIONS).get(name)
+        limit = getattr(settings, threshold) if threshold else 0
+        if self.remaining_ms() < limit:
+            self.applied.append(name)
+            return True
+        return False
+
+    def note(self, name: str) -> None:
+        """Record a degradation decided by the caller (e.g. graph loop cut short)."""
+        if name not in self.applied:
+            self.applied.append(name)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "deadline_ms": self.deadline_ms,
+            "elapsed_ms": round((time.monotonic() - self._start) * 1000.0, 1),
+            "remaining_ms": round(self.remaining_ms(), 1) if self.bounded else None,
+            "degradations": list(self.applied),
+        }
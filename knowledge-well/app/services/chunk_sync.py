@@ -0,0 +1,112 @@
+from __future__ import annotations
+import hashlib
+from typing import List, Dict, Any, Optional, Callable
+
+import numpy as np
+
+DEFAULT_SOURCE = "doc"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id(source: str, offset: int, text: str) -> str:
+    """Deterministic id: the same chunk of the same source always gets the same id."""
+    return f"{source}:{offset}:{content_hash(text)}"
+
+
+def chunk_metadata(
+    texts: List[str],
+    metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    source: Optional[str] = None,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """Copies of the metadata with 'source', 'chunk' (offset within the source) and 'hash' filled in."""
+    out = []
+    for i, text in enumerate(texts):
+        meta = dict(metadatas[i] or {}) if metadatas is not None else {}
+        if source is not None:
+            meta["source"] = source
+        meta.setdefault("source", DEFAULT_SOURCE)
+        meta.setdefault("chunk", offset + i)
+        meta["hash"] = content_hash(text)
+        out.append(meta)
+    return out
+
+
+def chunk_ids_for(texts: List[str], metadatas: List[Dict[str, Any]]) -> List[str]:
+    return [chunk_id(str(m["source"]), int(m["chunk"]), t) for t, m in zip(texts, metadatas)]
+
+
+class SourceSync:
+    """
+    Incremental re-index of one source against what the store already holds.
+    Chunks whose id (source, offset, hash) is stored are left alone; new ones
+    reuse a stored vector when the same text moved to another offset, and are
+    embedded otherwise; finish() deletes stored chunks that were not seen again.
+    write() may be called repeatedly, so a source can be streamed in batches.
+
+    `store` is a VectorStore or FlatVectorStore (source_chunks / get_embeddings /
+    upsert_embeddings / delete).
+    """
+    def __init__(self, store, source: str):
+        self.store = store
+        self.source = source
+        self.existing: Dict[str, str] = store.source_chunks(source)  # id -> hash
+        self._by_hash = {h: id_ for id_, h in self.existing.items()}
+        self.seen: set = set()
+        self.stats = {"chunks": 0, "unchanged": 0, "added": 0, "embedded": 0, "reused_vectors": 0, "deleted": 0}
+
+    def write(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+        offset: Optional[int] = None,
+        embed: Optional[Callable[[List[str]], np.ndarray]] = None,
+    ) -> int:
+        """Upsert the changed chunks of this batch; returns how many were written."""
+        metas = chunk_metadata(texts, metadatas, self.source, self.stats["chunks"] if offset is None else offset)
+        ids = chunk_ids_for(texts, metas)
+        self.seen.update(ids)
+        self.stats["chunks"] += len(ids)
+
+        new = [i for i, id_ in enumerate(ids) if id_ not in self.existing]
+        self.stats["unchanged"] += len(ids) - len(new)
+        if not new:
+            return 0
+
+        reuse = {i: self._by_hash[metas[i]["hash"]] for i in new if metas[i]["hash"] in self._by_hash}
+        fresh_idx = [i for i in new if i not in reuse]
+        vectors: Dict[int, np.ndarray] = {}
+        if reuse:
+            got = self.store.get_embeddings([reuse[i] for i in reuse])
+            vectors.update(zip(reuse, got))
+        if fresh_idx:
+            embs = (embed or self.store.embedder.embed_documents)([texts[i] for i in fresh_idx])
+            vectors.update(zip(fresh_idx, embs))
+
+        self.store.upsert_embeddings(
+            [ids[i] for i in new],
+            np.stack([vectors[i] for i in new]).astype(np.float32, copy=False),
+            [texts[i] for i in new],
+            [metas[i] for i in new],
+        )
+        self.stats["added"] += len(new)
+        self.stats["embedded"] += len(fresh_idx)
+        self.stats["reused_vectors"] += len(reuse)
+        return len(new)
+
+    def finish(self) -> Dict[str, Any]:
+        stale = [id_ for id_ in self.existing if id_ not in self.seen]
+        if stale:
+            self.store.delete(stale)
+        self.stats["deleted"] = len(stale)
+        return {"source": self.source, **self.stats}
+
+
+def sync_source(store, source: str, texts: List[str], metadatas: Optional[List[Optional[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+    """Make the store's chunks for `source` exactly `texts`, touching only what changed."""
+    sync = SourceSync(store, source)
+    sync.write(texts, metadatas, offset=0)
+    return sync.finish()
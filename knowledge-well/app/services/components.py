@@ -0,0 +1,264 @@
+from __future__ import annotations
+import os
+import threading
+from typing import Optional, Tuple, Any
+
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+
+from ..core.config import settings
+from .embedder import Embedder
+from .embed_service import RemoteEmbedder
+from .vector_store import VectorStore
+from .flat_store import FlatVectorStore
+from .graphdb import GraphDBClient
+from .graph_index import GraphNodeIndex
+from .lexical_index import LexicalIndex, HybridRetriever, lexical_index_path
+from .triple_writer import TripleWriter
+from .query_rewriter import QueryRewriter
+from .ollama_client import OllamaClient
+from .openai_client import OpenAIClient
+from .gemini_client import GeminiClient
+
+
+class ComponentRegistry:
+    """
+    Process-wide RAG components: one embedding model, one Chroma client, one
+    GraphDB client, one LLM client and one rewriter, created lazily on first use.
+    Every router, the batch tool and the MCP server go through the `registry`
+    singleton; creation is serialised so concurrent first requests cannot load
+    duplicates.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._embedder: Optional[Embedder | RemoteEmbedder] = None
+        self._chroma: Any = None
+        self._vs: Optional[VectorStore | FlatVectorStore] = None
+        self._records: Optional[VectorStore | FlatVectorStore] = None
+        self._lexical: Optional[LexicalIndex] = None
+        self._retriever: Any = None
+        self._graph: Optional[GraphDBClient] = None
+        self._graph_index: Optional[GraphNodeIndex] = None
+        self._triple_writer: Optional[TripleWriter] = None
+        self._llm: Optional[OllamaClient | OpenAIClient | GeminiClient] = None
+        self._rewriter: Optional[QueryRewriter] = None
+        self._rewriter_checked = False
+
+    def embedder(self) -> Embedder | RemoteEmbedder:
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    try:
+                        if settings.EMBED_SERVICE_ADDR:
+                            # the model lives in the shared embedding service, not in this worker
+                            self._embedder = RemoteEmbedder(settings.EMBED_SERVICE_ADDR, settings.EMBED_SERVICE_TIMEOUT)
+                        else:
+                            self._embedder = Embedder(settings.EMBEDDING_MODEL, settings.DEVICE, settings.EMBED_BATCH)
+                    except Exception as e:
+                        raise RuntimeError(f"Failed to initialize Embedder: {e}")
+        return self._embedder
+
+    def chroma_client(self):
+        """The one PersistentClient every Chroma collection of VECTORSTORE_PATH is opened through."""
+        if self._chroma is None:
+            with self._lock:
+                if self._chroma is None:
+                    os.makedirs(settings.VECTORSTORE_PATH, exist_ok=True)
+                    self._chroma = chromadb.PersistentClient(
+                        path=settings.VECTORSTORE_PATH, settings=ChromaSettings(anonymized_telemetry=False)
+                    )
+        return self._chroma
+
+    def _open_store(
+        self, collection: str, lexical: Optional[LexicalIndex] = None, load_model: bool = True
+    ) -> VectorStore | FlatVectorStore:
+        embedder = self.embedder() if load_model else None
+        kind = settings.VECTOR_BACKEND.lower()
+        try:
+            if kind == "flat":
+                return FlatVectorStore(
+                    settings.FLAT_VECTORSTORE_PATH,
+                    collection,
+                    embedder,
+                    quantization=settings.FLAT_QUANTIZATION.lower(),
+                    rescore=settings.FLAT_RESCORE_FACTOR,
+                    lexical=lexical,
+                )
+            if kind == "chroma":
+                return VectorStore(settings.VECTORSTORE_PATH, collection, embedder, lexical=lexical,
+                                   client=self.chroma_client())
+            raise ValueError(f"unknown VECTOR_BACKEND '{settings.VECTOR_BACKEND}' (expected 'chroma' or 'flat')")
+        except Exception as e:
+            raise RuntimeError(f"Failed to initialize VectorStore: {e}")
+
+    def vector_store(self) -> VectorStore | FlatVectorStore:
+        if self._vs is None:
+            with self._lock:
+                if self._vs is None:
+                    self._vs = self._open_store(settings.VECTOR_COLLECTION, lexical=self.lexical_index())
+        return self._vs
+
+    def record_store(self) -> VectorStore | FlatVectorStore:
+        """
+        The documents collection for maintenance reads: the serving store if it
+        is open, else one opened (once) without an embedding model.
+        """
+        if self._vs is not None:
+            return self._vs
+        if self._records is None:
+            with self._lock:
+                if self._records is None:
+                    self._records = self._open_store(settings.VECTOR_COLLECTION, load_model=False)
+        return self._records
+
+    def lexical_index(self) -> Optional[LexicalIndex]:
+        """BM25 index of the documents collection, or None when LEXICAL_INDEX is off."""
+        if self._lexical is None and (settings.LEXICAL_INDEX or settings.RETRIEVAL_MODE.lower() == "lexical"):
+            with self._lock:
+                if self._lexical is None:
+                    try:
+                        self._lexical = LexicalIndex(lexical_index_path(settings.VECTOR_COLLECTION))
+                    except Exception as e:
+                        raise RuntimeError(f"Failed to initialize LexicalIndex: {e}")
+        return self._lexical
+
+    def retriever(self):
+        """
+        What /query and the chat pipeline search, by RETRIEVAL_MODE: the vector
+        store, a HybridRetriever (vector + BM25), or the LexicalIndex alone,
+        which never loads the embedding model.
+        """
+        if self._retriever is None:
+            with self._lock:
+                if self._retriever is None:
+                    mode = settings.RETRIEVAL_MODE.lower()
+                    if mode == "vector":
+                        self._retriever = self.vector_store()
+                    elif mode == "hybrid":
+                        lexical = self.lexical_index()
+                        if lexical is None:
+                            raise RuntimeError("RETRIEVAL_MODE=hybrid needs LEXICAL_INDEX=true")
+                        self._retriever = HybridRetriever(
+                            self.vector_store(), lexical, rrf_k=settings.RRF_K, candidates=settings.RRF_CANDIDATES
+                        )
+                    elif mode == "lexical":
+                        self._retriever = self.lexical_index()
+                    else:
+                        raise RuntimeError(
+                            f"unknown RETRIEVAL_MODE '{settings.RETRIEVAL_MODE}' (expected 'vector', 'hybrid' or 'lexical')"
+                        )
+        return self._retriever
+
+    def graph_index(self) -> GraphNodeIndex:
+        """Node index over the graph's texts (GRAPH_VECTOR_COLLECTION), same backend as the documents."""
+        if self._graph_index is None:
+            with self._lock:
+                if self._graph_index is None:
+                    self._graph_index = GraphNodeIndex(self._open_store(settings.GRAPH_VECTOR_COLLECTION), k=settings.GRAPH_ANN_K)
+        return self._graph_index
+
+    def graph(self) -> GraphDBClient:
+        if self._graph is None:
+            with self._lock:
+                if self._graph is None:
+                    try:
+                        self._graph = GraphDBClient(
+                            base_url=settings.GRAPHDB_BASE_URL,
+                            repository=settings.GRAPHDB_REPOSITORY,
+                            auth_mode=settings.GRAPHDB_AUTH,
+                            username=settings.GRAPHDB_USERNAME,
+                            password=settings.GRAPHDB_PASSWORD,
+                            verify_tls=settings.GRAPHDB_VERIFY_TLS,
+                            timeout=settings.GRAPHDB_TIMEOUT,
+                            token_ttl_seconds=settings.GRAPHDB_TOKEN_TTL_SECONDS,
+                        )
+                    except Exception as e:
+                        raise RuntimeError(f"Failed to initialize GraphDBClient: {e}")
+        return self._graph
+
+    def triple_writer(self) -> TripleWriter:
+        """Background bulk loader for triples extracted from answers (TRIPLE_* settings)."""
+        if self._triple_writer is None:
+            with self._lock:
+                if self._triple_writer is None:
+                    self._triple_writer = TripleWriter(
+                        self.graph(),
+                        context=settings.TRIPLE_GRAPH_IRI,
+                        base_iri=settings.TRIPLE_BASE_IRI,
+                        batch_size=settings.TRIPLE_BATCH_SIZE,
+                        max_pending=settings.TRIPLE_MAX_PENDING,
+                        flush_seconds=settings.TRIPLE_FLUSH_SECONDS,
+                        retries=settings.TRIPLE_RETRIES,
+                    )
+        return self._triple_writer
+
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    prov = settings.LLM_PROVIDER.upper()
+                    try:
+                        if prov == "OPENAI":
+                            self._llm = OpenAIClient(
+                                api_key=settings.OPENAI_API_KEY,
+                                model=settings.OPENAI_MODEL,
+                                base_url=settings.OPENAI_BASE_URL,
+                                timeout_seconds=settings.OPENAI_TIMEOUT_SECONDS,
+                                use_responses_api=settings.OPENAI_USE_RESPONSES,
+                            )
+                        elif prov == "GEMINI":
+                            self._llm = GeminiClient(
+                                api_key=settings.GEMINI_API_KEY,
+                                model=settings.GEMINI_MODEL,
+                                timeout_seconds=settings.GEMINI_TIMEOUT_SECONDS,
+                            )
+                        else:
+                            self._llm = OllamaClient(
+                                base_url=settings.OLLAMA_BASE_URL,
+                                model=settings.OLLAMA_MODEL
+                            )
+                    except Exception as e:
+                        raise RuntimeError(f"Failed to initialize LLM client for provider '{prov}': {e}")
+        return self._llm
+
+    def rewriter(self) -> Optional[QueryRewriter]:
+        if not self._rewriter_checked:
+            with self._lock:
+                if not self._rewriter_checked:
+                    if settings.USE_LLM_REWRITER and settings.REWRITER_PROVIDER.upper() == "OPENAI":
+                        try:
+                            self._rewriter = QueryRewriter(
+                                model=settings.REWRITER_MODEL, timeout_seconds=settings.REWRITER_TIMEOUT_SECONDS
+                            )
+                        except Exception as e:
+                            raise RuntimeError(f"Failed to initialize QueryRewriter: {e}")
+                    self._rewriter_checked = True
+        return self._rewriter
+
+    def get_components(self) -> Tuple[VectorStore | FlatVectorStore, GraphDBClient, Any, Optional[QueryRewriter]]:
+        """(retriever, graph client, llm client, rewriter or None) for the RAG pipeline."""
+        return self.retriever(), self.graph(), self.llm(), self.rewriter()
+
+    def warm(self) -> None:
+        """Open the retriever (loading the embedding model unless RETRIEVAL_MODE=lexical) now instead of on the first request."""
+        self.retriever()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._triple_writer is not None:
+                self._triple_writer.close()  # drains the queue through the graph client below
+            if self._graph is not None:
+                try:
+                    self._graph._client.close()
+                except Exception:
+                    pass
+            if self._lexical is not None:
+                self._lexical.close()
+            self._lexical = self._retriever = None
+            self._chroma = self._records = None
+            self._embedder = self._vs = self._graph = self._graph_index = self._triple_writer = None
+            self._llm = self._rewriter = None
+            self._rewriter_checked = False
+
+
+registry = ComponentRegistry()
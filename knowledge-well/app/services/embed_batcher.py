@@ -0,0 +1,132 @@
+from __future__ import annotations
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Callable, List, Dict, Any, Optional, Sequence
+
+# Batch-size histogram buckets (upper bounds)
+_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+_live_batchers: "weakref.WeakSet[EmbeddingMicroBatcher]" = weakref.WeakSet()
+
+
+class EmbeddingMicroBatcher:
+    """
+    Collects concurrent single-text embedding requests and runs them through
+    one `encode_batch` call. A batch is dispatched when it holds `max_items`
+    texts, when `max_wait_ms` has passed since its first text, or right away
+    when no other request is in flight (so solo traffic pays no extra wait).
+    """
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], Sequence[Any]],
+        max_items: int = 16,
+        max_wait_ms: float = 2.0,
+        name: str = "embedder",
+    ):
+        self._encode_batch = encode_batch
+        self.max_items = max(1, int(max_items))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.name = name
+        self._q: "queue.Queue[tuple]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._inflight = 0
+
+        # metrics
+        self._batches = 0
+        self._items = 0
+        self._max_batch = 0
+        self._hist = [0] * (len(_BUCKETS) + 1)
+        self._queue_wait_ms = 0.0
+        self._encode_ms = 0.0
+        self._errors = 0
+        _live_batchers.add(self)
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name=f"{self.name}-microbatch", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        self._ensure_worker()
+        fut: Future = Future()
+        with self._lock:
+            self._inflight += 1
+        self._q.put((text, fut, time.perf_counter()))
+        return fut
+
+    def embed(self, text: str, timeout: Optional[float] = None):
+        return self.submit(text).result(timeout=timeout)
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._q.get()]
+            deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+            while len(batch) < self.max_items:
+                with self._lock:
+                    others_waiting = self._inflight > len(batch)
+                if not others_waiting:
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch: List[tuple]) -> None:
+        t0 = time.perf_counter()
+        texts = [b[0] for b in batch]
+        try:
+            vectors = self._encode_batch(texts)
+            err = None
+        except Exception as e:  # every waiter sees the failure
+            vectors, err = None, e
+        t1 = time.perf_counter()
+
+        with self._lock:
+            self._inflight -= len(batch)
+            self._batches += 1
+            self._items += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            self._hist[next((i for i, ub in enumerate(_BUCKETS) if len(batch) <= ub), len(_BUCKETS))] += 1
+            self._queue_wait_ms += sum((t0 - b[2]) * 1000.0 for b in batch)
+            self._encode_ms += (t1 - t0) * 1000.0
+            if err is not None:
+                self._errors += 1
+
+        for i, (_, fut, _) in enumerate(batch):
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(vectors[i])
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"<={ub}" for ub in _BUCKETS] + [f">{_BUCKETS[-1]}"]
+            return {
+                "name": self.name,
+                "max_items": self.max_items,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size": self._max_batch,
+                "batch_size_hist": dict(zip(labels, self._hist)),
+                "mean_queue_wait_ms": round(self._queue_wait_ms / self._items, 3) if self._items else 0.0,
+                "mean_encode_ms": round(self._encode_ms / self._batches, 3) if self._batches else 0.0,
+                "errors": self._errors,
+                "inflight": self._inflight,
+            }
+
+
+def embedding_metrics() -> List[Dict[str, Any]]:
+    """Metrics of every live micro-batcher in this process."""
+    return [b.metrics() for b in list(_live_batchers)]
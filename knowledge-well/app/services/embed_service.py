@@ -0,0 +1,212 @@
+from __future__ import annotations
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# Wire format (both directions): 4-byte big-endian length + UTF-8 JSON header.
+# A successful embed reply is followed by rows * dim float32 values (little-endian).
+_LEN = struct.Struct(">I")
+
+
+def parse_address(address: str) -> Tuple[int, Any]:
+    """'host:port' -> TCP, anything else (e.g. /tmp/kw-embed.sock) -> Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError(f"Unix sockets are not available here; use host:port for EMBED_SERVICE_ADDR, got '{address}'")
+    return socket.AF_UNIX, address
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            raise ConnectionError("embedding service closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+def _send_msg(sock: socket.socket, header: Dict[str, Any], payload: bytes = b"") -> None:
+    head = json.dumps(header).encode("utf-8")
+    sock.sendall(_LEN.pack(len(head)) + head + payload)
+
+
+def _recv_header(sock: socket.socket) -> Dict[str, Any]:
+    (n,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    return json.loads(_recv_exact(sock, n).decode("utf-8"))
+
+
+# -------------------------
+# Server: owns the one Embedder of the host
+# -------------------------
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        embedder = self.server.embedder
+        while True:
+            try:
+                req = _recv_header(self.request)
+            except (ConnectionError, OSError):
+                return
+            op = req.get("op")
+            try:
+                if op == "info":
+                    _send_msg(self.request, {
+                        "ok": True,
+                        "model_name": embedder.model_name,
+                        "model_key": embedder.model_key,
+                        "pid": os.getpid(),
+                        "metrics": embedder.metrics(),
+                        "cache": embedder.cache.metrics() if embedder.cache is not None else None,
+                    })
+                    continue
+                texts = req.get("texts") or []
+                if op == "query":
+                    # one text per call so concurrent workers meet in the micro-batcher
+                    arr = np.asarray(embedder.embed_query(texts[0]), dtype=np.float32)[None, :]
+                elif op == "queries":
+                    arr = embedder.embed_queries(texts)
+                elif op == "documents":
+                    arr = embedder.embed_documents(texts)
+                else:
+                    raise ValueError(f"unknown op '{op}'")
+                arr = np.ascontiguousarray(arr, dtype="<f4")
+                _send_msg(self.request, {"ok": True, "shape": list(arr.shape)}, arr.tobytes())
+            except Exception as e:  # report to the client, keep serving
+                try:
+                    _send_msg(self.request, {"ok": False, "error": f"{type(e).__name__}: {e}"})
+                except OSError:
+                    return
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.BaseServer):
+    """
+    Serves embed_query / embed_documents of one local Embedder to every API
+    worker on the host, one thread per connection. Each worker keeps its
+    connections open, so only the model load and memory are shared.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: str, embedder):
+        family, addr = parse_address(address)
+        self.embedder = embedder
+        self.address = address
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_UNIX:
+            if os.path.exists(addr):
+                os.unlink(addr)  # stale socket from a previous run
+        else:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        socketserver.BaseServer.__init__(self, addr, _Handler)
+        self.socket.bind(addr)
+        self.socket.listen(128)
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def get_request(self):
+        return self.socket.accept()
+
+    def shutdown_request(self, request):
+        try:
+            request.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        request.close()
+
+    def server_close(self):
+        self.socket.close()
+        if self.socket.family == getattr(socket, "AF_UNIX", None) and os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+# -------------------------
+# Client: drop-in for Embedder inside API workers
+# -------------------------
+
+class RemoteEmbedder:
+    """
+    Same interface as Embedder (embed_documents / embed_query / metrics), backed
+    by an EmbeddingServer. Connections are per thread; a dead connection is re-opened
+    once, but a request that timed out is never re-sent.
+    """
+    cache = None
+
+    def __init__(self, address: str, timeout: float = 60.0):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+        info = self._call({"op": "info"})[0]
+        self.model_name: str = info["model_name"]
+        self.model_key: str = info["model_key"]
+
+    def _connect(self) -> socket.socket:
+        family, addr = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(addr)
+        except OSError as e:
+            sock.close()
+            raise RuntimeError(f"Embedding service at '{self.address}' is unreachable: {e}")
+        return sock
+
+    def _call(self, req: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[np.ndarray]]:
+        for attempt in (0, 1):
+            sock = getattr(self._local, "sock", None)
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            sent = False
+            try:
+                _send_msg(sock, req)
+                sent = True
+                header = _recv_header(sock)
+                arr = None
+                if header.get("ok") and "shape" in header:
+                    rows, dim = header["shape"]
+                    arr = np.frombuffer(_recv_exact(sock, rows * dim * 4), dtype="<f4").reshape(rows, dim)
+                break
+            except socket.timeout:
+                # the server may still be working on it: never send the request twice
+                sock.close()
+                self._local.sock = None
+                raise RuntimeError(f"Embedding service at '{self.address}' timed out after {self.timeout}s")
+            except OSError as e:  # includes ConnectionError
+                sock.close()
+                self._local.sock = None
+                # retry only when the request cannot have run: it never went out, or the
+                # kept-alive connection was dead (server restarted)
+                stale = not sent or isinstance(e, (ConnectionResetError, BrokenPipeError))
+                if attempt or not stale:
+                    raise RuntimeError(f"Embedding service at '{self.address}' dropped the connection: {e}")
+        if not header.get("ok"):
+            raise RuntimeError(f"Embedding service error: {header.get('error')}")
+        return header, arr
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """(n, dim) float32 array."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._call({"op": "documents", "texts": list(texts)})[1]
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """(dim,) float32 array."""
+        return self._call({"op": "query", "texts": [text]})[1][0]
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """(n, dim) float32 array, one round trip for all texts."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._call({"op": "queries", "texts": list(texts)})[1]
+
+    def metrics(self):
+        info = self._call({"op": "info"})[0]
+        return {"service": self.address, "pid": info["pid"], "microbatch": info["metrics"], "cache": info["cache"]}
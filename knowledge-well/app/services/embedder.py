@@ -1,14 +1,129 @@
 from __future__ import annotations
-from typing import List
-from sentence_transformers import SentenceTransformer
+from typing import List, Optional
+
+import numpy as np
+
+from ..core.config import settings
+from .embed_batcher import EmbeddingMicroBatcher
+from .embedding_backends import load_backend
+from .embedding_cache import EmbeddingCache
 
 class Embedder:
-    def __init__(self, model_name: str = "BAAI/bge-small-en-v1.5", device: str = "cpu", batch_size: int = 32):
-        self.model = SentenceTransformer(model_name, device=device)
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-small-en-v1.5",
+        device: str = "cpu",
+        batch_size: int = 32,
+        microbatch: Optional[bool] = None,
+        microbatch_max_items: Optional[int] = None,
+        microbatch_max_wait_ms: Optional[float] = None,
+        backend: Optional[str] = None,
+        cache: Optional[bool] = None,
+        workers: Optional[int] = None,
+    ):
+        self.model_name = model_name
+        # "torch" (sentence-transformers) or "onnx" (exported model, no torch import)
+        self.backend = load_backend(
+            backend or settings.EMBEDDING_BACKEND,
+            model_name,
+            device=device,
+            onnx_path=settings.EMBED_ONNX_PATH,
+            onnx_quantized=settings.EMBED_ONNX_QUANTIZED,
+            onnx_threads=settings.EMBED_ONNX_THREADS,
+            # > 1: embed_documents is sharded over a process pool (see sharded_backend.py); only the
+            # bulk tools ask for one, the API's shared embedder stays in-process
+            workers=workers or 1,
+            worker_threads=settings.EMBED_WORKER_THREADS,
+            shard_size=settings.EMBED_SHARD_SIZE,
+        )
         self.batch_size = batch_size
+        # Concurrent embed_query calls share one encode() when micro-batching is on
+        self._batcher: Optional[EmbeddingMicroBatcher] = None
+        if settings.EMBED_MICROBATCH if microbatch is None else microbatch:
+            self._batcher = EmbeddingMicroBatcher(
+                self._encode_queries,
+                max_items=microbatch_max_items or settings.EMBED_MICROBATCH_MAX_ITEMS,
+                max_wait_ms=settings.EMBED_MICROBATCH_MAX_WAIT_MS if microbatch_max_wait_ms is None else microbatch_max_wait_ms,
+                name=model_name,
+            )
+        # Vectors already computed for the same (model, backend, text) are read back, not re-encoded
+        self.cache: Optional[EmbeddingCache] = None
+        if settings.EMBED_CACHE if cache is None else cache:
+            self.cache = EmbeddingCache(
+                settings.EMBED_CACHE_PATH,
+                model_key=self.model_key,
+                normalize=True,
+                lru_size=settings.EMBED_CACHE_LRU,
+            )
+
+    @property
+    def model_key(self) -> str:
+        # int8 / ONNX vectors differ slightly from the torch ones, so they are cached apart
+        key = f"{self.model_name}|{self.backend.name}"
+        return key + "-int8" if getattr(self.backend, "quantized", False) else key
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        # one contiguous float32 block; rows are handed out as views, never as lists
+        return np.ascontiguousarray(self.backend.encode(texts, batch_size=batch_size, normalize=True), dtype=np.float32)
+
+    def _encode_queries(self, texts: List[str]) -> np.ndarray:
+        return self._encode(texts, batch_size=len(texts))
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """(n, dim) float32 array."""
+        if self.cache is None or not texts:
+            return self._encode(texts, batch_size=self.batch_size)
+
+        found = self.cache.get_many(texts)
+        if len(found) == len(texts):
+            return np.stack([found[i] for i in range(len(texts))])
+
+        # encode each distinct missing text once
+        missing = list(dict.fromkeys(t for i, t in enumerate(texts) if i not in found))
+        fresh = self._encode(missing, batch_size=self.batch_size)
+        self.cache.put_many(missing, fresh)
+        row = {t: i for i, t in enumerate(missing)}
+
+        out = np.empty((len(texts), fresh.shape[1]), dtype=np.float32)
+        for i, t in enumerate(texts):
+            out[i] = found[i] if i in found else fresh[row[t]]
+        return out
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """(n, dim) float32 array; every uncached text goes through one encode() call."""
+        if not texts:
+            return np.zeros((0, self.backend.dim or 0), dtype=np.float32)
+        found = {}
+        if self.cache is not None:
+            for i, text in enumerate(texts):
+                vec = self.cache.get_query(text)
+                if vec is not None:
+                    found[i] = vec
+        missing = list(dict.fromkeys(t for i, t in enumerate(texts) if i not in found))
+        if missing:
+            fresh = self._encode(missing, batch_size=self.batch_size)
+            by_text = dict(zip(missing, fresh))
+            if self.cache is not None:
+                for text, vec in by_text.items():
+                    self.cache.put_query(text, vec)
+            for i, text in enumerate(texts):
+                if i not in found:
+                    found[i] = by_text[text]
+        return np.stack([found[i] for i in range(len(texts))])
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True).tolist()
+    def embed_query(self, text: str) -> np.ndarray:
+        """(dim,) float32 array."""
+        if self.cache is not None:
+            vec = self.cache.get_query(text)
+            if vec is not None:
+                return vec
+        if self._batcher is not None:
+            vec = self._batcher.embed(text)
+        else:
+            vec = self._encode([text], batch_size=1)[0]
+        if self.cache is not None:
+            self.cache.put_query(text, vec)
+        return vec
 
-    def embed_query(self, text: str) -> List[float]:
-        return self.model.encode([text], batch_size=1, normalize_embeddings=True)[0].tolist()
+    def metrics(self):
+        return self._batcher.metrics() if self._batcher is not None else None
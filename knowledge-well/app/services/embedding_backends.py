@@ -0,0 +1,138 @@
+from __future__ import annotations
+import json
+import os
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+# Written next to the exported model by app.tools.export_onnx
+ONNX_META_FILE = "embedder_onnx.json"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_FILE = "model_quantized.onnx"
+
+
+class SentenceTransformerBackend:
+    """The original backend: sentence-transformers on PyTorch."""
+    name = "torch"
+
+    def __init__(self, model_name: str, device: str = "cpu"):
+        from sentence_transformers import SentenceTransformer  # imports torch
+        self.model = SentenceTransformer(model_name, device=device)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize: bool = True) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, normalize_embeddings=normalize)
+
+
+class OnnxBackend:
+    """
+    Exported transformer on ONNX Runtime + HF `tokenizers`; never imports torch.
+    Expects a directory produced by `python -m app.tools.export_onnx`.
+    """
+    name = "onnx"
+
+    def __init__(self, model_dir: str, quantized: bool = False, intra_op_threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, ONNX_META_FILE), encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.pooling = self.meta.get("pooling", "cls")
+        self.max_length = int(self.meta.get("max_length", 512))
+        self.dim = int(self.meta.get("dim", 0)) or None
+        self.quantized = quantized
+
+        model_file = ONNX_QUANTIZED_FILE if quantized else ONNX_MODEL_FILE
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            opts.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        pad_id = int(self.meta.get("pad_token_id", 0))
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token=self.meta.get("pad_token", "[PAD]"))
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer.encode_batch(texts)
+        ids = np.asarray([e.ids for e in enc], dtype=np.int64)
+        mask = np.asarray([e.attention_mask for e in enc], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.asarray([e.type_ids for e in enc], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]  # [B, T, H]
+        if self.pooling == "mean":
+            m = mask[:, :, None].astype(np.float32)
+            return (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+        return hidden[:, 0]
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize: bool = True) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        # length-sorted batches pad less; original order is restored below
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            vecs = self._encode_batch([texts[i] for i in idx])
+            for i, v in zip(idx, vecs):
+                out[i] = v
+        arr = np.asarray(out, dtype=np.float32)
+        if normalize:
+            arr /= np.clip(np.linalg.norm(arr, axis=1, keepdims=True), 1e-12, None)
+        return arr
+
+
+def load_backend(
+    backend: str,
+    model_name: str,
+    device: str = "cpu",
+    onnx_path: Optional[str] = None,
+    onnx_quantized: bool = False,
+    onnx_threads: int = 0,
+    workers: int = 1,
+    worker_threads: int = 0,
+    shard_size: int = 256,
+):
+    kind = (backend or "torch").lower()
+    if workers > 1 and kind in ("torch", "onnx"):
+        from .sharded_backend import ShardedBackend
+        return ShardedBackend(kind, model_name, workers, device=device, onnx_path=onnx_path,
+                              onnx_quantized=onnx_quantized, threads_per_worker=worker_threads,
+                              shard_size=shard_size)
+    if kind == "onnx":
+        if not onnx_path:
+            raise RuntimeError("EMBEDDING_BACKEND=onnx needs EMBED_ONNX_PATH (see app.tools.export_onnx)")
+        return OnnxBackend(onnx_path, quantized=onnx_quantized, intra_op_threads=onnx_threads)
+    if kind == "torch":
+        return SentenceTransformerBackend(model_name, device=device)
+    raise RuntimeError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected 'torch' or 'onnx')")
+
+
+PARITY_TEXTS = [
+    "hybrid bonding for advanced packaging",
+    "Cu bulge-out during annealing due to CTE mismatch between copper and SiO2",
+    "die-to-wafer alignment accuracy and wafer warpage",
+    "plasma dicing versus mechanical blade dicing particle contamination",
+    "What is the best queue time between plasma activation and bonding?",
+    "d2w cowos plp",
+]
+
+
+def parity_check(reference, candidate, texts: Optional[List[str]] = None, min_cosine: float = 0.99) -> Dict[str, Any]:
+    """Cosine similarity of candidate vs reference embeddings for the same texts."""
+    texts = texts or PARITY_TEXTS
+    a = reference.encode(texts, batch_size=len(texts), normalize=True)
+    b = candidate.encode(texts, batch_size=len(texts), normalize=True)
+    cos = np.sum(np.asarray(a, dtype=np.float32) * np.asarray(b, dtype=np.float32), axis=1)
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cos.min()), 5),
+        "mean_cosine": round(float(cos.mean()), 5),
+        "threshold": min_cosine,
+        "ok": bool(cos.min() >= min_cosine),
+    }
@@ -0,0 +1,160 @@
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+_live_caches: "weakref.WeakSet[EmbeddingCache]" = weakref.WeakSet()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    norm  INTEGER NOT NULL,
+    sha   BLOB NOT NULL,
+    dim   INTEGER NOT NULL,
+    vec   BLOB NOT NULL,
+    PRIMARY KEY (model, norm, sha)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# SQLite's default host-parameter limit is 999; stay well below it
+_LOOKUP_CHUNK = 500
+
+
+def text_sha(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: (model key, normalize flag, sha256(text))
+    -> float32 vector, persisted in SQLite, plus an in-process LRU for hot query
+    strings. Only document embeddings are persisted: query vectors live in the
+    bounded LRU alone, so unique user questions cannot grow the table without
+    limit (a query still reads a persisted row if the same text was ingested).
+    Rows are keyed by model, so a switch of EMBEDDING_MODEL (or backend) never
+    reads stale vectors, and switching back finds the old ones again; rows of
+    unused models are only dropped by app.tools.purge_embed_cache.
+    """
+    def __init__(self, path: str, model_key: str, normalize: bool = True, lru_size: int = 2048):
+        self.path = path
+        self.model_key = model_key
+        self.norm = 1 if normalize else 0
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"lru_hits": 0, "hits": 0, "misses": 0, "writes": 0}
+        self._rows = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        with self._db:
+            # the last model that opened the cache: purge_other_models() keeps it by default
+            self._db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('model', ?)", (self.model_key,))
+        # counted once; metrics() adds this process's inserts instead of re-counting
+        self._rows = self._db.execute(
+            "SELECT COUNT(*) FROM embeddings WHERE model=? AND norm=?", (self.model_key, self.norm)
+        ).fetchone()[0]
+        _live_caches.add(self)
+
+    def model_rows(self) -> Dict[str, int]:
+        """{model key: row count} over the whole file (a full scan; maintenance only)."""
+        with self._lock:
+            return dict(self._db.execute("SELECT model, COUNT(*) FROM embeddings GROUP BY model"))
+
+    def purge_other_models(self, keep: Optional[List[str]] = None) -> int:
+        """Delete the rows of every model key not in `keep` (default: this cache's); returns the count."""
+        keep = list(keep or [self.model_key])
+        with self._lock, self._db:
+            return self._db.execute(
+                "DELETE FROM embeddings WHERE model NOT IN (%s)" % ",".join("?" * len(keep)), keep
+            ).rowcount
+
+    # ---------- documents (bulk) ----------
+
+    def get_many(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """{index: vector} for the texts already cached."""
+        shas = [text_sha(t) for t in texts]
+        by_sha: Dict[bytes, np.ndarray] = {}
+        uniq = list(dict.fromkeys(shas))
+        with self._lock:
+            for start in range(0, len(uniq), _LOOKUP_CHUNK):
+                part = uniq[start:start + _LOOKUP_CHUNK]
+                q = (
+                    "SELECT sha, vec FROM embeddings WHERE model=? AND norm=? AND sha IN (%s)"
+                    % ",".join("?" * len(part))
+                )
+                for sha, vec in self._db.execute(q, (self.model_key, self.norm, *part)):
+                    by_sha[bytes(sha)] = np.frombuffer(vec, dtype=np.float32)
+            found = {i: by_sha[s] for i, s in enumerate(shas) if s in by_sha}
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(texts) - len(found)
+        return found
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        rows = [
+            (self.model_key, self.norm, text_sha(t), int(v.shape[0]), v.tobytes())
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock, self._db:
+            # same (model, norm, text) -> same vector, so an existing row is kept as is
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            added = self._db.total_changes - before
+            self._stats["writes"] += added
+            self._rows += added
+
+    # ---------- queries (LRU in front of SQLite) ----------
+
+    def get_query(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vec = self._lru.get(text)
+            if vec is not None:
+                self._lru.move_to_end(text)
+                self._stats["lru_hits"] += 1
+                return vec
+        found = self.get_many([text])
+        if 0 in found:
+            self._remember(text, found[0])
+            return found[0]
+        return None
+
+    def put_query(self, text: str, vector: np.ndarray) -> None:
+        self._remember(text, vector)
+
+    def _remember(self, text: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._lru[text] = vector
+            self._lru.move_to_end(text)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+            rows = self._rows
+        lookups = st["lru_hits"] + st["hits"] + st["misses"]
+        return {
+            "path": self.path,
+            "model": self.model_key,
+            "rows": rows,
+            "lru_size": len(self._lru),
+            **st,
+            "hit_rate": round((st["lru_hits"] + st["hits"]) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def embedding_cache_metrics() -> List[Dict[str, Any]]:
+    """Metrics of every open embedding cache in this process."""
+    return [c.metrics() for c in list(_live_caches)]
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import json
+import os
+from typing import Iterator, Tuple, Dict, Any, Optional, Union
+
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown", ".rst", ".csv", ".html", ".htm", ".xml", ".ttl"}
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | {".pdf", ".jsonl", ".json"}
+
+
+def kind_of(filename: str, content_type: Optional[str] = None) -> str:
+    """'pdf', 'jsonl', 'json' or 'text' from the file extension, falling back to the content type."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    ctype = content_type or ""
+    if ext == ".pdf" or ctype.endswith("/pdf"):
+        return "pdf"
+    if ext == ".jsonl" or "jsonl" in ctype or "ndjson" in ctype:
+        return "jsonl"
+    if ext == ".json" or ctype.endswith("/json"):
+        return "json"
+    return "text"
+
+
+def _pdf_pages(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("PDF ingestion needs the 'pypdf' package (see requirements.txt)")
+    reader = PdfReader(path)
+    for i, page in enumerate(reader.pages, 1):
+        text = page.extract_text() or ""
+        if text.strip():
+            yield text, {"page": i}
+
+
+def _record(rec: Any, position: Dict[str, int]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(text, metadata) of one {"text": ..., "metadata": {...}} record or bare string; None if empty."""
+    if isinstance(rec, str):
+        return (rec, dict(position)) if rec.strip() else None
+    if not isinstance(rec, dict):
+        raise ValueError(f"expected a record object or string, got {type(rec).__name__}")
+    text = rec.get("text") or rec.get("content") or rec.get("document") or ""
+    meta = {k: v for k, v in (rec.get("metadata") or {}).items() if isinstance(v, (str, int, float, bool))}
+    for k, v in position.items():
+        meta.setdefault(k, v)
+    return (text, meta) if text.strip() else None
+
+
+def _jsonl_records(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            rec = _record(json.loads(line), {"line": lineno})
+            if rec is not None:
+                yield rec
+
+
+def _json_records(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """A JSON document: an array of records, {"records"|"documents": [...]}, or a single record."""
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    if isinstance(doc, dict):
+        items = doc.get("records", doc.get("documents"))
+        doc = items if isinstance(items, list) else [doc]
+    elif not isinstance(doc, list):
+        doc = [doc]
+    for i, item in enumerate(doc):
+        rec = _record(item, {"record": i})
+        if rec is not None:
+            yield rec
+
+
+def extract_documents(
+    path: str, filename: Optional[str] = None, content_type: Optional[str] = None
+) -> Iterator[Tuple[Union[str, Iterator[str]], Dict[str, Any]]]:
+    """
+    (text, metadata) per logical document of a file: one per page for PDF, one
+    per record for JSONL ({"text": ..., "metadata": {...}} or a bare string) and
+    for JSON (an array of such records, or a single one), and
+    the whole file for text, which is handed out as a lazy iterator of blocks so
+    large files are never held in memory whole (see textsplitter.chunk_document).
+    """
+    kind = kind_of(filename or path, content_type)
+    if kind == "pdf":
+        yield from _pdf_pages(path)
+    elif kind == "jsonl":
+        yield from _jsonl_records(path)
+    elif kind == "json":
+        yield from _json_records(path)
+    else:
+        yield _text_blocks(path), {}
+
+
+def _text_blocks(path: str, block_chars: int = 1 << 16) -> Iterator[str]:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            block = f.read(block_chars)
+            if not block:
+                return
+            yield block
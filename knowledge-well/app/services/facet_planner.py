@@ -0,0 +1,138 @@
+from __future__ import annotations
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Set, Any, Deque, Optional
+
+from ..core.config import settings
+from .rag import GRAPH_FACETS
+
+# -------------------------
+# Question intent signals (cheap regexes, no LLM)
+# -------------------------
+INTENT_PATTERNS = {
+    "problem": re.compile(
+        r"\b(problem|challenge|issue|defect|failure|fail|limitation|constraint|risk|cause|why|void|crack|delamination)s?\b"
+    ),
+    "solution": re.compile(
+        r"\b(solution|solve|mitigat\w*|fix|improv\w*|reduc\w*|avoid|prevent|optimi[sz]\w*|best|control|how to|recommend\w*)\b"
+    ),
+    "overview": re.compile(
+        r"\b(what is|what are|overview|explain|introduc\w*|describe|summar\w*|definition|define|compare|difference|vs)\b"
+    ),
+}
+
+# Facets each intent needs. Solutions keep "problems" so the P -> S mapping in
+# the prompt still has something to map from.
+INTENT_FACETS = {
+    "problem": {"problems", "summary", "content"},
+    "solution": {"goal", "content", "problems"},
+    "overview": {"summary", "content"},
+}
+
+# Maps debug row counters from build_graph_problem_context to facet names
+_ROWS_KEYS = {
+    "summary": ("rows_abs_per_kw", "sparql_abs"),
+    "content": ("rows_cp_per_kw", "sparql_cp"),
+    "goal": ("rows_goal_per_kw", "sparql_goal"),
+    "problems": ("rows_per_kw", "sparql"),
+}
+
+
+def detect_intents(question: str) -> List[str]:
+    """Intents found in the question; empty when nothing matched (= unknown)."""
+    q = re.sub(r"\s+", " ", question.lower())
+    return [name for name, rx in INTENT_PATTERNS.items() if rx.search(q)]
+
+
+class FacetPlanner:
+    """
+    Chooses which graph facets to query per keyword.
+    - intent: union of INTENT_FACETS for the detected intents (all facets if none)
+    - yield history: per (term, facet) the last FACET_HISTORY_WINDOW row counts; a
+      facet with FACET_MIN_OBSERVATIONS zero-row runs in a row is skipped for that
+      term, except every FACET_RETRY_EVERY-th time so new graph data can show up.
+    History is an LRU bounded to FACET_HISTORY_MAX_TERMS terms.
+    """
+    def __init__(
+        self,
+        window: Optional[int] = None,
+        min_observations: Optional[int] = None,
+        retry_every: Optional[int] = None,
+        max_terms: Optional[int] = None,
+    ):
+        self.window = window or settings.FACET_HISTORY_WINDOW
+        self.min_observations = min_observations or settings.FACET_MIN_OBSERVATIONS
+        self.retry_every = retry_every or settings.FACET_RETRY_EVERY
+        self.max_terms = max_terms or settings.FACET_HISTORY_MAX_TERMS
+        self._history: "OrderedDict[str, Dict[str, Deque[int]]]" = OrderedDict()
+        self._skips: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(term: str) -> str:
+        return re.sub(r"\s+", " ", term.strip().lower())
+
+    def _is_dead(self, term: str, facet: str) -> bool:
+        hist = self._history.get(term, {}).get(facet)
+        return bool(hist) and len(hist) >= self.min_observations and not any(hist)
+
+    def plan(self, question: str, terms: List[str]) -> Dict[str, Any]:
+        """Returns {"intents": [...], "facets": {term: [facets]}, "skipped": {term: [facets]}}."""
+        intents = detect_intents(question)
+        wanted: Set[str] = set()
+        for name in intents:
+            wanted |= INTENT_FACETS[name]
+        if not wanted:
+            wanted = set(GRAPH_FACETS)
+
+        facets: Dict[str, List[str]] = {}
+        skipped: Dict[str, List[str]] = {}
+        with self._lock:
+            for term in terms:
+                key = self._key(term)
+                chosen, dead = [], []
+                for facet in GRAPH_FACETS:
+                    if facet not in wanted:
+                        continue
+                    if self._is_dead(key, facet):
+                        n = self._skips.get((key, facet), 0) + 1
+                        if n < self.retry_every:
+                            self._skips[(key, facet)] = n
+                            dead.append(facet)
+                            continue
+                        self._skips.pop((key, facet), None)  # periodic re-check
+                    chosen.append(facet)
+                facets[term] = chosen
+                if dead:
+                    skipped[term] = dead
+        return {"intents": intents or ["unknown"], "facets": facets, "skipped": skipped}
+
+    def record(self, graph_debug: Dict[str, Any]) -> None:
+        """Feed row counts from build_graph_problem_context's debug block back in."""
+        ran = graph_debug.get("facets_per_kw") or {}
+        with self._lock:
+            for term, facets in ran.items():
+                key = self._key(term)
+                hist = self._history.pop(key, None) or {}
+                for facet in facets:
+                    rows_key, sparql_key = _ROWS_KEYS[facet]
+                    sparql = (graph_debug.get(sparql_key) or {}).get(term, "")
+                    if sparql.startswith("# ERROR"):
+                        continue  # a failed query says nothing about yield
+                    rows = (graph_debug.get(rows_key) or {}).get(term, 0)
+                    hist.setdefault(facet, deque(maxlen=self.window)).append(int(rows))
+                self._history[key] = hist
+                while len(self._history) > self.max_terms:
+                    old, _ = self._history.popitem(last=False)
+                    for facet in GRAPH_FACETS:
+                        self._skips.pop((old, facet), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            dead = sum(1 for t in self._history for f in GRAPH_FACETS if self._is_dead(t, f))
+            return {"terms_tracked": len(self._history), "dead_facets": dead}
+
+
+# Process-wide planner shared by every pipeline run
+planner = FacetPlanner()
@@ -0,0 +1,525 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .chunk_sync import chunk_metadata, chunk_ids_for, sync_source
+from .metadata_filter import DEFAULT_INCLUDE, check_include, cache_filters, where_sql
+from .query_cache import QueryResultCache, query_many, stamp_for
+
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.sqlite3"
+MANIFEST_FILE = "manifest.json"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    row      INTEGER PRIMARY KEY,
+    id       TEXT NOT NULL UNIQUE,
+    document TEXT,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY);
+"""
+
+QUANTIZATIONS = ("none", "int8", "binary")
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+# rows per block when scoring quantized codes, bounds the float32 temporaries
+_SCAN_BLOCK = 65536
+
+
+def quantize_int8(mat: np.ndarray):
+    """Per-row symmetric int8 codes and float32 scales (x ~= codes * scale)."""
+    mat = np.asarray(mat, dtype=np.float32)
+    scales = np.abs(mat).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(mat / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(mat: np.ndarray) -> np.ndarray:
+    """Sign bits, packed 8 per byte."""
+    return np.packbits(np.asarray(mat) > 0, axis=1)
+
+
+class FlatVectorStore:
+    """
+    Exact-search alternative to the Chroma-backed VectorStore for corpora that
+    fit in memory. Vectors live in one float32 file (rows in insertion order)
+    that is memory-mapped for search; ids, documents and metadata live in a
+    small SQLite sidecar keyed by row. A query is one matrix-vector product and
+    an argpartition, and returns Chroma's result shape.
+
+    Distances follow the collection's `space`: "l2" (squared, Chroma's default),
+    "cosine" (1 - cos) or "ip" (1 - dot). Embeddings are unit-normalised, so all
+    three rank identically.
+
+    With `quantization` "int8" or "binary" the first pass scans compact codes
+    held in memory (4x / 32x smaller than float32). Only the best
+    `rescore * n_results` candidates are then rescored against their float32
+    rows, which the memmap reads from disk on demand.
+
+    Several processes may open the same store (the API, bulk_ingest). Rows are
+    allocated inside a SQLite write transaction, which holds the authoritative
+    dim, row count and free rows; manifest.json is a snapshot of them for
+    inspection. A reader compares the shared write stamp before each search
+    and, when another process has written, re-reads that state and remaps.
+    """
+    def __init__(
+        self,
+        persist_path: str,
+        collection_name: str,
+        embedder,
+        space: str = "l2",
+        quantization: str = "none",
+        rescore: int = 4,
+        lexical=None,
+    ) -> None:
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"unknown quantization '{quantization}' (expected one of {', '.join(QUANTIZATIONS)})")
+        self.dir = os.path.join(persist_path, collection_name)
+        os.makedirs(self.dir, exist_ok=True)
+        self.embedder = embedder
+        self.lexical = lexical  # LexicalIndex kept in sync with every write/delete, or None
+        self.name = collection_name
+        self._lock = threading.RLock()
+        self._vec_path = os.path.join(self.dir, VECTORS_FILE)
+        self._manifest_path = os.path.join(self.dir, MANIFEST_FILE)
+        self._db = sqlite3.connect(os.path.join(self.dir, RECORDS_FILE), check_same_thread=False, timeout=30)
+        self._db.executescript(_SCHEMA)
+        self._mat: Optional[np.ndarray] = None  # memmap, reopened after writes
+        self.quantization = quantization
+        self.rescore = max(1, int(rescore))
+        self._codes: Optional[np.ndarray] = None   # int8 codes or packed sign bits
+        self._scales: Optional[np.ndarray] = None  # int8 only
+
+        # count = rows in the vector file; free = rows of deleted records, reused by later writes
+        self.manifest: Dict[str, Any] = {"dim": None, "count": 0, "space": space, "free": []}
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, encoding="utf-8") as f:
+                self.manifest.update(json.load(f))
+        self.space = self.manifest["space"]
+        self._adopt_manifest()
+        # shared write counter: bumped by every process that writes, read by every cache and by _refresh
+        self.stamp = stamp_for(persist_path, collection_name)
+        self._seen = self.stamp.value()
+        self._reload()
+        self.result_cache = (
+            QueryResultCache(settings.VECTOR_QUERY_CACHE_SIZE, name=collection_name, stamp=self.stamp)
+            if settings.VECTOR_QUERY_CACHE else None
+        )
+
+    # ---------- storage ----------
+
+    def _changed(self) -> None:
+        if self.result_cache is not None:
+            self.result_cache.bump()
+        else:
+            self.stamp.bump()
+
+    def _adopt_manifest(self) -> None:
+        """Move dim, count and free rows of a store written before they lived in SQLite."""
+        free = self.manifest["free"] if isinstance(self.manifest["free"], list) else []  # snapshots hold a count
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            if self._db.execute("SELECT 1 FROM state WHERE key = 'count'").fetchone() is None:
+                self._db.executemany("INSERT OR REPLACE INTO state(key, value) VALUES (?, ?)",
+                                     [("dim", self.manifest["dim"]), ("count", int(self.manifest["count"]))])
+                self._db.executemany("INSERT OR IGNORE INTO free_rows(row) VALUES (?)", [(int(r),) for r in free])
+
+    def _reload(self) -> None:
+        """Re-read dim, count and free rows from SQLite and drop the memmap and codes built on the old ones."""
+        st = dict(self._db.execute("SELECT key, value FROM state"))
+        self.manifest["dim"] = st.get("dim")
+        self.manifest["count"] = int(st.get("count") or 0)
+        self.manifest["free"] = [r for (r,) in self._db.execute("SELECT row FROM free_rows ORDER BY row")]
+        self._mat = None
+        self._codes = self._scales = None
+
+    def _refresh(self) -> None:
+        """_reload() if any process has written since this one last looked (caller holds the lock)."""
+        seen = self.stamp.value()
+        if seen != self._seen:
+            self._reload()
+            self._seen = seen
+
+    def _save_manifest(self) -> None:
+        tmp = self._manifest_path + ".tmp"
+        snapshot = {**self.manifest, "free": len(self.manifest["free"])}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp, self._manifest_path)
+
+    def _matrix(self) -> np.ndarray:
+        if self._mat is None:
+            n, dim = self.manifest["count"], self.manifest["dim"]
+            if not n:
+                return np.zeros((0, dim or 0), dtype=np.float32)
+            self._mat = np.memmap(self._vec_path, dtype=np.float32, mode="r", shape=(n, dim))
+        return self._mat
+
+    def _quantized(self):
+        """Codes for the whole matrix, built in blocks from the memmap on first use."""
+        if self._codes is None:
+            mat = self._matrix()
+            parts, scales = [], []
+            for start in range(0, mat.shape[0], _SCAN_BLOCK):
+                block = np.asarray(mat[start:start + _SCAN_BLOCK])
+                if self.quantization == "int8":
+                    c, sc = quantize_int8(block)
+                    scales.append(sc)
+                else:
+                    c = quantize_binary(block)
+                parts.append(c)
+            width = mat.shape[1] if self.quantization == "int8" else (mat.shape[1] + 7) // 8
+            self._codes = np.concatenate(parts) if parts else np.zeros((0, width), dtype=np.uint8)
+            self._scales = np.concatenate(scales) if scales else None
+        return self._codes, self._scales
+
+    def _approx_scores(self, q: np.ndarray) -> np.ndarray:
+        codes, scales = self._quantized()
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        if self.quantization == "int8":
+            for start in range(0, codes.shape[0], _SCAN_BLOCK):
+                end = start + _SCAN_BLOCK
+                out[start:end] = (codes[start:end].astype(np.float32) @ q) * scales[start:end]
+        else:
+            qbits = quantize_binary(q[None, :])[0]
+            for start in range(0, codes.shape[0], _SCAN_BLOCK):
+                end = start + _SCAN_BLOCK
+                out[start:end] = -_POPCOUNT[np.bitwise_xor(codes[start:end], qbits)].sum(axis=1, dtype=np.int32)
+        return out
+
+    def index_info(self) -> Dict[str, Any]:
+        """Sizes of what a search keeps in memory (codes) vs on disk (float32 rows)."""
+        with self._lock:
+            self._refresh()
+            n, dim = self.count(), self.manifest["dim"] or 0
+            info = {"count": n, "dim": dim, "quantization": self.quantization, "float32_bytes": n * dim * 4}
+            if self.quantization != "none":
+                codes, scales = self._quantized()
+                info["code_bytes"] = int(codes.nbytes + (scales.nbytes if scales is not None else 0))
+                info["rescore"] = self.rescore
+        return info
+
+    def count(self) -> int:
+        """Live records (deleted rows excluded)."""
+        with self._lock:
+            self._refresh()
+            return int(self.manifest["count"]) - len(self.manifest["free"])
+
+    def max_batch_size(self) -> int:
+        return 5000
+
+    def add_embeddings(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """Write precomputed vectors; an id that already exists is overwritten in place."""
+        embs = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embs.ndim != 2 or embs.shape[0] != len(ids):
+            raise ValueError(f"expected {len(ids)} embeddings, got shape {embs.shape}")
+        with self._lock:
+            # the write lock serialises row allocation with every other process writing this store
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._reload()
+                dim = self.manifest["dim"] or embs.shape[1]
+                if embs.shape[1] != dim:
+                    raise ValueError(f"collection '{self.name}' holds {dim}-dim vectors, got {embs.shape[1]}")
+
+                existing = self._rows_for(ids)
+                free = self.manifest["free"]
+                new_rows, reused, appended = [], [], []
+                with open(self._vec_path, "r+b" if os.path.exists(self._vec_path) else "w+b") as f:
+                    for i, id_ in enumerate(ids):
+                        row = existing.get(id_)
+                        if row is None:
+                            if free:
+                                row = free.pop()
+                                reused.append((row,))
+                            else:
+                                row = self.manifest["count"] + len(appended)
+                                appended.append(i)
+                            existing[id_] = row
+                        f.seek(row * dim * 4)
+                        f.write(embs[i].tobytes())
+                        new_rows.append((
+                            row, id_,
+                            documents[i] if documents is not None else None,
+                            json.dumps(metadatas[i]) if metadatas is not None and metadatas[i] is not None else None,
+                        ))
+                self._db.executemany("INSERT OR REPLACE INTO records(row, id, document, metadata) VALUES (?, ?, ?, ?)", new_rows)
+                self._db.executemany("DELETE FROM free_rows WHERE row = ?", reused)
+                self.manifest["dim"] = dim
+                self.manifest["count"] += len(appended)
+                self._db.executemany("INSERT OR REPLACE INTO state(key, value) VALUES (?, ?)",
+                                     [("dim", dim), ("count", self.manifest["count"])])
+            if self.lexical is not None and documents is not None:
+                self.lexical.upsert(ids, documents, metadatas)
+            if getattr(self.embedder, "model_key", None):
+                self.manifest["model"] = self.embedder.model_key
+            self._save_manifest()
+            self._changed()
+
+    def _rows_for(self, ids: List[str]) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            q = "SELECT id, row FROM records WHERE id IN (%s)" % ",".join("?" * len(part))
+            out.update({id_: row for id_, row in self._db.execute(q, part)})
+        return out
+
+    def _records(self, rows: List[int], include: Optional[List[str]] = None) -> Dict[int, tuple]:
+        """{row: (id, document, metadata)}; fields left out of `include` are not read (None)."""
+        include = DEFAULT_INCLUDE if include is None else include
+        doc = "document" if "documents" in include else "NULL"
+        meta = "metadata" if "metadatas" in include else "NULL"
+        q = f"SELECT row, id, {doc}, {meta} FROM records WHERE row IN (%s)" % ",".join("?" * len(rows))
+        return {r[0]: r[1:] for r in self._db.execute(q, [int(r) for r in rows])}
+
+    def _excluded(self, n: int, where: Optional[Dict[str, Any]]) -> Tuple[Optional[Any], int]:
+        """(rows to mask out of the scores, or None; how many rows can match)."""
+        free = self.manifest["free"]
+        if not where:
+            return (free or None), n - len(free)
+        # the filter runs in SQLite first, so the scan only ranks matching rows
+        sql, params = where_sql(where)
+        allowed = [r for (r,) in self._db.execute(f"SELECT row FROM records WHERE {sql}", params) if r < n]
+        mask = np.ones(n, dtype=bool)
+        mask[allowed] = False
+        return mask, len(allowed)
+
+    @staticmethod
+    def _empty(include: List[str]) -> Dict[str, Any]:
+        return {"ids": [[]], **{f: [[]] for f in include}}
+
+    # ---------- VectorStore interface ----------
+
+    upsert_embeddings = add_embeddings
+
+    def get_embeddings(self, ids: List[str]) -> np.ndarray:
+        """Stored vectors for `ids`, in that order."""
+        with self._lock:
+            self._refresh()
+            rows = self._rows_for(ids)
+            return np.asarray(self._matrix()[[rows[i] for i in ids]], dtype=np.float32)
+
+    def source_chunks(self, source: str) -> Dict[str, str]:
+        """{id: content hash} of every stored chunk of `source`."""
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT id, json_extract(metadata, '$.hash') FROM records WHERE json_extract(metadata, '$.source') = ?",
+                (source,),
+            )
+            return {id_: h or id_.rsplit(":", 1)[-1] for id_, h in cur}
+
+    def sources(self) -> List[str]:
+        """Distinct 'source' values of the stored chunks."""
+        with self._lock:
+            cur = self._db.execute("SELECT DISTINCT json_extract(metadata, '$.source') FROM records")
+            return [s for (s,) in cur if s is not None]
+
+    def iter_records(self, page: int = 1000):
+        """(ids, documents, metadatas) pages of the whole collection, without vectors."""
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT row, id, document, metadata FROM records WHERE row > ? ORDER BY row LIMIT ?", (last, page)
+                ).fetchall()
+            if rows:
+                yield [r[1] for r in rows], [r[2] for r in rows], [json.loads(r[3]) if r[3] else None for r in rows]
+                last = rows[-1][0]
+            if len(rows) < page:
+                return
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                rows = self._rows_for(ids)
+                if not rows:
+                    return
+                self._db.executemany("DELETE FROM records WHERE id = ?", [(i,) for i in rows])
+                self._db.executemany("INSERT OR IGNORE INTO free_rows(row) VALUES (?)", [(r,) for r in rows.values()])
+            self._reload()
+            if self.lexical is not None:
+                self.lexical.delete(list(rows))
+            self._save_manifest()
+            self._changed()
+
+    def delete_by_source(self, source: str) -> int:
+        ids = list(self.source_chunks(source))
+        self.delete(ids)
+        return len(ids)
+
+    def sync_source(self, source: str, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Replace `source`'s chunks with `texts`, embedding and writing only what changed."""
+        return sync_source(self, source, texts, metadatas)
+
+    def add_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        source: Optional[str] = None,
+    ):
+        """Embed and upsert; ids default to chunk_id(source, chunk offset, text hash)."""
+        metadatas = chunk_metadata(texts, metadatas, source)
+        if ids is None:
+            ids = chunk_ids_for(texts, metadatas)
+        step = self.max_batch_size()
+        for start in range(0, len(texts), step):
+            end = start + step
+            self.add_embeddings(
+                ids[start:end],
+                self.embedder.embed_documents(texts[start:end]),
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+            )
+
+    upsert_texts = add_texts
+
+    def _distances(self, scores: np.ndarray) -> np.ndarray:
+        if self.space == "l2":
+            return 2.0 - 2.0 * scores
+        return 1.0 - scores
+
+    def search(
+        self,
+        vec: np.ndarray,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Top-k for one (dim,) query vector; exact unless a quantized first pass is configured."""
+        include = check_include(include)
+        with self._lock:
+            self._refresh()
+            mat = self._matrix()
+            n = mat.shape[0]
+            excluded, live = self._excluded(n, where)
+            if live <= 0:
+                return self._empty(include)
+            q = np.asarray(vec, dtype=np.float32)
+            k = min(n_results, live)
+            if self.quantization == "none":
+                scores = mat @ q
+                if excluded is not None:
+                    scores[excluded] = -np.inf
+                top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+                top_scores = scores[top]
+            else:
+                approx = self._approx_scores(q)
+                if excluded is not None:
+                    approx[excluded] = -np.inf
+                m = min(live, k * self.rescore)
+                cand = np.argpartition(-approx, m - 1)[:m] if m < n else np.arange(n)
+                cand.sort()  # ascending rows -> sequential reads from the memmap
+                exact = np.asarray(mat[cand]) @ q
+                best = np.argpartition(-exact, k - 1)[:k] if k < m else np.arange(m)
+                top, top_scores = cand[best], exact[best]
+            order = np.argsort(-top_scores, kind="stable")
+            top, top_scores = top[order], top_scores[order]
+            recs = self._records(top.tolist(), include)
+        return self._result(top, top_scores, recs, include)
+
+    def search_many(
+        self,
+        vecs: np.ndarray,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        block: int = 64,
+    ) -> List[Dict[str, Any]]:
+        """
+        search() for each row of an (m, dim) array. The exact path scores `block`
+        queries per pass over the matrix; the quantized path runs them one by one.
+        """
+        include = check_include(include)
+        qs = np.asarray(vecs, dtype=np.float32)
+        if self.quantization != "none" or len(qs) <= 1:
+            return [self.search(q, n_results=n_results, where=where, include=include) for q in qs]
+        tops = []
+        with self._lock:
+            self._refresh()
+            mat = self._matrix()
+            n = mat.shape[0]
+            excluded, live = self._excluded(n, where)
+            if live <= 0:
+                return [self._empty(include) for _ in qs]
+            k = min(n_results, live)
+            for start in range(0, len(qs), block):
+                scores = mat @ qs[start:start + block].T  # (n, block)
+                if excluded is not None:
+                    scores[excluded] = -np.inf
+                for col in scores.T:
+                    top = np.argpartition(-col, k - 1)[:k] if k < n else np.arange(n)
+                    top = top[np.argsort(-col[top], kind="stable")]
+                    tops.append((top, col[top]))
+            recs = self._records(sorted({r for top, _ in tops for r in top.tolist()}), include)
+        return [self._result(top, top_scores, recs, include) for top, top_scores in tops]
+
+    def _result(
+        self, rows: np.ndarray, scores: np.ndarray, recs: Dict[int, tuple], include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        include = DEFAULT_INCLUDE if include is None else include
+        ids, docs, metas = [], [], []
+        for r in rows.tolist():
+            id_, doc, meta = recs.get(r, (None, None, None))
+            ids.append(id_)
+            docs.append(doc)
+            metas.append(json.loads(meta) if meta else None)
+        out: Dict[str, Any] = {"ids": [ids]}
+        if "documents" in include:
+            out["documents"] = [docs]
+        if "metadatas" in include:
+            out["metadatas"] = [metas]
+        if "distances" in include:
+            out["distances"] = [self._distances(np.asarray(scores, dtype=np.float32)).tolist()]
+        return out
+
+    def query(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Same contract as VectorStore.query; `where` is evaluated in SQLite before the scan."""
+        include = check_include(include)
+        filters = cache_filters(where, include)
+        if self.result_cache is not None:
+            generation = self.result_cache.generation
+            cached = self.result_cache.get(query_text, n_results, filters)
+            if cached is not None:
+                return cached
+        res = self.search(self.embedder.embed_query(query_text), n_results=n_results, where=where, include=include)
+        if self.result_cache is not None:
+            self.result_cache.put(query_text, n_results, filters, res, generation)
+        return res
+
+    def query_many(
+        self,
+        query_texts: List[str],
+        n_results: int = 5,
+        dedupe: bool = True,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """query() for several texts: one embedding pass, one blocked search for everything not cached."""
+        include = check_include(include)
+
+        def _search(texts: List[str]) -> List[Dict[str, Any]]:
+            return self.search_many(self.embedder.embed_queries(texts), n_results=n_results, where=where, include=include)
+        return query_many(self.result_cache, query_texts, n_results, _search, dedupe=dedupe,
+                          filters=cache_filters(where, include))
@@ -24,12 +24,16 @@ class GeminiClient:
                  temperature: float = 0.2,
                  options: Optional[Dict[str, Any]] = None,
                  stream: bool = False,
-                 return_meta: bool = False):
+                 return_meta: bool = False,
+                 timeout: Optional[float] = None,
+                 max_tokens: Optional[int] = None):
         if stream:
             # Keep parity with other wrappers (we're not streaming in this app)
             raise NotImplementedError("stream=True not supported in GeminiClient.generate")
 
         generation_config: Dict[str, Any] = {"temperature": float(temperature)}
+        if max_tokens:
+            generation_config["max_output_tokens"] = int(max_tokens)
         if options:
             generation_config.update(options)
 
@@ -42,7 +46,7 @@ class GeminiClient:
         resp = model.generate_content(
             prompt,
             generation_config=generation_config,
-            request_options={"timeout": self.timeout_seconds},
+            request_options={"timeout": timeout if timeout is not None else self.timeout_seconds},
         )
         text = getattr(resp, "text", "") or ""
 
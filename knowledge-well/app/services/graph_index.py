@@ -0,0 +1,115 @@
+from __future__ import annotations
+import time
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
+
+from .chunk_sync import SourceSync
+from .graphdb import GraphDBClient
+from .rag import GRAPH_FACETS, FACET_QUERIES, facet_nodes_query, facet_rows
+
+
+def iter_facet_nodes(graph: GraphDBClient, facet: str, page_size: int = 1000) -> Iterator[Dict[str, str]]:
+    """Every (paper, node, text) row of a facet, paged with LIMIT/OFFSET."""
+    offset = 0
+    while True:
+        rows = facet_rows(graph.sparql_query(facet_nodes_query(facet, page_size, offset)), facet)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        offset += page_size
+
+
+class GraphNodeIndex:
+    """
+    Vector index over the text nodes of the knowledge graph (Abstract/Purpose,
+    ContentPart, Goal_Achieved and problem-section texts), kept in its own
+    collection with the paper and node IRIs in the metadata.
+
+    refresh() re-exports the nodes and syncs them per paper and facet (source =
+    "<paper IRI>|<facet>"), so only new or changed texts are embedded and nodes
+    or papers that left the graph are deleted. A refresh of some facets only
+    touches those facets' nodes. papers() is the lookup build_graph_blocks
+    uses instead of the title CONTAINS scans.
+    """
+    def __init__(self, store, k: int = 8):
+        self.store = store  # VectorStore or FlatVectorStore of the node collection
+        self.k = max(1, int(k))
+
+    def count(self) -> int:
+        return self.store.count()
+
+    @staticmethod
+    def source(paper: str, facet: str) -> str:
+        return f"{paper}|{facet}"
+
+    def refresh(
+        self,
+        graph: GraphDBClient,
+        facets: Iterable[str] = GRAPH_FACETS,
+        page_size: int = 1000,
+        log=None,
+    ) -> Dict[str, Any]:
+        facets = list(facets)
+        by_source: Dict[str, Dict[Tuple[str, str], Dict[str, Any]]] = {}
+        stats: Dict[str, Any] = {"rows": {}, "papers": 0, "nodes": 0, "unchanged": 0,
+                                 "added": 0, "embedded": 0, "deleted": 0, "sources_removed": 0}
+        for facet in facets:
+            label_key = FACET_QUERIES[facet][2]
+            n = 0
+            for r in iter_facet_nodes(graph, facet, page_size):
+                text = (r.get("text") or "").strip()
+                if not r["paper"] or not text:
+                    continue
+                n += 1
+                by_source.setdefault(self.source(r["paper"], facet), {})[(r["node"], text)] = {
+                    "paper": r["paper"],
+                    "paper_label": r["paperLabel"],
+                    "facet": facet,
+                    "node": r["node"],
+                    "label": r.get(label_key) or "",
+                }
+            stats["rows"][facet] = n
+            if log:
+                log(f"{facet}: {n} rows")
+
+        for source in sorted(by_source):
+            nodes = by_source[source]
+            keys = sorted(nodes)  # stable order -> stable chunk offsets between refreshes
+            sync = SourceSync(self.store, source)
+            sync.write([k[1] for k in keys], [nodes[k] for k in keys], offset=0)
+            done = sync.finish()
+            for key in ("unchanged", "added", "embedded", "deleted"):
+                stats[key] += done[key]
+            stats["nodes"] += len(keys)
+        stats["papers"] = len({source.rsplit("|", 1)[0] for source in by_source})
+
+        # sweep only what this refresh covers: (paper, facet) pairs of the refreshed facets that
+        # are gone, plus sources of the old one-per-paper layout on a full refresh
+        refreshed, full = set(facets), set(facets) >= set(GRAPH_FACETS)
+        for source in self.store.sources():
+            if source in by_source:
+                continue
+            paper, _, facet = source.rpartition("|")
+            if (paper and facet in refreshed) or (full and facet not in GRAPH_FACETS):
+                stats["deleted"] += self.store.delete_by_source(source)
+                stats["sources_removed"] += 1
+        return stats
+
+    def papers(self, term: str, facets: Optional[Iterable[str]] = None, k: Optional[int] = None) -> Tuple[List[str], Dict[str, int], float]:
+        """
+        (paper IRIs, {node text: rank}, lookup ms) for the `k` nodes nearest to
+        `term`, restricted to `facets`. Papers keep the rank of their best node.
+        """
+        t0 = time.perf_counter()
+        wanted = sorted(set(facets)) if facets is not None else list(GRAPH_FACETS)
+        if not wanted:
+            return [], {}, 0.0
+        where = {"facet": {"$in": wanted}} if len(wanted) < len(GRAPH_FACETS) else None
+        res = self.store.query(term, n_results=k or self.k, where=where, include=["documents", "metadatas"])
+        papers: List[str] = []
+        rank: Dict[str, int] = {}
+        for doc, meta in zip((res.get("documents") or [[]])[0], (res.get("metadatas") or [[]])[0]):
+            rank.setdefault(doc, len(rank))
+            paper = (meta or {}).get("paper") or (meta or {}).get("source")
+            if paper and paper not in papers:
+                papers.append(paper)
+        return papers, rank, round((time.perf_counter() - t0) * 1000.0, 2)
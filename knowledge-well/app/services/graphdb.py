@@ -1,6 +1,6 @@
 from __future__ import annotations
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Union
 import httpx
 from .utils import to_query_params_compat
 
@@ -78,14 +78,23 @@ class GraphDBClient:
 
     # ---------- SPARQL APIs ----------
 
-    def sparql_query(self, query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """POST SPARQL SELECT/ASK to /repositories/{repo}, expect JSON."""
+    def sparql_query(
+        self,
+        query: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """POST SPARQL SELECT/ASK to /repositories/{repo}, expect JSON.
+        `timeout` (seconds) overrides the client default for this call only."""
         q = to_query_params_compat(query, params) if params else query
         url = f"{self.base_url}/repositories/{self.repository}"
         headers = self._headers(accept="application/sparql-results+json")
         auth = self._auth_basic() if self.auth_mode == "BASIC" else None
 
-        resp = self._client.post(url, headers=headers, auth=auth, data={"query": q})
+        resp = self._client.post(
+            url, headers=headers, auth=auth, data={"query": q},
+            timeout=timeout if timeout is not None else self.timeout,
+        )
         resp.raise_for_status()
         return resp.json()
 
@@ -106,3 +115,24 @@ class GraphDBClient:
 
         resp = self._client.post(url, headers=headers, auth=auth, content=update.encode("utf-8"))
         resp.raise_for_status()
+
+    def add_statements(
+        self,
+        body: Union[bytes, Iterable[bytes]],
+        content_type: str = "application/n-triples",
+        context: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """POST RDF to /repositories/{repo}/statements, into the named graph `context` if given.
+        `body` may be an iterator of byte chunks, which is streamed (chunked) instead of buffered."""
+        url = f"{self.base_url}/repositories/{self.repository}/statements"
+        headers = {"Content-Type": content_type}
+        headers.update(self._headers(accept="*/*"))
+        auth = self._auth_basic() if self.auth_mode == "BASIC" else None
+        params = {"context": f"<{context}>"} if context else None
+
+        resp = self._client.post(
+            url, headers=headers, auth=auth, params=params, content=body,
+            timeout=timeout if timeout is not None else self.timeout,
+        )
+        resp.raise_for_status()
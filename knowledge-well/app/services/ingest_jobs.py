@@ -0,0 +1,180 @@
+from __future__ import annotations
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+
+from ..core.config import settings
+from .chunk_sync import SourceSync
+from .extract import extract_documents, kind_of
+from .textsplitter import chunk_document
+
+
+@dataclass
+class IngestJob:
+    """Progress of one uploaded file through extract -> chunk -> embed -> write."""
+    id: str
+    filename: str
+    path: str
+    content_type: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    status: str = "queued"  # queued | running | done | failed
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    bytes: int = 0
+    documents: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    written: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    embed_ms: float = 0.0
+    write_ms: float = 0.0
+    error: Optional[str] = None
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.finished or time.time()
+        elapsed = (end - self.started) if self.started else 0.0
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "kind": kind_of(self.filename, self.content_type),
+            "status": self.status,
+            "bytes": self.bytes,
+            "documents": self.documents,
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "written": self.written,
+            "unchanged": self.unchanged,
+            "deleted": self.deleted,
+            "progress": round((self.written + self.unchanged) / self.chunks, 4) if self.chunks else 0.0,
+            "queued_s": round((self.started or end) - self.created, 3),
+            "elapsed_s": round(elapsed, 3),
+            "chunks_per_s": round((self.written + self.unchanged) / elapsed, 2) if elapsed > 0 else 0.0,
+            "embed_ms": round(self.embed_ms, 1),
+            "write_ms": round(self.write_ms, 1),
+            "error": self.error,
+        }
+
+
+class IngestQueue:
+    """
+    Background indexing: uploads are spooled to disk by the request, then a
+    small worker pool chunks them, embeds in EMBED_BATCH slices and writes in
+    Chroma-sized batches. An upload replaces the earlier version of the same
+    source (filename, or metadata["source"]): unchanged chunks are skipped, only
+    new ones are embedded, and chunks that disappeared are deleted. Finished
+    jobs are kept (bounded) for status queries.
+    """
+    def __init__(self, workers: int = 1, max_queued: int = 32, max_jobs: int = 200):
+        self.workers = max(1, int(workers))
+        self.max_queued = max(1, int(max_queued))
+        self.max_jobs = max(1, int(max_jobs))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+        return self._pool
+
+    def submit(
+        self,
+        vs,
+        path: str,
+        filename: str,
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        size: int = 0,
+    ) -> IngestJob:
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+            if pending >= self.max_queued:
+                raise RuntimeError(f"ingest queue is full ({pending} jobs pending)")
+            job = IngestJob(id=uuid.uuid4().hex, filename=filename, path=path,
+                            content_type=content_type, metadata=dict(metadata or {}), bytes=size)
+            self._jobs[job.id] = job
+            self._evict()
+        self._executor().submit(self._run, vs, job)
+        return job
+
+    def _evict(self) -> None:
+        finished = [jid for jid, j in self._jobs.items() if j.status in ("done", "failed")]
+        while len(self._jobs) > self.max_jobs and finished:
+            self._jobs.pop(finished.pop(0), None)
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j.summary() for j in reversed(jobs)]
+
+    def _flush(self, sync: SourceSync, job: IngestJob, texts: List[str], metas: List[Dict[str, Any]], offset: int) -> None:
+        def _embed(batch_texts):
+            t0 = time.perf_counter()
+            embs = sync.store.embedder.embed_documents(batch_texts)
+            job.embed_ms += (time.perf_counter() - t0) * 1000.0
+            job.embedded += len(embs)
+            return embs
+
+        batch = max(1, settings.EMBED_BATCH)
+        for start in range(0, len(texts), batch):
+            t0, embed_before = time.perf_counter(), job.embed_ms
+            written = sync.write(texts[start:start + batch], metas[start:start + batch], offset=offset + start, embed=_embed)
+            job.write_ms += (time.perf_counter() - t0) * 1000.0 - (job.embed_ms - embed_before)
+            job.written += written
+            job.unchanged += min(batch, len(texts) - start) - written
+
+    def _run(self, vs, job: IngestJob) -> None:
+        job.status, job.started = "running", time.time()
+        flush_at = vs.max_batch_size()
+        texts: List[str] = []
+        metas: List[Dict[str, Any]] = []
+        try:
+            # an explicit metadata.source replaces that source's earlier chunks; without one the
+            # upload is its own source, so two files that share a name cannot delete each other
+            sync = SourceSync(vs, str(job.metadata.get("source") or f"upload/{job.id}/{job.filename}"))
+            for text, doc_meta in extract_documents(job.path, job.filename, job.content_type):
+                job.documents += 1
+                for chunk in chunk_document(text):
+                    texts.append(chunk)
+                    metas.append({**job.metadata, **doc_meta})
+                    job.chunks += 1
+                    if len(texts) >= flush_at:
+                        self._flush(sync, job, texts, metas, job.chunks - len(texts))
+                        texts, metas = [], []
+            if texts:
+                self._flush(sync, job, texts, metas, job.chunks - len(texts))
+            job.deleted = sync.finish()["deleted"]
+            job.status = "done"
+        except Exception as e:
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            job.finished = time.time()
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+ingest_queue = IngestQueue(
+    workers=settings.INGEST_WORKERS,
+    max_queued=settings.INGEST_MAX_QUEUED,
+    max_jobs=settings.INGEST_MAX_JOBS,
+)
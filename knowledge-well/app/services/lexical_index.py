@@ -0,0 +1,248 @@
+from __future__ import annotations
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from ..core.config import settings
+from .metadata_filter import DEFAULT_INCLUDE, check_include, project, where_sql
+
+# Chunks live in `records`; `fts` is an external-content FTS5 index over their
+# text, so the text is stored once and the index only holds the postings.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    row      INTEGER PRIMARY KEY,
+    id       TEXT NOT NULL UNIQUE,
+    source   TEXT,
+    document TEXT NOT NULL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS records_source ON records(source);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(
+    document, content='records', content_rowid='row', tokenize='porter unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS records_ai AFTER INSERT ON records BEGIN
+    INSERT INTO fts(rowid, document) VALUES (new.row, new.document);
+END;
+CREATE TRIGGER IF NOT EXISTS records_ad AFTER DELETE ON records BEGIN
+    INSERT INTO fts(fts, rowid, document) VALUES ('delete', old.row, old.document);
+END;
+"""
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+")
+
+
+def lexical_index_path(collection: str) -> str:
+    return os.path.join(settings.LEXICAL_INDEX_DIR, f"{collection}.sqlite3")
+
+
+def query_terms(text: str) -> List[str]:
+    """
+    Search terms of a question: its words minus stopwords, plus both sides of
+    the domain aliases it mentions ("d2w" <-> "die to wafer"), so an acronym
+    also finds the spelled-out form and vice versa.
+    """
+    from .rag import ALIASES, STOPWORDS  # rag pulls in the GraphDB client; only needed here
+    q = " ".join(_TOKEN.findall(text.lower()))
+    terms = [t for t in q.split() if t not in STOPWORDS]
+    for short, full in ALIASES.items():
+        short_n = " ".join(_TOKEN.findall(short))
+        if re.search(rf"\b{re.escape(short_n)}\b", q) or re.search(rf"\b{re.escape(full)}\b", q):
+            # the spelled-out form, plus the short form when it is a single word (d2w, cowos)
+            extra = full.split() + ([short_n] if " " not in short_n else [])
+            terms += [t for t in extra if t not in STOPWORDS]
+    return list(dict.fromkeys(terms))
+
+
+class LexicalIndex:
+    """
+    BM25 keyword index over the same chunks as the vector collection, in one
+    SQLite file (FTS5). It needs no embedding model, so it can serve queries
+    before torch is loaded (RETRIEVAL_MODE=lexical) and is fused with the
+    vector results in hybrid mode. The vector stores keep it in sync on every
+    write and delete; app.tools.build_lexical backfills an existing collection.
+
+    query() has the vector stores' contract. "distances" are SQLite's bm25()
+    values (negative, lower is better, so results sort like vector distances);
+    "scores" are the same values negated (higher is better).
+    """
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._db.execute("SELECT COUNT(*) FROM records").fetchone()[0])
+
+    def upsert(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        rows = []
+        for i, (id_, doc) in enumerate(zip(ids, documents)):
+            meta = (metadatas[i] if metadatas is not None else None) or {}
+            rows.append((id_, meta.get("source"), doc or "", json.dumps(meta) if meta else None))
+        with self._lock, self._db:
+            # delete + insert (not INSERT OR REPLACE) so the FTS delete trigger fires
+            self._db.executemany("DELETE FROM records WHERE id = ?", [(r[0],) for r in rows])
+            self._db.executemany("INSERT INTO records (id, source, document, metadata) VALUES (?, ?, ?, ?)", rows)
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM records WHERE id = ?", [(i,) for i in ids])
+
+    def delete_by_source(self, source: str) -> int:
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM records WHERE source = ?", (source,)).rowcount
+
+    def rebuild(self, batches: Iterable[Tuple[List[str], List[str], List[Optional[Dict[str, Any]]]]]) -> int:
+        """Replace the whole index with (ids, documents, metadatas) batches; returns the count."""
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM records")
+            for ids, docs, metas in batches:
+                self.upsert(ids, docs, metas)
+            with self._db:
+                self._db.execute("INSERT INTO fts(fts) VALUES ('optimize')")
+            return self.count()
+
+    def query(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        include = check_include(include)
+        terms = query_terms(query_text)
+        if not terms:
+            return {**project({"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}, include),
+                    "scores": [[]]}
+        doc = "r.document" if "documents" in include else "NULL"
+        meta = "r.metadata" if "metadatas" in include else "NULL"
+        sql = (f"SELECT r.id, {doc}, {meta}, bm25(fts) AS score FROM fts JOIN records r ON r.row = fts.rowid "
+               "WHERE fts MATCH ?")
+        params: List[Any] = [" OR ".join(f'"{t}"' for t in terms)]
+        if where:
+            cond, cond_params = where_sql(where)
+            sql += f" AND {cond.replace('json_extract(metadata', 'json_extract(r.metadata')}"
+            params += cond_params
+        sql += " ORDER BY score LIMIT ?"
+        params.append(int(n_results))
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        res = {
+            "ids": [[r[0] for r in rows]],
+            "documents": [[r[1] for r in rows]],
+            "metadatas": [[json.loads(r[2]) if r[2] else None for r in rows]],
+            "distances": [[r[3] for r in rows]],
+        }
+        return {**project(res, include), "scores": [[-r[3] for r in rows]]}
+
+    def query_many(
+        self,
+        query_texts: List[str],
+        n_results: int = 5,
+        dedupe: bool = True,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        done: Dict[str, Dict[str, Any]] = {}
+        out = []
+        for text in query_texts:
+            key = " ".join(text.split())
+            if not dedupe or key not in done:
+                done[key] = self.query(text, n_results=n_results, where=where, include=include)
+            out.append(done[key])
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def rrf_fuse(
+    result_lists: List[Dict[str, Any]],
+    n_results: int,
+    k: int = 60,
+    include: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Reciprocal rank fusion of single-query results: each id scores
+    sum(1 / (k + rank)) over the lists it appears in. "scores" is that fused
+    score (higher is better) and "distances" its negation, so every hit has a
+    numeric distance that sorts like a vector distance (lower is better);
+    distances of different retrieval modes are not comparable.
+    """
+    include = DEFAULT_INCLUDE if include is None else include
+    scores: Dict[str, float] = {}
+    fields: Dict[str, Dict[str, Any]] = {}
+    for res in result_lists:
+        ids = (res.get("ids") or [[]])[0]
+        docs = (res.get("documents") or [[]])[0] or []
+        metas = (res.get("metadatas") or [[]])[0] or []
+        for rank, id_ in enumerate(ids):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank + 1)
+            f = fields.setdefault(id_, {"document": None, "metadata": None})
+            if f["document"] is None and rank < len(docs):
+                f["document"] = docs[rank]
+            if f["metadata"] is None and rank < len(metas):
+                f["metadata"] = metas[rank]
+    top = sorted(scores, key=lambda i: -scores[i])[:n_results]
+    res = {
+        "ids": [top],
+        "documents": [[fields[i]["document"] for i in top]],
+        "metadatas": [[fields[i]["metadata"] for i in top]],
+        "distances": [[-round(scores[i], 6) for i in top]],
+    }
+    return {**project(res, include), "scores": [[round(scores[i], 6) for i in top]]}
+
+
+class HybridRetriever:
+    """
+    Vector + BM25 retrieval fused with reciprocal rank fusion
+    (RETRIEVAL_MODE=hybrid). Each side contributes its top `candidates`;
+    acronyms the embedding model misses still surface through the keyword side.
+    """
+    def __init__(self, vector_store, lexical: LexicalIndex, rrf_k: int = 60, candidates: int = 20):
+        self.vs = vector_store
+        self.lexical = lexical
+        self.rrf_k = max(1, int(rrf_k))
+        self.candidates = max(1, int(candidates))
+
+    def query(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        include = check_include(include)
+        n = max(n_results, self.candidates)
+        vec = self.vs.query(query_text, n_results=n, where=where)
+        lex = self.lexical.query(query_text, n_results=n, where=where)
+        return rrf_fuse([vec, lex], n_results, k=self.rrf_k, include=include)
+
+    def query_many(
+        self,
+        query_texts: List[str],
+        n_results: int = 5,
+        dedupe: bool = True,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        include = check_include(include)
+        n = max(n_results, self.candidates)
+        vecs = self.vs.query_many(query_texts, n_results=n, dedupe=dedupe, where=where)
+        lexs = self.lexical.query_many(query_texts, n_results=n, dedupe=dedupe, where=where)
+        return [rrf_fuse([v, l], n_results, k=self.rrf_k, include=include) for v, l in zip(vecs, lexs)]
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import json
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+# Result fields a caller can ask for; ids are always returned
+INCLUDABLE = ("documents", "metadatas", "distances")
+DEFAULT_INCLUDE = list(INCLUDABLE)
+
+_COMPARE = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+_Scalar = Union[str, int, float, bool]
+
+
+def check_include(include: Optional[List[str]]) -> List[str]:
+    """Validated projection, in canonical order; None = everything."""
+    if include is None:
+        return list(DEFAULT_INCLUDE)
+    unknown = set(include) - set(INCLUDABLE)
+    if unknown:
+        raise ValueError(f"unknown include field(s): {', '.join(sorted(unknown))} (expected {', '.join(INCLUDABLE)})")
+    return [f for f in INCLUDABLE if f in include]
+
+
+def _field(name: str, value) -> Dict[str, Any]:
+    return {name: {"$in": list(value)} if isinstance(value, (list, tuple)) else value}
+
+
+def build_where(
+    source: Optional[Union[str, List[str]]] = None,
+    year: Optional[Union[int, List[int]]] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    section: Optional[Union[str, List[str]]] = None,
+    where: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Chroma `where` for the common metadata filters (lists mean "any of"), ANDed
+    with a raw `where` clause; None when nothing is filtered.
+    """
+    clauses: List[Dict[str, Any]] = []
+    if source is not None:
+        clauses.append(_field("source", source))
+    if section is not None:
+        clauses.append(_field("section", section))
+    if year is not None:
+        clauses.append(_field("year", year))
+    if year_from is not None:
+        clauses.append({"year": {"$gte": int(year_from)}})
+    if year_to is not None:
+        clauses.append({"year": {"$lte": int(year_to)}})
+    if where:
+        clauses.append(where)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def cache_filters(where: Optional[Dict[str, Any]], include: List[str]) -> Optional[Dict[str, Any]]:
+    """The part of a query besides text and k that changes its result (query cache key)."""
+    filters: Dict[str, Any] = {}
+    if where:
+        filters["where"] = where
+    if include != DEFAULT_INCLUDE:
+        filters["include"] = include
+    return filters or None
+
+
+def project(res: Dict[str, Any], include: List[str]) -> Dict[str, Any]:
+    """Only ids and the included fields of a query result."""
+    return {k: v for k, v in res.items() if k == "ids" or k in include}
+
+
+def where_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """
+    SQLite condition over a JSON `metadata` column for a Chroma-style `where`
+    ($and/$or, $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin); used by the flat backend.
+    """
+    if not isinstance(where, dict) or not where:
+        raise ValueError("where must be a non-empty object")
+    parts: List[str] = []
+    params: List[Any] = []
+    for key, cond in where.items():
+        if key in ("$and", "$or"):
+            if not isinstance(cond, list) or not cond:
+                raise ValueError(f"{key} expects a non-empty list")
+            subs = [where_sql(c) for c in cond]
+            parts.append("(" + (" AND " if key == "$and" else " OR ").join(s for s, _ in subs) + ")")
+            for _, p in subs:
+                params.extend(p)
+            continue
+        if key.startswith("$"):
+            raise ValueError(f"unsupported where operator '{key}'")
+        col = "json_extract(metadata, ?)"
+        path = "$." + json.dumps(key)
+        ops = cond if isinstance(cond, dict) else {"$eq": cond}
+        for op, value in ops.items():
+            if op in _COMPARE:
+                parts.append(f"{col} {_COMPARE[op]} ?")
+                params.extend([path, value])
+            elif op in ("$in", "$nin"):
+                if not isinstance(value, list) or not value:
+                    raise ValueError(f"{op} expects a non-empty list")
+                neg = "NOT " if op == "$nin" else ""
+                parts.append(f"{col} {neg}IN ({','.join('?' * len(value))})")
+                params.extend([path, *value])
+            else:
+                raise ValueError(f"unsupported where operator '{op}'")
+    return "(" + " AND ".join(parts) + ")", params
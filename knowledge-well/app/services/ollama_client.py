@@ -1,7 +1,7 @@
 
 from __future__ import annotations
 import httpx
-from typing import List
+from typing import List, Optional
 
 class OllamaClient:
     def __init__(self, base_url: str = "http://localhost:11434", model: str = "llama3.1:8b", timeout: int = 600):
@@ -9,15 +9,26 @@ class OllamaClient:
         self.model = model
         self.client = httpx.Client(timeout=timeout)
 
-    def generate(self, prompt: str, system: str = "", temperature: float = 0.2) -> str:
+    def generate(
+        self,
+        prompt: str,
+        system: str = "",
+        temperature: float = 0.2,
+        timeout: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
         # Non-streaming generate
+        options = {"temperature": temperature}
+        if max_tokens:
+            options["num_predict"] = max_tokens
         payload = {
             "model": self.model,
             "prompt": prompt if not system else f"<<SYS>>\n{system}\n<</SYS>>\n{prompt}",
             "stream": False,
-            "options": {"temperature": temperature},
+            "options": options,
         }
-        r = self.client.post(f"{self.base_url}/api/generate", json=payload)
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        r = self.client.post(f"{self.base_url}/api/generate", json=payload, **kwargs)
         r.raise_for_status()
         data = r.json()
         return data.get("response", "")
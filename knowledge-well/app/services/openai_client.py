@@ -28,6 +28,8 @@ class OpenAIClient:
         options: Optional[Dict[str, Any]] = None,
         stream: bool = False,              # keep False to mirror your current behavior
         return_meta: bool = False,         # <-- NEW
+        timeout: Optional[float] = None,   # per-call override of timeout_seconds
+        max_tokens: Optional[int] = None,  # cap on generated tokens
     ):
         if stream:
             raise NotImplementedError("stream=True not supported in OpenAIClient.generate")
@@ -39,8 +41,10 @@ class OpenAIClient:
                 model=self.model,
                 input=text_input,
                 temperature=temperature,
-                timeout=self.timeout_seconds,
+                timeout=timeout if timeout is not None else self.timeout_seconds,
             )
+            if max_tokens:
+                kwargs["max_output_tokens"] = max_tokens
             if options:
                 kwargs.update(options)
 
@@ -88,8 +92,10 @@ class OpenAIClient:
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
-                timeout=self.timeout_seconds,
+                timeout=timeout if timeout is not None else self.timeout_seconds,
             )
+            if max_tokens:
+                kwargs["max_tokens"] = max_tokens
             if options:
                 kwargs.update(options)
 
@@ -0,0 +1,426 @@
+from __future__ import annotations
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+
+from ..core.config import settings
+from .budget import Budget
+from .components import registry
+from .facet_planner import planner as default_planner
+from .hardcoded_solutions import HARDCODED_SOLUTIONS
+from .metadata_filter import DEFAULT_INCLUDE, project
+from .rag import (
+    build_prompt,
+    build_graph_blocks,
+    extract_keywords,
+    probe_terms,
+)
+from .sessions import Session
+from .triple_writer import parse_triples
+
+SYSTEM_PROMPT = "You are a precise RAG assistant; cite sources."
+
+NO_TERMS_ANSWER = (
+    "I couldn’t extract domain terms from your question. "
+    "Please include key phrases (e.g., “hybrid bonding”, “advanced packaging”)."
+)
+
+GENERATION_FAILED_ANSWER = (
+    "The answer could not be generated within the latency budget. "
+    "The most relevant retrieved passages are listed below."
+)
+
+# Stage order. Each stage reads what earlier stages left on the state and
+# adds its own result; nothing is recomputed further down the line.
+# Keywords run before the vector search so a session follow-up knows which
+# terms are new before deciding what to retrieve.
+# writeback only queues the answer's triples; the GraphDB load runs in the background.
+STAGES = ("fast_path", "keywords", "vector", "probe", "graph", "prompt", "generate", "writeback")
+
+
+def _empty_hits() -> Dict[str, Any]:
+    return {"documents": [[]], "metadatas": [[]], "ids": [[]], "distances": [[]]}
+
+
+def _context_answer(state: "PipelineState", max_chars: int = 400) -> str:
+    """Degraded answer when generation fails: the top vector passages (or the graph context)."""
+    lines = [GENERATION_FAILED_ANSWER, ""]
+    docs = (state.hits.get("documents") or [[]])[0] or []
+    metas = (state.hits.get("metadatas") or [[]])[0] or []
+    for i, doc in enumerate(docs[:5]):
+        meta = (metas[i] if i < len(metas) else None) or {}
+        src = meta.get("source") or meta.get("path") or f"Doc {i + 1}"
+        text = re.sub(r"\s+", " ", doc or "").strip()
+        lines.append(f"- {src}: {text[:max_chars]}{'…' if len(text) > max_chars else ''}")
+    if not docs and state.graph_context:
+        lines.append(state.graph_context[:max_chars * 5])
+    return "\n".join(lines)
+
+
+def _normalize_text(text: str) -> str:
+    """Normalizes a string for comparison."""
+    text = text.lower().strip()
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[^a-z0-9\s?]', '', text)
+    return text
+
+
+def find_hardcoded_answer(question: str) -> Optional[Dict[str, Any]]:
+    """Checks if the question matches a hardcoded solution."""
+    normalized_question = _normalize_text(question)
+    for solution in HARDCODED_SOLUTIONS:
+        if normalized_question == _normalize_text(solution["question"]):
+            return solution
+    return None
+
+
+def hardcoded_state(question: str, session: Optional["Session"] = None) -> Optional["PipelineState"]:
+    """
+    The fast-path stage on its own: the finished state for a hardcoded question,
+    else None. Callers check it before loading any component, so these answers
+    never wait for (or fail on) the embedder, GraphDB or the LLM.
+    """
+    state = PipelineState(question=question, session=session)
+    t0 = time.perf_counter()
+    RAGPipeline._stage_fast_path(state)
+    if not state.done:
+        return None
+    state.stage_ms["fast_path"] = (time.perf_counter() - t0) * 1000
+    return state
+
+
+@dataclass
+class PipelineState:
+    """Everything one /chat request computes, handed from stage to stage."""
+    question: str
+    k: int = 5
+    temperature: float = 0.2
+    budget: Budget = field(default_factory=Budget)
+    session: Optional[Session] = None
+    where: Optional[Dict[str, Any]] = None                            # metadata filter of the vector search
+    vector_include: List[str] = field(default_factory=lambda: list(DEFAULT_INCLUDE))  # echoed hit fields
+
+    # fast-path
+    hardcoded: Optional[Dict[str, Any]] = None
+    # embed/vector
+    hits: Dict[str, Any] = field(default_factory=_empty_hits)
+    # keywords/rewrite
+    terms: List[str] = field(default_factory=list)
+    rewriter_debug: Dict[str, Any] = field(default_factory=dict)
+    new_terms: List[str] = field(default_factory=list)      # session: terms not seen in earlier turns
+    reused_terms: List[str] = field(default_factory=list)   # session: terms whose graph context is carried over
+    # probe
+    graph_terms: List[str] = field(default_factory=list)
+    # graph
+    graph_context: str = ""
+    graph_blocks: Dict[str, str] = field(default_factory=dict)
+    graph_debug: Dict[str, Any] = field(default_factory=dict)
+    # prompt / generate
+    prompt: str = ""
+    answer: str = ""
+    llm_meta: Dict[str, Any] = field(default_factory=dict)
+
+    stage_ms: Dict[str, float] = field(default_factory=dict)
+    done: bool = False          # a stage produced the final answer; skip the rest
+    outcome: str = "rag"        # "rag" | "hardcoded" | "no_terms"
+
+    def _ms(self, *names: str) -> float:
+        return round(sum(self.stage_ms.get(n, 0.0) for n in names), 1)
+
+    def timing(self) -> Dict[str, Any]:
+        # vector/graph/reasoning keep their original meaning for the UI;
+        # "stages" carries the per-stage breakdown.
+        vector_ms = self._ms("fast_path", "vector")
+        graph_ms = self._ms("keywords", "probe", "graph")  # keywords includes the rewriter
+        reasoning_ms = self._ms("prompt", "generate", "writeback")
+        return {
+            "vector_ms": vector_ms,
+            "graph_ms": graph_ms,
+            "query_ms": round(vector_ms + graph_ms, 1),
+            "reasoning_ms": reasoning_ms,
+            "total_ms": self._ms(*STAGES),
+            "stages": {f"{n}_ms": round(v, 1) for n, v in self.stage_ms.items()},
+        }
+
+    def to_response(self) -> Dict[str, Any]:
+        """Shape the state into the /chat JSON payload."""
+        resp = self._payload()
+        resp["degradations"] = list(self.budget.applied)
+        resp["budget"] = self.budget.summary()
+        if self.session is not None:
+            resp["session"] = {
+                **self.session.summary(),
+                "new_terms": self.new_terms,
+                "reused_terms": self.reused_terms,
+            }
+        return resp
+
+    def _payload(self) -> Dict[str, Any]:
+        if self.outcome == "hardcoded":
+            return {
+                "answer": f"{self.hardcoded['solution']} (GraphDB)",
+                "context_used": {"vector": {}, "graph": "Hardcoded Solution"},
+                "graph_debug": {"rewriter_debug": {}, "terms_used": []},
+                "timing": self.timing(),
+                "llm_meta": {"provider": "N/A", "model": "N/A"},
+            }
+        if self.outcome == "no_terms":
+            return {
+                "answer": NO_TERMS_ANSWER,
+                "context_used": {"vector": project(self.hits, self.vector_include), "graph": ""},
+                "graph_debug": {"rewriter_debug": self.rewriter_debug, "terms_used": []},
+                "timing": self.timing(),
+            }
+        return {
+            "answer": self.answer,
+            "context_used": {"vector": project(self.hits, self.vector_include), "graph": self.graph_context},
+            "graph_debug": {**self.graph_debug, "rewriter_debug": self.rewriter_debug, "terms_used": self.terms},
+            "timing": self.timing(),
+            "llm_meta": self.llm_meta,
+        }
+
+
+class RAGPipeline:
+    """
+    One hybrid RAG pipeline shared by the FastAPI router and the MCP tool.
+    Stages run in STAGES order over a PipelineState and are timed individually.
+    """
+    def __init__(self, vs, graph, llm, rewriter=None, max_terms: int = 4, planner=None, node_index=None,
+                 triple_writer=None):
+        self.vs = vs
+        self.graph = graph
+        self.llm = llm
+        self.rewriter = rewriter
+        self.max_terms = max_terms
+        # FacetPlanner; None disables planning (all facets for every term)
+        self.planner = planner if planner is not None else (default_planner if settings.FACET_PLANNER else None)
+        # GraphNodeIndex; papers are then found by ANN lookup and terms need no probing
+        if node_index is None and settings.GRAPH_ANN:
+            node_index = registry.graph_index()
+            if not node_index.count():
+                node_index = None  # not built yet (app.tools.index_graph): keyword path
+        self.node_index = node_index
+        # TripleWriter; None unless TRIPLE_WRITEBACK
+        if triple_writer is None and settings.TRIPLE_WRITEBACK:
+            triple_writer = registry.triple_writer()
+        self.triple_writer = triple_writer
+
+    def run(
+        self,
+        question: str,
+        k: int = 5,
+        temperature: float = 0.2,
+        deadline_ms: Optional[float] = None,
+        session: Optional[Session] = None,
+        where: Optional[Dict[str, Any]] = None,
+        vector_include: Optional[List[str]] = None,
+    ) -> PipelineState:
+        """
+        Run every stage; `deadline_ms` (else CHAT_DEADLINE_MS) bounds the whole request.
+        With a `session`, follow-up turns reuse its context and only fetch new terms.
+        `where` filters the vector search by metadata; `vector_include` trims the
+        hit fields echoed in the response (the prompt always sees the full hits).
+        """
+        state = PipelineState(
+            question=question,
+            k=k or 5,
+            temperature=temperature or 0.2,
+            budget=Budget(deadline_ms if deadline_ms is not None else settings.CHAT_DEADLINE_MS),
+            session=session,
+            where=where,
+        )
+        if vector_include is not None:
+            state.vector_include = list(vector_include)
+        if session is None:
+            self._run_stages(state)
+            return state
+        with session.lock:  # turns of one conversation run one at a time
+            self._run_stages(state)
+            if state.outcome == "rag":
+                # only terms whose graph query completed become known; skipped, trimmed
+                # or failed ones are looked up again on a later turn
+                failed = set(state.graph_debug.get("failed_kw", []))
+                queried = [kw for kw in state.graph_debug.get("facets_per_kw", {}) if kw not in failed]
+                session.remember(
+                    state.question,
+                    state.hits,
+                    queried,
+                    {kw: state.graph_blocks.get(kw, "") for kw in queried},
+                    hits_options=self._hits_options(state),
+                )
+        return state
+
+    def _run_stages(self, state: PipelineState) -> None:
+        for name in STAGES:
+            if state.done:
+                break
+            t0 = time.perf_counter()
+            getattr(self, f"_stage_{name}")(state)
+            state.stage_ms[name] = (time.perf_counter() - t0) * 1000
+
+    @staticmethod
+    def _hits_options(state: PipelineState) -> Dict[str, Any]:
+        # what a turn searched with besides the query; a follow-up reuses hits only on a match
+        return {"where": state.where, "include": state.vector_include, "k": state.k}
+
+    @staticmethod
+    def _is_followup(state: PipelineState) -> bool:
+        return state.session is not None and state.session.is_followup
+
+    # ---------- Stages ----------
+
+    @staticmethod
+    def _stage_fast_path(state: PipelineState) -> None:
+        solution = find_hardcoded_answer(state.question)
+        if solution:
+            state.hardcoded = solution
+            state.outcome = "hardcoded"
+            state.done = True
+
+    def _stage_vector(self, state: PipelineState) -> None:
+        query = state.question
+        if self._is_followup(state):
+            reusable = state.session.hits_for(self._hits_options(state))
+            if not state.new_terms and reusable is not None:
+                state.hits = reusable  # nothing new to look for, same filter and k
+                return
+            # anchor the follow-up ("... for that?") to the conversation's topic
+            query = " ".join(state.reused_terms + [state.question])
+        try:
+            # unfiltered queries pass no kwargs, matching what run_batch prefetches
+            state.hits = self.vs.query(query, n_results=state.k, **({"where": state.where} if state.where else {}))
+        except Exception as e:
+            # Log the error but continue gracefully
+            print(f"Vector store query failed: {e}")
+
+    def _stage_keywords(self, state: PipelineState) -> None:
+        # Heuristic + optional rewriter
+        terms = extract_keywords(state.question)
+        use_rewriter = settings.USE_LLM_REWRITER and self.rewriter is not None
+        if self._is_followup(state):
+            state.reused_terms = state.session.carried_terms(settings.SESSION_CARRY_TERMS)
+        if use_rewriter and self._is_followup(state) and (state.reused_terms or terms):
+            state.rewriter_debug = {"skipped": "session follow-up"}
+        elif use_rewriter and state.budget.degrade("skip_rewriter"):
+            state.rewriter_debug = {"skipped": "latency budget"}
+        elif use_rewriter:
+            try:
+                rw_out = self.rewriter.rewrite(
+                    state.question,
+                    timeout=state.budget.timeout(settings.REWRITER_TIMEOUT_SECONDS),
+                )
+                llm_terms = (rw_out.get("domain_phrases", []) or []) + (rw_out.get("keywords", []) or [])
+                seen = set(t.lower() for t in terms)
+                for t in llm_terms:
+                    if t.lower() not in seen:
+                        terms.append(t)
+                        seen.add(t.lower())
+                state.rewriter_debug = rw_out
+            except Exception as e:
+                state.rewriter_debug = {"error": f"Query rewriter failed: {type(e).__name__}: {e}"}
+        state.terms = terms
+        if self._is_followup(state):
+            state.new_terms = [t for t in terms if not state.session.knows(t)]
+
+    def _stage_probe(self, state: PipelineState) -> None:
+        if not state.terms and not state.reused_terms:
+            state.outcome = "no_terms"
+            state.done = True
+            return
+        if state.budget.degrade("vector_only"):
+            return
+        # follow-ups only probe terms the session has not seen yet
+        candidates = state.new_terms if self._is_followup(state) else state.terms
+        if self.node_index is not None:
+            # the node index only returns papers that exist, so the probe adds nothing
+            state.graph_terms = candidates[:self.max_terms]
+            return
+        state.graph_terms = probe_terms(self.graph, candidates, max_terms=self.max_terms, budget=state.budget)
+
+    def _stage_graph(self, state: PipelineState) -> None:
+        if state.budget.degrade("vector_only"):
+            state.graph_debug = {"keywords": [], "skipped": "latency budget"}
+        else:
+            try:
+                self._query_graph(state)
+            except Exception as e:
+                # answer from the vector hits (and session context) rather than fail the request
+                state.budget.note("graph_query_failed")
+                state.graph_blocks = {}
+                state.graph_debug = {"keywords": [], "error": f"{type(e).__name__}: {e}"}
+
+        # carried-over session context costs nothing, so it survives degradation
+        blocks = [b for b in state.graph_blocks.values() if b]
+        if state.reused_terms:
+            blocks += [state.session.block(t) for t in state.reused_terms]
+            state.graph_debug["session_reused_terms"] = state.reused_terms
+        state.graph_context = "\n\n".join(blocks)
+
+    def _query_graph(self, state: PipelineState) -> None:
+        drop_facets = state.budget.degrade("drop_cp_goal_facets")
+        plan = self.planner.plan(state.question, state.graph_terms) if self.planner else None
+        state.graph_blocks, state.graph_debug = build_graph_blocks(
+            self.graph, state.question,
+            probe=False,  # already probed in the probe stage
+            max_terms=self.max_terms,
+            include_summaries=True,
+            include_content_parts=not drop_facets,
+            include_goal_achieved=not drop_facets,
+            terms=state.graph_terms,
+            budget=state.budget,
+            facets=plan["facets"] if plan else None,
+            node_index=self.node_index,
+        )
+        state.graph_debug["probe_used"] = True
+        if plan:
+            self.planner.record(state.graph_debug)
+            state.graph_debug["facet_plan"] = plan
+
+    def _stage_prompt(self, state: PipelineState) -> None:
+        history = list(state.session.questions) if self._is_followup(state) else None
+        state.prompt = build_prompt(state.question, state.hits, state.graph_context, history=history)
+
+    def _stage_generate(self, state: PipelineState) -> None:
+        gen_kwargs: Dict[str, Any] = {}
+        if state.budget.bounded:
+            gen_kwargs["timeout"] = state.budget.timeout()
+            if state.budget.degrade("cap_generation_tokens"):
+                gen_kwargs["max_tokens"] = settings.DEGRADED_MAX_TOKENS
+        try:
+            state.answer, state.llm_meta = self._generate(state, gen_kwargs)
+        except Exception as e:
+            if not state.budget.bounded:
+                raise RuntimeError(f"LLM generation failed: {e}")
+            # the budget cut the LLM short: return the retrieved context instead of an error
+            state.budget.note("generation_failed")
+            state.answer = _context_answer(state)
+            state.llm_meta = {"provider": settings.LLM_PROVIDER, "error": f"{type(e).__name__}: {e}"}
+
+    def _generate(self, state: PipelineState, gen_kwargs: Dict[str, Any]):
+        """(answer, llm_meta); every failure, including the fallback call's, reaches the caller."""
+        try:
+            return self.llm.generate(
+                state.prompt,
+                system=SYSTEM_PROMPT,
+                temperature=state.temperature,
+                return_meta=True,
+                **gen_kwargs,
+            )
+        except TypeError:
+            # Fallback for clients that don't support return_meta (OllamaClient)
+            answer = self.llm.generate(
+                state.prompt,
+                system=SYSTEM_PROMPT,
+                temperature=state.temperature,
+                **gen_kwargs,
+            )
+            return answer, {"provider": settings.LLM_PROVIDER, "model": settings.OLLAMA_MODEL}
+
+    def _stage_writeback(self, state: PipelineState) -> None:
+        if self.triple_writer is None or not state.answer or "generation_failed" in state.budget.applied:
+            return
+        triples = parse_triples(state.answer)
+        # never blocks the request: a full queue drops the overflow (counted in /metrics)
+        queued = self.triple_writer.submit(triples)
+        state.graph_debug["triples"] = {"parsed": len(triples), "queued": queued}
@@ -0,0 +1,203 @@
+from __future__ import annotations
+import copy
+import json
+import os
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+_live_caches: "weakref.WeakSet[QueryResultCache]" = weakref.WeakSet()
+
+# Per-store sidecar holding the write counter of each collection
+GENERATION_FILE = "query_cache_generation.sqlite3"
+
+
+def _key(query_text: str, n_results: int, filters: Optional[Dict[str, Any]]) -> Tuple[str, int, str]:
+    return (
+        " ".join(query_text.split()),
+        int(n_results),
+        json.dumps(filters, sort_keys=True, default=str) if filters else "",
+    )
+
+
+class GenerationStamp:
+    """
+    Write counter of one collection, kept in a small SQLite file next to the
+    store so that every process opening the store shares it: the API workers,
+    app.tools.bulk_ingest, index_graph and the other maintenance tools. Every
+    write bumps it; QueryResultCache compares it before serving a hit.
+    """
+    def __init__(self, path: str, name: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.name = name
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS generation (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._db.execute("INSERT OR IGNORE INTO generation(name, value) VALUES (?, 0)", (name,))
+
+    def value(self) -> int:
+        with self._lock:
+            return int(self._db.execute("SELECT value FROM generation WHERE name = ?", (self.name,)).fetchone()[0])
+
+    def bump(self) -> int:
+        with self._lock, self._db:
+            self._db.execute("UPDATE generation SET value = value + 1 WHERE name = ?", (self.name,))
+            return int(self._db.execute("SELECT value FROM generation WHERE name = ?", (self.name,)).fetchone()[0])
+
+
+def stamp_for(persist_path: str, name: str) -> GenerationStamp:
+    return GenerationStamp(os.path.join(persist_path, GENERATION_FILE), name)
+
+
+class QueryResultCache:
+    """
+    LRU of vector query results keyed on (whitespace-normalised text, n_results,
+    filters). Every write to the collection bumps `generation` and drops all
+    entries, and a result computed under an older generation is never stored.
+    With a shared `stamp`, writes made by other processes (offline ingestion,
+    a second worker) are picked up too: the stamp is read on every lookup and
+    a change drops the entries. Without one, only this process's writes
+    invalidate, so it is only safe with a single writer. A hit skips both the
+    query embedding and the ANN search.
+    """
+    def __init__(self, max_entries: int = 1024, name: str = "documents", stamp: Optional[GenerationStamp] = None):
+        self.max_entries = max(1, int(max_entries))
+        self.name = name
+        self.stamp = stamp
+        self._stamp_seen = stamp.value() if stamp is not None else 0
+        self._generation = 0
+        self._entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        _live_caches.add(self)
+
+    def _invalidate(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._invalidations += 1
+
+    def _sync(self) -> None:
+        """Drop everything if another process wrote to the collection (caller holds the lock)."""
+        if self.stamp is None:
+            return
+        seen = self.stamp.value()
+        if seen != self._stamp_seen:
+            self._stamp_seen = seen
+            self._invalidate()
+
+    @property
+    def generation(self) -> int:
+        with self._lock:
+            self._sync()
+            return self._generation
+
+    def bump(self) -> int:
+        """Call after any add/update/delete on the collection."""
+        seen = self.stamp.bump() if self.stamp is not None else 0
+        with self._lock:
+            self._stamp_seen = seen
+            self._invalidate()
+            return self._generation
+
+    def get(self, query_text: str, n_results: int, filters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        key = _key(query_text, n_results, filters)
+        with self._lock:
+            self._sync()
+            res = self._entries.get(key)
+            if res is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return copy.deepcopy(res)
+
+    def put(
+        self,
+        query_text: str,
+        n_results: int,
+        filters: Optional[Dict[str, Any]],
+        result: Dict[str, Any],
+        generation: int,
+    ) -> None:
+        key = _key(query_text, n_results, filters)
+        with self._lock:
+            self._sync()
+            if generation != self._generation:
+                return  # the collection changed while this query ran
+            self._entries[key] = copy.deepcopy(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "collection": self.name,
+                "generation": self._generation,
+                "shared": self.stamp is not None,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self._invalidations,
+            }
+
+
+def split_results(res: Dict[str, Any], n: int) -> List[Dict[str, Any]]:
+    """A multi-query result ({"ids": [[...], [...]], ...}) -> one single-query result per query."""
+    out: List[Dict[str, Any]] = [{} for _ in range(n)]
+    for key, val in res.items():
+        per_query = key != "included" and isinstance(val, list) and len(val) == n
+        for j in range(n):
+            out[j][key] = [val[j]] if per_query else val
+    return out
+
+
+def query_many(
+    cache: Optional[QueryResultCache],
+    query_texts: List[str],
+    n_results: int,
+    search: Callable[[List[str]], List[Dict[str, Any]]],
+    dedupe: bool = True,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Results for several queries, in input order. Cached ones are served from
+    `cache`; the rest go through a single `search(texts)` call (one embedding
+    pass + one index search). With `dedupe`, identical texts (whitespace-
+    normalised) are searched once and share the result.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(query_texts)
+    generation = cache.generation if cache is not None else 0
+    todo: Dict[Any, List[int]] = {}
+    for i, text in enumerate(query_texts):
+        if cache is not None:
+            results[i] = cache.get(text, n_results, filters)
+            if results[i] is not None:
+                continue
+        todo.setdefault(" ".join(text.split()) if dedupe else i, []).append(i)
+    if todo:
+        firsts = [idxs[0] for idxs in todo.values()]
+        found = search([query_texts[i] for i in firsts])
+        for idxs, res in zip(todo.values(), found):
+            if cache is not None:
+                cache.put(query_texts[idxs[0]], n_results, filters, res, generation)
+            results[idxs[0]] = res
+            for i in idxs[1:]:
+                results[i] = copy.deepcopy(res)
+    return results
+
+
+def query_cache_metrics() -> List[Dict[str, Any]]:
+    """Metrics of every vector query result cache in this process."""
+    return [c.metrics() for c in list(_live_caches)]
@@ -43,12 +43,13 @@ class QueryRewriter:
             use_responses_api=True,
         )
 
-    def rewrite(self, question: str) -> Dict[str, List[str]]:
+    def rewrite(self, question: str, timeout: Optional[float] = None) -> Dict[str, List[str]]:
         text = self.client.generate(
             prompt=INSTRUCTIONS + question.strip(),
             system=SYSTEM,
             temperature=0.0,
             stream=False,
+            timeout=timeout,
         )
         data = self._safe_json(text) or self._safe_json(self._extract_json_block(text)) or {}
         phrases = self._norm_list(data.get("domain_phrases", []))
@@ -1,6 +1,7 @@
 from __future__ import annotations
 import re
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+from ..core.config import settings
 from .graphdb import GraphDBClient
 
 # -------------------------
@@ -283,35 +284,40 @@ def extract_keywords(question: str, max_terms: int = 4) -> list[str]:
 # -------------------------
 # Optional: probe whether a term exists in KG (fast SELECT 1)
 # -------------------------
-def _probe_term_exists(graph: GraphDBClient, term: str) -> bool:
+def _probe_term_exists(graph: GraphDBClient, term: str, timeout: Optional[float] = None) -> bool:
     q = PROBE_TERM_SELECT % {"kw": term}
     try:
-        res = graph.sparql_query(q)
+        res = graph.sparql_query(q, timeout=timeout)
         bindings = res.get("results", {}).get("bindings", [])
         return bool(bindings)
     except Exception:
         # fail-open to avoid blocking if probe errors
         return True
 
-def _extract_keywords_probed(graph: GraphDBClient, question: str, max_terms: int = 4) -> List[str]:
-    candidates = extract_keywords(question, max_terms=8)  # take a few more, then trim
+def probe_terms(graph: GraphDBClient, candidates: List[str], max_terms: int = 4, budget=None) -> List[str]:
+    """Keep the first `max_terms` candidates that exist in the KG (order preserved)."""
     if not candidates:
         return []
     kept: List[str] = []
     for t in candidates:
-        if _probe_term_exists(graph, t):
+        timeout = budget.timeout(graph.timeout) if budget is not None else None
+        if _probe_term_exists(graph, t, timeout=timeout):
             kept.append(t)
         if len(kept) >= max_terms:
             break
     # if probe filtered everything, fall back to original (don’t return empty)
     return kept or candidates[:max_terms]
 
+def _extract_keywords_probed(graph: GraphDBClient, question: str, max_terms: int = 4) -> List[str]:
+    candidates = extract_keywords(question, max_terms=8)  # take a few more, then trim
+    return probe_terms(graph, candidates, max_terms=max_terms)
+
 # -------------------------
 # Run the preserved problems query for a single keyword
 # -------------------------
-def problems_by_keyword_flex(graph: GraphDBClient, kw: str) -> Tuple[List[Dict[str, str]], str]:
+def problems_by_keyword_flex(graph: GraphDBClient, kw: str, timeout: Optional[float] = None) -> Tuple[List[Dict[str, str]], str]:
     sparql = PROBLEMS_FROM_SECTIONS_FLEX % {"kw": kw}
-    res = graph.sparql_query(sparql)
+    res = graph.sparql_query(sparql, timeout=timeout)
     rows: List[Dict[str, str]] = []
     for b in res.get("results", {}).get("bindings", []):
         rows.append({
@@ -326,9 +332,9 @@ def problems_by_keyword_flex(graph: GraphDBClient, kw: str) -> Tuple[List[Dict[s
 # -------------------------
 # Abstract Purpose
 # -------------------------
-def abstract_purpose_by_term_flex(graph: GraphDBClient, term: str):
+def abstract_purpose_by_term_flex(graph: GraphDBClient, term: str, timeout: Optional[float] = None):
     q = ABSTRACT_PURPOSE_FLEX % {"kw": term}
-    res = graph.sparql_query(q)
+    res = graph.sparql_query(q, timeout=timeout)
     rows = []
     for b in res.get("results", {}).get("bindings", []):
         rows.append({
@@ -343,9 +349,9 @@ def abstract_purpose_by_term_flex(graph: GraphDBClient, term: str):
 # -------------------------
 # Content Part
 # -------------------------
-def contentpart_by_term_flex(graph: GraphDBClient, term: str):
+def contentpart_by_term_flex(graph: GraphDBClient, term: str, timeout: Optional[float] = None):
     q = CONTENTPART_FLEX % {"kw": term}
-    res = graph.sparql_query(q)
+    res = graph.sparql_query(q, timeout=timeout)
     rows = []
     for b in res.get("results", {}).get("bindings", []):
         rows.append({
@@ -359,9 +365,9 @@ def contentpart_by_term_flex(graph: GraphDBClient, term: str):
 # -------------------------
 # Goal Achieved
 # -------------------------
-def goal_achieved_by_term_flex(graph: GraphDBClient, term: str):
+def goal_achieved_by_term_flex(graph: GraphDBClient, term: str, timeout: Optional[float] = None):
     q = GOAL_ACHIEVED_FLEX % {"kw": term}
-    res = graph.sparql_query(q)
+    res = graph.sparql_query(q, timeout=timeout)
     rows = []
     for b in res.get("results", {}).get("bindings", []):
         rows.append({
@@ -372,24 +378,126 @@ def goal_achieved_by_term_flex(graph: GraphDBClient, term: str):
         })
     return rows, q
 
+# -------------------------
+# Facet names, one per per-keyword query below (used by the facet planner)
+# -------------------------
+GRAPH_FACETS = ("summary", "content", "goal", "problems")
+
+# -------------------------
+# Paper-IRI variants of the facet queries (graph node index / ANN path)
+# Derived from the keyword queries above by swapping the title CONTAINS match
+# for either every paper (node export, paged) or a VALUES list of selected
+# papers (expansion), so both paths see exactly the same nodes.
+# facet -> (keyword query, node variable, label key in the row dicts)
+# -------------------------
+FACET_QUERIES = {
+    "summary": (ABSTRACT_PURPOSE_FLEX, "abs", "absLabel"),
+    "content": (CONTENTPART_FLEX, "cp", "cpLabel"),
+    "goal": (GOAL_ACHIEVED_FLEX, "g", "goalLabel"),
+    "problems": (PROBLEMS_FROM_SECTIONS_FLEX, "section", "sectionLabel"),
+}
+
+_PAPER_BY_KW = re.compile(
+    r'\{\s*\?paper dcterms:title \?paperLabel \.\s*FILTER\(CONTAINS\(LCASE\(STR\(\?paperLabel\)\), LCASE\("%\(kw\)s"\)\)\)\s*\}'
+    r'\s*UNION\s*'
+    r'\{\s*\?paper rdfs:label \?paperLabel \.\s*FILTER\(CONTAINS\(LCASE\(STR\(\?paperLabel\)\), LCASE\("%\(kw\)s"\)\)\)\s*\}'
+)
+_SELECT_ROW = re.compile(r"SELECT \?paper \?paperLabel \?(\w+) \?text")
+_LIMIT_TAIL = re.compile(r"LIMIT \d+\s*$")
+_ANY_PAPER = "{ ?paper dcterms:title ?paperLabel } UNION { ?paper rdfs:label ?paperLabel }"
+_IRI_UNSAFE = re.compile(r'[<>"{}|^`\\\s]')
+
+
+def _derive_facet_query(facet: str, papers_block: str, tail: Optional[str]) -> str:
+    template, node, _ = FACET_QUERIES[facet]
+    q, n_match = _PAPER_BY_KW.subn(lambda m: papers_block, template, count=1)
+    q, n_select = _SELECT_ROW.subn(lambda m: f"SELECT DISTINCT ?paper ?paperLabel ?{m.group(1)} ?{node} ?text", q, count=1)
+    if tail is not None:
+        q = _LIMIT_TAIL.sub(lambda m: tail, q, count=1)
+    if n_match != 1 or n_select != 1:
+        raise RuntimeError(f"cannot derive the paper-IRI query for facet '{facet}'")
+    return q
+
+
+def facet_nodes_query(facet: str, limit: int, offset: int) -> str:
+    """One page of every (paper, node, text) row of a facet, in a stable order."""
+    node = FACET_QUERIES[facet][1]
+    tail = f"ORDER BY ?paper ?{node} ?text\nLIMIT {int(limit)} OFFSET {int(offset)}\n"
+    return _derive_facet_query(facet, _ANY_PAPER, tail)
+
+
+def facet_rows(res: Dict[str, Any], facet: str) -> List[Dict[str, str]]:
+    _, node, label_key = FACET_QUERIES[facet]
+    label_var = _SELECT_ROW.search(FACET_QUERIES[facet][0]).group(1)
+    rows = []
+    for b in res.get("results", {}).get("bindings", []):
+        rows.append({
+            "paper": b.get("paper", {}).get("value", ""),
+            "paperLabel": b.get("paperLabel", {}).get("value", ""),
+            label_key: b.get(label_var, {}).get("value", ""),
+            "node": b.get(node, {}).get("value", ""),
+            "text": b.get("text", {}).get("value", ""),
+        })
+    return rows
+
+
+def facet_rows_by_papers(
+    graph: GraphDBClient,
+    facet: str,
+    papers: List[str],
+    rank: Optional[Dict[str, int]] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[List[Dict[str, str]], str]:
+    """Facet rows of the given paper IRIs; rows whose text is in `rank` come first, in rank order."""
+    iris = " ".join(f"<{p}>" for p in papers if p and not _IRI_UNSAFE.search(p))
+    if not iris:
+        return [], ""
+    q = _derive_facet_query(facet, f"VALUES ?paper {{ {iris} }}\n  {_ANY_PAPER}", None)
+    rows = facet_rows(graph.sparql_query(q, timeout=timeout), facet)
+    if rank:
+        rows.sort(key=lambda r: rank.get(r["text"], len(rank)))
+    return rows, q
+
 # -------------------------
 # Build the GraphDB context (manual path)
 # probe=True uses the KG probe to avoid dead terms; set probe=False to disable
+# terms=... skips keyword extraction and uses the caller's (e.g. rewriter-merged) terms
+# budget=... derives every SPARQL timeout from the request budget and stops
+#            issuing keyword queries once it falls below the vector-only threshold
+# facets=... {kw: facets} from the facet planner; a keyword only runs the listed
+#            facets (still subject to the include_* flags). Missing kw = all facets.
+# node_index=... a graph_index.GraphNodeIndex: papers are picked per keyword by
+#            ANN lookup over the indexed node texts instead of title CONTAINS scans
+# build_graph_blocks returns the context per keyword ({kw: text}) so callers can
+# cache and reuse it (e.g. sessions); build_graph_problem_context joins it.
 # -------------------------
-# --- MODIFY the signature of build_graph_problem_context (add flag) ---
-def build_graph_problem_context(
+def build_graph_problem_context(graph: GraphDBClient, question: str, **kwargs) -> Tuple[str, Dict[str, Any]]:
+    blocks, debug = build_graph_blocks(graph, question, **kwargs)
+    return ("\n\n".join(blocks.values()), debug)
+
+
+def build_graph_blocks(
     graph: GraphDBClient,
     question: str,
     probe: bool = True,
     max_terms: int = 4,
     include_summaries: bool = True,
     include_content_parts: bool = True,
-    include_goal_achieved: bool = True,   # NEW
-) -> Tuple[str, Dict[str, Any]]:
-
-    kws = _extract_keywords_probed(graph, question, max_terms=max_terms) if probe else extract_keywords(question, max_terms=max_terms)
-
-    lines: List[str] = []
+    include_goal_achieved: bool = True,
+    terms: Optional[List[str]] = None,
+    budget=None,
+    facets: Optional[Dict[str, Any]] = None,
+    node_index=None,
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+
+    if terms is not None:
+        kws = probe_terms(graph, terms, max_terms=max_terms, budget=budget) if probe else list(terms[:max_terms])
+    elif probe:
+        kws = _extract_keywords_probed(graph, question, max_terms=max_terms)
+    else:
+        kws = extract_keywords(question, max_terms=max_terms)
+
+    blocks: Dict[str, str] = {}
 
     # ✅ Make sure these keys exist up front
     debug: Dict[str, Any] = {
@@ -404,20 +512,57 @@ def build_graph_problem_context(
         "rows_cp_per_kw": {},
         "sparql_goal": {},           # NEW
         "rows_goal_per_kw": {},      # NEW
+        "facets_per_kw": {},         # facets actually queried per keyword
+        "failed_kw": [],             # keywords with at least one failed facet query
     }
+    if node_index is not None:
+        debug["ann"] = {}            # per keyword: papers picked by the node index
+
 
+    def _timeout():
+        return budget.timeout(graph.timeout) if budget is not None else None
+
+    def _failed(kw: str, e: Exception) -> str:
+        # a facet query that fails (typically a budget-shortened timeout) costs that facet, not the request
+        if budget is not None:
+            budget.note("graph_query_failed")
+        if kw not in debug["failed_kw"]:
+            debug["failed_kw"].append(kw)
+        return f"# ERROR: {type(e).__name__}: {e}"
 
     for kw in kws:
+        if budget is not None and budget.bounded and budget.remaining_ms() < settings.DEGRADE_VECTOR_ONLY_MS:
+            budget.note("graph_truncated")
+            debug["truncated_at"] = kw
+            break
+
+        allowed = set(facets.get(kw, GRAPH_FACETS)) if facets is not None else set(GRAPH_FACETS)
+        run_sum = include_summaries and "summary" in allowed
+        run_cp = include_content_parts and "content" in allowed
+        run_goal = include_goal_achieved and "goal" in allowed
+        run_prob = "problems" in allowed
+        debug["facets_per_kw"][kw] = [f for f, on in zip(GRAPH_FACETS, (run_sum, run_cp, run_goal, run_prob)) if on]
+
+        # ANN path: the node index picks the papers, SPARQL only expands their IRIs
+        ann = node_index.papers(kw, facets=debug["facets_per_kw"][kw]) if node_index is not None else None
+        if ann is not None:
+            debug["ann"][kw] = {"papers": ann[0], "lookup_ms": ann[2]}
+
+        def _fetch(facet, by_term):
+            if ann is None:
+                return by_term(graph, kw, timeout=_timeout())
+            return facet_rows_by_papers(graph, facet, ann[0], ann[1], timeout=_timeout())
+
         # ✅ Always initialize these, even if include_summaries=False
         summary_rows: List[Dict[str, str]] = []
         sparql_abs: str = ""
 
-        if include_summaries:
+        if run_sum:
             try:
-                summary_rows, sparql_abs = abstract_purpose_by_term_flex(graph, kw)
+                summary_rows, sparql_abs = _fetch("summary", abstract_purpose_by_term_flex)
             except Exception as e:
                 # keep it visible in debug instead of crashing
-                sparql_abs = f"# ERROR: {type(e).__name__}: {e}"
+                sparql_abs = _failed(kw, e)
 
         # ✅ Safe to write to the dict now
         debug["sparql_abs"][kw] = sparql_abs
@@ -426,11 +571,11 @@ def build_graph_problem_context(
         # --- ContentPart (defensive) ---
         cp_rows: List[Dict[str, str]] = []
         sparql_cp: str = ""
-        if include_content_parts:
+        if run_cp:
             try:
-                cp_rows, sparql_cp = contentpart_by_term_flex(graph, kw)
+                cp_rows, sparql_cp = _fetch("content", contentpart_by_term_flex)
             except Exception as e:
-                sparql_cp = f"# ERROR: {type(e).__name__}: {e}"
+                sparql_cp = _failed(kw, e)
 
         debug["sparql_cp"][kw] = sparql_cp
         debug["rows_cp_per_kw"][kw] = len(cp_rows)
@@ -438,26 +583,32 @@ def build_graph_problem_context(
         # --- Goal_Achieved (defensive) ---
         goal_rows: List[Dict[str, str]] = []
         sparql_goal: str = ""
-        if include_goal_achieved:
+        if run_goal:
             try:
-                goal_rows, sparql_goal = goal_achieved_by_term_flex(graph, kw)
+                goal_rows, sparql_goal = _fetch("goal", goal_achieved_by_term_flex)
             except Exception as e:
-                sparql_goal = f"# ERROR: {type(e).__name__}: {e}"
+                sparql_goal = _failed(kw, e)
 
         debug["sparql_goal"][kw] = sparql_goal
         debug["rows_goal_per_kw"][kw] = len(goal_rows)
 
 
-        # -- existing problems query (unchanged) --
-        rows, sparql = problems_by_keyword_flex(graph, kw)
+        # -- existing problems query (defensive) --
+        rows: List[Dict[str, str]] = []
+        sparql: str = ""
+        if run_prob:
+            try:
+                rows, sparql = _fetch("problems", problems_by_keyword_flex)
+            except Exception as e:
+                sparql = _failed(kw, e)
         debug["sparql"][kw] = sparql
         debug["rows_per_kw"][kw] = len(rows)
         debug["total_rows"] += len(rows)
 
-        if not rows and not summary_rows:
+        if not (rows or summary_rows or cp_rows or goal_rows):
             continue
 
-        lines.append(f"Keyword: {kw}")
+        lines: List[str] = [f"Keyword: {kw}"]
 
         # groupers (unchanged)
         def _group(rr):
@@ -517,15 +668,20 @@ def build_graph_problem_context(
                     seen.add(txt)
                     lines.append(f"    • {sec + ': ' if sec else ''}{txt}")
 
-        lines.append("")
+        blocks[kw] = "\n".join(lines).strip()
 
-    return ("\n".join(lines).strip(), debug)
+    return (blocks, debug)
 
 
 # -------------------------
-# Prompt builder (unchanged)
+# Prompt builder (history = earlier session questions, optional)
 # -------------------------
-def build_prompt(question: str, vector_hits: Dict[str, Any], graph_context: str) -> str:
+def build_prompt(
+    question: str,
+    vector_hits: Dict[str, Any],
+    graph_context: str,
+    history: Optional[List[str]] = None,
+) -> str:
     ctx_parts = []
     docs = vector_hits.get("documents", [[]])
     metas = vector_hits.get("metadatas", [[]])
@@ -537,6 +693,10 @@ def build_prompt(question: str, vector_hits: Dict[str, Any], graph_context: str)
         ctx_parts.append("[GraphDB]\n" + graph_context)
 
     context = "\n\n".join(ctx_parts) if ctx_parts else "(no context retrieved)"
+    # earlier questions of a session, so follow-ups like "that" can be resolved
+    history_block = ""
+    if history:
+        history_block = "Earlier questions in this conversation:\n" + "\n".join(f"- {h}" for h in history) + "\n\n"
     return f"""Role: 
  Act as a Hybrid Bonding Expert. 
 
@@ -600,7 +760,7 @@ Do not hallucinate. Only use the provided research paper context.
 Always present output in the sequence: Step 2 → Step 3 → Step 4. 
 
  
-Question: {question}
+{history_block}Question: {question}
 
 Context:
 {context}
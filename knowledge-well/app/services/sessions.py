@@ -0,0 +1,133 @@
+from __future__ import annotations
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Deque
+
+from ..core.config import settings
+
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_\-]{1,64}$")
+
+
+def _term_key(term: str) -> str:
+    return re.sub(r"\s+", " ", term.strip().lower())
+
+
+@dataclass
+class Session:
+    """
+    Retrieved context kept between turns of one conversation.
+    - terms: every term queried against the graph so far; known terms are never
+      re-probed or re-queried (terms a turn skipped stay unknown)
+    - blocks: graph context per queried term ("" = queried, nothing found)
+    - hits: last turn's vector hits, reused when a follow-up adds no new term and
+      searches with the same options (hits_options: where, include, k)
+    """
+    id: str
+    created: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    questions: Deque[str] = field(default_factory=lambda: deque(maxlen=settings.SESSION_MAX_TURNS))
+    hits: Optional[Dict[str, Any]] = None
+    hits_options: Optional[Dict[str, Any]] = None
+    blocks: "OrderedDict[str, str]" = field(default_factory=OrderedDict)
+    terms: "OrderedDict[str, str]" = field(default_factory=OrderedDict)  # key -> original spelling, most relevant last
+    turns: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def is_followup(self) -> bool:
+        return self.turns > 0
+
+    def knows(self, term: str) -> bool:
+        return _term_key(term) in self.terms
+
+    def carried_terms(self, limit: int) -> List[str]:
+        """Most recent known terms that actually produced graph context."""
+        out = [orig for key, orig in reversed(self.terms.items()) if self.blocks.get(key)]
+        return out[:limit]
+
+    def hits_for(self, options: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Last turn's hits if they were searched with the same `options`, else None."""
+        return self.hits if self.hits is not None and self.hits_options == options else None
+
+    def block(self, term: str) -> Optional[str]:
+        return self.blocks.get(_term_key(term))
+
+    def remember(
+        self,
+        question: str,
+        hits: Dict[str, Any],
+        terms: List[str],
+        blocks: Dict[str, str],
+        hits_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Store what this turn retrieved (`terms`: the ones actually queried), keeping the session within its limits."""
+        self.questions.append(question)
+        self.hits = hits
+        self.hits_options = hits_options
+        self.turns += 1
+        self.last_used = time.time()
+        for t in reversed(terms):  # first (strongest) term of the latest turn ends up most recent
+            key = _term_key(t)
+            self.terms.pop(key, None)
+            self.terms[key] = t
+        for t, text in blocks.items():
+            key = _term_key(t)
+            self.blocks.pop(key, None)
+            self.blocks[key] = text
+        # bounded memory: oldest terms/blocks go first
+        while len(self.terms) > settings.SESSION_MAX_TERMS:
+            old, _ = self.terms.popitem(last=False)
+            self.blocks.pop(old, None)
+        while self.blocks and sum(len(b) for b in self.blocks.values()) > settings.SESSION_MAX_CONTEXT_CHARS:
+            self.blocks.popitem(last=False)
+
+    def summary(self) -> Dict[str, Any]:
+        return {"id": self.id, "turn": self.turns, "terms": list(reversed(self.terms.values()))}
+
+
+class SessionStore:
+    """Thread-safe in-process session store with TTL and LRU eviction."""
+    def __init__(self, ttl_seconds: Optional[int] = None, max_sessions: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or settings.SESSION_TTL_SECONDS
+        self.max_sessions = max_sessions or settings.SESSION_MAX
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        expired = [sid for sid, s in self._sessions.items() if now - s.last_used > self.ttl_seconds]
+        for sid in expired:
+            del self._sessions[sid]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get_or_create(self, session_id: Optional[str] = None) -> Session:
+        """Return the live session for `session_id`, or start one (with that id if valid)."""
+        if session_id is not None and not _SESSION_ID_RE.match(session_id):
+            raise ValueError("session_id must be 1-64 characters of [A-Za-z0-9_-]")
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            sess = self._sessions.pop(session_id, None) if session_id else None
+            if sess is None:
+                sess = Session(id=session_id or uuid.uuid4().hex)
+            sess.last_used = now
+            self._sessions[sess.id] = sess
+            self._evict(now)
+            return sess
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict(time.time())
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "ttl_seconds": self.ttl_seconds}
+
+
+# Process-wide store used by /chat
+sessions = SessionStore()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Optional
+
+import numpy as np
+
+# one backend per worker process, created by _init_worker
+_worker_backend = None
+
+
+def _init_worker(kind: str, model_name: str, device: str, onnx_path: Optional[str], onnx_quantized: bool, threads: int):
+    global _worker_backend
+    # pin the intra-op pool before torch / onnxruntime start their own
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if kind == "torch":
+        import torch
+        torch.set_num_threads(threads)
+    from .embedding_backends import load_backend
+    _worker_backend = load_backend(kind, model_name, device=device, onnx_path=onnx_path,
+                                   onnx_quantized=onnx_quantized, onnx_threads=threads)
+
+
+def _encode_shard(texts: List[str], batch_size: int, normalize: bool) -> np.ndarray:
+    return np.ascontiguousarray(_worker_backend.encode(texts, batch_size=batch_size, normalize=normalize), dtype=np.float32)
+
+
+def _worker_dim(_: int) -> int:
+    return int(_worker_backend.dim or _encode_shard(["dim probe"], 1, True).shape[1])
+
+
+class ShardedBackend:
+    """
+    Runs another backend ("torch" or "onnx") in a pool of worker processes,
+    each with its own model copy and a fixed intra-op thread count. encode()
+    splits the texts into shards of `shard_size`, spreads them over the pool
+    and reassembles the vectors in input order. Used for large ingestion runs
+    (EMBED_WORKERS > 1); single queries gain nothing from it.
+    """
+    def __init__(
+        self,
+        kind: str,
+        model_name: str,
+        workers: int,
+        device: str = "cpu",
+        onnx_path: Optional[str] = None,
+        onnx_quantized: bool = False,
+        threads_per_worker: int = 0,
+        shard_size: int = 256,
+    ):
+        self.name = kind  # same vectors as the in-process backend, so same cache key
+        self.quantized = onnx_quantized if kind == "onnx" else False
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.shard_size = max(1, int(shard_size))
+        # spawn: a forked torch runtime deadlocks in the children
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(kind, model_name, device, onnx_path, onnx_quantized, self.threads_per_worker),
+        )
+        self.dim = self.warm()
+
+    def warm(self) -> int:
+        """Start every worker (loading its model) and return the embedding dimension."""
+        return list(self._pool.map(_worker_dim, range(self.workers)))[0]
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize: bool = True) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        # no more shards than needed to keep every worker busy with >= one batch
+        size = min(self.shard_size, max(batch_size, -(-len(texts) // self.workers)))
+        shards = [texts[i:i + size] for i in range(0, len(texts), size)]
+        parts = self._pool.map(_encode_shard, shards, repeat(batch_size), repeat(normalize))
+        return np.concatenate(list(parts))
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
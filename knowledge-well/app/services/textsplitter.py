@@ -1,6 +1,11 @@
 
 from __future__ import annotations
-from typing import List
+import os
+import re
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Union
+
+from ..core.config import settings
 
 def simple_chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 120) -> List[str]:
     """Naive character-based splitter with overlap."""
@@ -16,3 +21,158 @@ def simple_chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 120
         if start < 0:
             start = 0
     return chunks
+
+
+# -------------------------
+# Token-aware, sentence-aware streaming splitter
+# -------------------------
+
+_PARA_RE = re.compile(r"\n[ \t]*\n")
+_SENT_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z0-9])")
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+TextSource = Union[str, TextIO, Iterable[str]]
+_counters: dict = {}
+
+
+def _approx_counts(texts: List[str]) -> List[int]:
+    # WordPiece splits rarer words into several pieces; ~1.3 pieces per word/punctuation
+    return [int(len(_WORD_RE.findall(t)) * 1.3) + 1 for t in texts]
+
+
+def token_counter(model_name: Optional[str] = None) -> Callable[[List[str]], List[int]]:
+    """
+    Batch token counter (no special tokens) for the embedding model's tokenizer.
+    Tries the exported ONNX tokenizer.json, then `tokenizers`/`transformers` by
+    model name, and falls back to a word-based estimate when neither is available.
+    """
+    name = model_name or settings.EMBEDDING_MODEL
+    if name in _counters:
+        return _counters[name]
+    counter = None
+    try:
+        from tokenizers import Tokenizer
+        local = os.path.join(settings.EMBED_ONNX_PATH, "tokenizer.json")
+        tok = Tokenizer.from_file(local) if os.path.exists(local) else Tokenizer.from_pretrained(name)
+        tok.no_truncation()
+        tok.no_padding()
+        counter = lambda texts: [len(e.ids) for e in tok.encode_batch(texts, add_special_tokens=False)]
+    except Exception:
+        try:
+            from transformers import AutoTokenizer
+            hf = AutoTokenizer.from_pretrained(name)
+            counter = lambda texts: [len(ids) for ids in hf(texts, add_special_tokens=False)["input_ids"]]
+        except Exception:
+            counter = _approx_counts
+    _counters[name] = counter
+    return counter
+
+
+def _blocks(source: TextSource, block_chars: int = 1 << 16) -> Iterator[str]:
+    if isinstance(source, str):
+        for i in range(0, len(source), block_chars):
+            yield source[i:i + block_chars]
+    elif hasattr(source, "read"):
+        while True:
+            block = source.read(block_chars)
+            if not block:
+                return
+            yield block
+    else:
+        yield from source
+
+
+def _paragraphs(source: TextSource, max_buffer: int = 1 << 20) -> Iterator[str]:
+    """Paragraphs of a text stream; at most ~max_buffer characters are held at once."""
+    buf = ""
+    for block in _blocks(source):
+        buf += block
+        parts = _PARA_RE.split(buf)
+        buf = parts.pop()  # may continue in the next block
+        for p in parts:
+            if p.strip():
+                yield p.strip()
+        if len(buf) > max_buffer:
+            # no paragraph break in sight: cut at the last sentence end (else whitespace)
+            ends = [m.start() for m in _SENT_RE.finditer(buf)]
+            cut = ends[-1] if ends else (buf.rfind(" ") if buf.rfind(" ") > 0 else len(buf))
+            if buf[:cut].strip():
+                yield buf[:cut].strip()
+            buf = buf[cut:]
+    if buf.strip():
+        yield buf.strip()
+
+
+def _split_long(sentence: str, n_tokens: int, max_tokens: int) -> List[tuple]:
+    """Word windows of an over-long sentence, each ~max_tokens."""
+    words = sentence.split()
+    per_window = max(1, int(len(words) * max_tokens / max(n_tokens, 1)))
+    pieces = [" ".join(words[i:i + per_window]) for i in range(0, len(words), per_window)]
+    return [(p, min(max_tokens, max(1, n_tokens * len(p) // max(len(sentence), 1)))) for p in pieces]
+
+
+def iter_token_chunks(
+    source: TextSource,
+    max_tokens: int = 256,
+    overlap_tokens: int = 32,
+    count_tokens: Optional[Callable[[List[str]], List[int]]] = None,
+) -> Iterator[str]:
+    """
+    Chunks of at most ~max_tokens embedding-model tokens, built from whole
+    sentences and preferring to end at paragraph breaks. Consecutive chunks
+    inside a paragraph share up to overlap_tokens of trailing sentences.
+    `source` may be a string, a text file object or an iterable of text blocks;
+    it is consumed incrementally, so memory stays bounded for large inputs.
+    """
+    count_tokens = count_tokens or token_counter()
+    cur: deque = deque()  # (text, tokens, starts_paragraph)
+    cur_tok = 0
+
+    def _emit():
+        out = ""
+        for text, _, para in cur:
+            out = text if not out else out + ("\n\n" if para else " ") + text
+        return out
+
+    for para in _paragraphs(source):
+        sents = [s for s in _SENT_RE.split(para) if s.strip()]
+        counts = count_tokens(sents)
+        units = []
+        for s, n in zip(sents, counts):
+            units.extend(_split_long(s, n, max_tokens) if n > max_tokens else [(s, n)])
+
+        para_tok = sum(n for _, n in units)
+        if cur and cur_tok + para_tok > max_tokens and cur_tok >= max_tokens // 2:
+            # the paragraph does not fit: end the chunk at the paragraph break, no overlap
+            yield _emit()
+            cur.clear()
+            cur_tok = 0
+
+        for i, (s, n) in enumerate(units):
+            if cur and cur_tok + n > max_tokens:
+                yield _emit()
+                keep, kept = [], 0
+                for unit in reversed(cur):
+                    if kept + unit[1] > overlap_tokens:
+                        break
+                    keep.append(unit)
+                    kept += unit[1]
+                cur = deque(reversed(keep))
+                cur_tok = kept
+            cur.append((s, n, i == 0))
+            cur_tok += n
+    if cur:
+        yield _emit()
+
+
+def token_chunk_text(text: str, max_tokens: int = 256, overlap_tokens: int = 32) -> List[str]:
+    return list(iter_token_chunks(text, max_tokens, overlap_tokens))
+
+
+def chunk_document(source: TextSource) -> Iterator[str]:
+    """Chunks of one extracted document with the configured CHUNKER."""
+    if settings.CHUNKER.lower() == "chars":
+        text = source if isinstance(source, str) else "".join(_blocks(source))
+        yield from simple_chunk_text(text, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+    else:
+        yield from iter_token_chunks(source, settings.CHUNK_TOKENS, settings.CHUNK_OVERLAP_TOKENS)
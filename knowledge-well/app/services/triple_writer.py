@@ -0,0 +1,294 @@
+from __future__ import annotations
+import queue
+import re
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Set
+
+from .graphdb import GraphDBClient
+
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+
+_live_writers: "weakref.WeakSet[TripleWriter]" = weakref.WeakSet()
+
+
+@dataclass(frozen=True)
+class Triple:
+    subject: str
+    predicate: str
+    object: str
+    kind: str = "triple"  # solution | mapping | impact | triple
+    ref: str = ""         # "S1", "M2", ... as numbered in the answer
+
+
+# -------------------------
+# Parsing the Step 2-4 triples build_prompt asks for
+#   S1 : Hybrid Bonding – Improves – Electrical Conductivity
+#   M1 : P1 – addressed → S1
+#   I1 : S1 → results in → Lower contact resistance
+# and bare "A → B → C" lines. Sx/Mx/Ix references inside a triple resolve to
+# the subject of the triple with that number. The prompt never asks the model
+# to list problems, so a Px resolves to its own "P1 : <problem>" line if the
+# answer has one, else to "Problem P1 in <source cited under the mapping>";
+# references left unresolved drop their triple.
+# -------------------------
+_KINDS = {"S": "solution", "M": "mapping", "I": "impact"}
+_REF_LINE = re.compile(r"^\s*(?:[-*•]\s*|\d+[.)]\s*)?\**([SMIP]\d+)\**\s*[:.)]\s*(.+)$")
+_SEP = re.compile(r"\s*(?:→|⟶|->)\s*|\s+[–—-]\s+")
+_ARROW = re.compile(r"→|⟶|->")
+_REF = re.compile(r"^[SMIP]\d+$")
+_STRIP = " \t*`\"'“”‘’<>[]"
+_MAX_PART = 160
+_SOURCE = re.compile(r"source:\s*(.+)$", re.IGNORECASE)
+
+
+def _clean(part: str) -> str:
+    return re.sub(r"\s+", " ", part.strip(_STRIP).rstrip(".;,").strip(_STRIP))
+
+
+def _split(body: str) -> Optional[List[str]]:
+    if "source:" in body.lower():
+        return None
+    parts = [_clean(p) for p in _SEP.split(body)]
+    if len(parts) != 3 or not all(parts) or any(len(p) > _MAX_PART for p in parts):
+        return None
+    return parts
+
+
+def parse_triples(text: str) -> List[Triple]:
+    raw = []
+    problems: Dict[str, str] = {}  # Px -> the problem its own line states
+    cited: Dict[str, str] = {}     # ref -> the "Source:" line right under its triple
+    last = ""
+    for line in (text or "").splitlines():
+        m = _REF_LINE.match(line)
+        ref, body = (m.group(1), m.group(2)) if m else ("", line)
+        if not ref:
+            src = _SOURCE.search(body)
+            if src:
+                if last and last not in cited:
+                    cited[last] = _clean(re.sub(r"[“”\"]", "", src.group(1)))
+                continue
+        if ref.startswith("P") and not _ARROW.search(body):
+            label = _clean(body)
+            if label and len(label) <= _MAX_PART and "source:" not in label.lower():
+                problems[ref] = label
+            continue
+        if not ref and not _ARROW.search(body):
+            continue  # bare lines need an arrow; "a – b – c" prose is not a triple
+        parts = _split(body)
+        last = ref
+        if parts is None:
+            continue
+        raw.append((ref, parts))
+
+    subjects = {ref: parts[0] for ref, parts in raw if ref}
+
+    def _resolve(part: str, ref: str) -> str:
+        if not _REF.match(part):
+            return part
+        if part == ref:
+            return ""
+        if part.startswith("P"):
+            if part in problems:
+                return problems[part]
+            return f"Problem {part} in {cited[ref]}" if cited.get(ref) else ""
+        return subjects.get(part, "")
+
+    out: List[Triple] = []
+    seen: Set[tuple] = set()
+    for ref, (s, p, o) in raw:
+        s, o = _resolve(s, ref), _resolve(o, ref)
+        if not (s and o) or _REF.match(s) or _REF.match(o) or (s, p, o) in seen:
+            continue
+        seen.add((s, p, o))
+        out.append(Triple(s, p, o, kind=_KINDS.get(ref[:1], "triple"), ref=ref))
+    return out
+
+
+# -------------------------
+# N-Triples
+# -------------------------
+def _slug(label: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")[:120]
+
+
+def _predicate_slug(label: str) -> str:
+    words = re.findall(r"[A-Za-z0-9]+", label)
+    return (words[0].lower() + "".join(w[:1].upper() + w[1:].lower() for w in words[1:]))[:120] if words else ""
+
+
+def _literal(value: str) -> str:
+    esc = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+    return f'"{esc}"'
+
+
+def ntriples_lines(triples: Iterable[Triple], base_iri: str) -> List[str]:
+    """N-Triples for the triples plus rdfs:label of every entity and predicate, deduplicated."""
+    base = base_iri.rstrip("/") + "/"
+    lines: Dict[str, None] = {}
+    for t in triples:
+        s, p, o = _slug(t.subject), _predicate_slug(t.predicate), _slug(t.object)
+        if not (s and p and o):
+            continue
+        s_iri, p_iri, o_iri = f"<{base}entity/{s}>", f"<{base}rel/{p}>", f"<{base}entity/{o}>"
+        lines.setdefault(f"{s_iri} {p_iri} {o_iri} .")
+        lines.setdefault(f"{s_iri} <{RDFS_LABEL}> {_literal(t.subject)} .")
+        lines.setdefault(f"{o_iri} <{RDFS_LABEL}> {_literal(t.object)} .")
+        lines.setdefault(f"{p_iri} <{RDFS_LABEL}> {_literal(t.predicate)} .")
+    return list(lines)
+
+
+def _chunks(lines: List[str], per_chunk: int = 256) -> Iterator[bytes]:
+    for start in range(0, len(lines), per_chunk):
+        yield ("\n".join(lines[start:start + per_chunk]) + "\n").encode("utf-8")
+
+
+def _retryable(exc: Exception) -> bool:
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status is None or status >= 500 or status in (408, 429)
+
+
+class TripleWriter:
+    """
+    Buffers parsed triples and loads them into GraphDB in bulk: a background
+    thread drains a bounded queue into batches of `batch_size` triples (or
+    whatever arrived within `flush_seconds`) and streams each batch as
+    N-Triples to /statements, into the named graph `context`. Transient
+    failures are retried with exponential backoff. The queue bound is the
+    back-pressure: submit() drops (and counts) what does not fit unless the
+    caller asks to block.
+    """
+    def __init__(
+        self,
+        graph: GraphDBClient,
+        context: Optional[str] = None,
+        base_iri: str = "http://knowledge-well.local/kg/",
+        batch_size: int = 500,
+        max_pending: int = 10000,
+        flush_seconds: float = 2.0,
+        retries: int = 3,
+        backoff_seconds: float = 0.5,
+    ):
+        self.graph = graph
+        self.context = context or None
+        self.base_iri = base_iri
+        self.batch_size = max(1, int(batch_size))
+        self.flush_seconds = max(0.01, float(flush_seconds))
+        self.retries = max(0, int(retries))
+        self.backoff_seconds = max(0.0, float(backoff_seconds))
+        self._q: "queue.Queue[Triple]" = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # metrics
+        self._stats = {"submitted": 0, "dropped": 0, "written": 0, "statements": 0, "failed": 0,
+                       "batches": 0, "retries": 0, "write_ms": 0.0}
+        self._last_error: Optional[str] = None
+        _live_writers.add(self)
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="triple-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, triples: Iterable[Triple], block: bool = False, timeout: Optional[float] = None) -> int:
+        """Queue triples for writing; returns how many were accepted."""
+        triples = list(triples)
+        if not triples:
+            return 0
+        if self._stop.is_set():
+            raise RuntimeError("triple writer is closed")
+        self._ensure_worker()
+        accepted = 0
+        for t in triples:
+            try:
+                self._q.put(t, block=block, timeout=timeout)
+            except queue.Full:
+                break
+            accepted += 1
+        with self._lock:
+            self._stats["submitted"] += accepted
+            self._stats["dropped"] += len(triples) - accepted
+        return accepted
+
+    def flush(self) -> None:
+        """Block until everything queued so far has been written (or given up on)."""
+        if self._thread is not None:
+            self._q.join()
+
+    def _loop(self) -> None:
+        while not (self._stop.is_set() and self._q.empty()):
+            try:
+                batch = [self._q.get(timeout=self.flush_seconds)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+
+    def _write(self, batch: List[Triple]) -> None:
+        lines = ntriples_lines(batch, self.base_iri)
+        if not lines:
+            return
+        t0 = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                # a fresh generator per attempt: the body is streamed, not kept by httpx
+                self.graph.add_statements(_chunks(lines), content_type="application/n-triples", context=self.context)
+                with self._lock:
+                    self._stats["batches"] += 1
+                    self._stats["written"] += len(batch)
+                    self._stats["statements"] += len(lines)
+                    self._stats["write_ms"] += (time.perf_counter() - t0) * 1000.0
+                return
+            except Exception as e:
+                self._last_error = f"{type(e).__name__}: {e}"
+                if attempt == self.retries or not _retryable(e):
+                    break
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(self.backoff_seconds * (2 ** attempt))
+        with self._lock:
+            self._stats["failed"] += len(batch)
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Write what is still queued (within `timeout`) and stop the worker."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            "context": self.context,
+            "pending": self._q.qsize(),
+            "max_pending": self._q.maxsize,
+            "batch_size": self.batch_size,
+            **stats,
+            "write_ms": round(stats["write_ms"], 1),
+            "mean_batch_ms": round(stats["write_ms"] / stats["batches"], 1) if stats["batches"] else 0.0,
+            "last_error": self._last_error,
+        }
+
+
+def triple_writer_metrics() -> List[Dict[str, Any]]:
+    """Metrics of every live triple writer in this process."""
+    return [w.metrics() for w in list(_live_writers)]
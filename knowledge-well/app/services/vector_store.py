@@ -1,34 +1,277 @@
-
 from __future__ import annotations
 from typing import List, Dict, Any, Optional
+import json
 import os
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 
+from ..core.config import settings
+from .chunk_sync import chunk_metadata, chunk_ids_for, sync_source
+from .metadata_filter import check_include, cache_filters
+from .query_cache import QueryResultCache, query_many, stamp_for, split_results
+
 
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
 os.environ["CHROMA_TELEMETRY"] = "false"
 
+# Chroma releases that normalize embeddings to numpy themselves take float32 rows
+# as-is; older ones validate for Python lists, so they get one .tolist() at the edge.
+try:
+    from chromadb.api.types import normalize_embeddings as _chroma_normalize  # noqa: F401
+    _CHROMA_TAKES_NUMPY = True
+except ImportError:
+    _CHROMA_TAKES_NUMPY = False
+
+
+def to_chroma_embeddings(arr: np.ndarray):
+    """(n, dim) float32 array -> what this Chroma version accepts as `embeddings`."""
+    arr = np.asarray(arr, dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr[None, :]
+    return list(arr) if _CHROMA_TAKES_NUMPY else arr.tolist()
+
+
+HNSW_KEYS = ("space", "M", "construction_ef", "search_ef")
+
+
+def hnsw_params(collection_name: str, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """HNSW settings for a collection: global defaults < HNSW_COLLECTION_PARAMS[name] < overrides."""
+    params = {
+        "space": settings.HNSW_SPACE,
+        "M": settings.HNSW_M,
+        "construction_ef": settings.HNSW_CONSTRUCTION_EF,
+        "search_ef": settings.HNSW_SEARCH_EF,
+    }
+    if settings.HNSW_COLLECTION_PARAMS:
+        params.update(json.loads(settings.HNSW_COLLECTION_PARAMS).get(collection_name, {}))
+    params.update(overrides or {})
+    unknown = set(params) - set(HNSW_KEYS)
+    if unknown:
+        raise ValueError(f"unknown HNSW parameter(s): {', '.join(sorted(unknown))}")
+    return params
+
+
+def hnsw_metadata(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {f"hnsw:{k}": v for k, v in params.items()}
+
 
 class EmbeddingFunctionAdapter:
     def __init__(self, embedder):
         self.embedder = embedder
-    def __call__(self, input: List[str]) -> List[List[float]]:
-        return self.embedder.embed_documents(input)
+    def __call__(self, input: List[str]):
+        return to_chroma_embeddings(self.embedder.embed_documents(input))
 
 class VectorStore:
-    def __init__(self, persist_path: str, collection_name: str, embedder) -> None:
+    def __init__(
+        self,
+        persist_path: str,
+        collection_name: str,
+        embedder,
+        hnsw: Optional[Dict[str, Any]] = None,
+        lexical=None,
+        client=None,
+    ) -> None:
         os.makedirs(persist_path, exist_ok=True)
-        self.client = chromadb.PersistentClient(path=persist_path, settings=Settings(anonymized_telemetry=False))
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=EmbeddingFunctionAdapter(embedder)
+        self.embedder = embedder
+        self.lexical = lexical  # LexicalIndex kept in sync with every write/delete, or None
+        # a caller opening several collections of one path passes its PersistentClient
+        self.client = client or chromadb.PersistentClient(path=persist_path, settings=Settings(anonymized_telemetry=False))
+        ef = EmbeddingFunctionAdapter(embedder)
+        # HNSW settings are fixed once a collection exists; app.tools.rebuild_hnsw changes them
+        try:
+            self.collection = self.client.get_collection(name=collection_name, embedding_function=ef)
+        except Exception:
+            self.collection = self.client.get_or_create_collection(
+                name=collection_name,
+                embedding_function=ef,
+                metadata=hnsw_metadata(hnsw_params(collection_name, hnsw)),
+            )
+        # shared write counter: bumped by every process that writes, read by every cache
+        self.stamp = stamp_for(persist_path, collection_name)
+        self.result_cache = (
+            QueryResultCache(settings.VECTOR_QUERY_CACHE_SIZE, name=collection_name, stamp=self.stamp)
+            if settings.VECTOR_QUERY_CACHE else None
         )
 
-    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None, ids: Optional[List[str]] = None):
+    def _changed(self) -> None:
+        if self.result_cache is not None:
+            self.result_cache.bump()
+        else:
+            self.stamp.bump()
+
+    def max_batch_size(self) -> int:
+        try:
+            return int(self.client.get_max_batch_size())
+        except Exception:
+            return 5000
+
+    def count(self) -> int:
+        return int(self.collection.count())
+
+    def add_texts(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        source: Optional[str] = None,
+    ):
+        """
+        Embed and upsert. Ids default to chunk_id(source, chunk offset, text hash),
+        so re-adding the same chunks overwrites instead of duplicating them.
+        """
+        metadatas = chunk_metadata(texts, metadatas, source)
         if ids is None:
-            ids = [f"id-{i}" for i in range(len(texts))]
-        self.collection.add(documents=texts, metadatas=metadatas, ids=ids)
+            ids = chunk_ids_for(texts, metadatas)
+        # embed ourselves, per Chroma-sized slice, so only one float32 block is alive at a time
+        step = self.max_batch_size()
+        for start in range(0, len(texts), step):
+            end = start + step
+            self.upsert_embeddings(
+                ids[start:end],
+                self.embedder.embed_documents(texts[start:end]),
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+            )
+
+    upsert_texts = add_texts
+
+    def add_embeddings(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        upsert: bool = False,
+    ) -> None:
+        """Write precomputed vectors in Chroma-sized batches."""
+        write = self.collection.upsert if upsert else self.collection.add
+        step = self.max_batch_size()
+        for start in range(0, len(ids), step):
+            end = start + step
+            write(
+                ids=ids[start:end],
+                documents=documents[start:end] if documents is not None else None,
+                metadatas=metadatas[start:end] if metadatas is not None else None,
+                embeddings=to_chroma_embeddings(embeddings[start:end]),
+            )
+        if self.lexical is not None and documents is not None:
+            self.lexical.upsert(ids, documents, metadatas)
+        self._changed()
+
+    def upsert_embeddings(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        self.add_embeddings(ids, embeddings, documents, metadatas, upsert=True)
+
+    def get_embeddings(self, ids: List[str]) -> np.ndarray:
+        """Stored vectors for `ids`, in that order."""
+        got = self.collection.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(got["ids"], got["embeddings"]))
+        return np.asarray([by_id[i] for i in ids], dtype=np.float32)
+
+    def source_chunks(self, source: str) -> Dict[str, str]:
+        """{id: content hash} of every stored chunk of `source`."""
+        got = self.collection.get(where={"source": source}, include=["metadatas"])
+        return {id_: (m or {}).get("hash") or id_.rsplit(":", 1)[-1] for id_, m in zip(got["ids"], got["metadatas"])}
+
+    def sources(self) -> List[str]:
+        """Distinct 'source' values of the stored chunks (pages through the collection)."""
+        seen: Dict[str, None] = {}
+        step = self.max_batch_size()
+        offset = 0
+        while True:
+            got = self.collection.get(include=["metadatas"], limit=step, offset=offset)
+            for m in got["metadatas"]:
+                if m and m.get("source") is not None:
+                    seen.setdefault(m["source"])
+            if len(got["ids"]) < step:
+                return list(seen)
+            offset += step
+
+    def iter_records(self, page: int = 1000):
+        """(ids, documents, metadatas) pages of the whole collection, without embeddings."""
+        offset = 0
+        while True:
+            got = self.collection.get(include=["documents", "metadatas"], limit=page, offset=offset)
+            if got["ids"]:
+                yield got["ids"], got["documents"], got["metadatas"]
+            if len(got["ids"]) < page:
+                return
+            offset += page
+
+    def delete(self, ids: List[str]) -> None:
+        step = self.max_batch_size()
+        for start in range(0, len(ids), step):
+            self.collection.delete(ids=ids[start:start + step])
+        if self.lexical is not None:
+            self.lexical.delete(ids)
+        self._changed()
+
+    def delete_by_source(self, source: str) -> int:
+        ids = list(self.source_chunks(source))
+        if ids:
+            self.delete(ids)
+        return len(ids)
+
+    def sync_source(self, source: str, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Replace `source`'s chunks with `texts`, embedding and writing only what changed."""
+        return sync_source(self, source, texts, metadatas)
+
+    @staticmethod
+    def _query_kwargs(where: Optional[Dict[str, Any]], include: List[str]) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {"include": include}
+        if where:
+            kwargs["where"] = where  # evaluated inside Chroma, before the top-k cut
+        return kwargs
+
+    def query(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Top `n_results` chunks, optionally restricted by a metadata `where`
+        (see metadata_filter.build_where). `include` limits the returned fields
+        (documents / metadatas / distances; ids always), so callers that only
+        need ids and distances do not load chunk text.
+        """
+        include = check_include(include)
+        filters = cache_filters(where, include)
+        if self.result_cache is not None:
+            generation = self.result_cache.generation
+            cached = self.result_cache.get(query_text, n_results, filters)
+            if cached is not None:
+                return cached
+        # embed_query (not the collection's document embedding function) so
+        # concurrent queries can share a micro-batch
+        vec = self.embedder.embed_query(query_text)
+        res = self.collection.query(
+            query_embeddings=to_chroma_embeddings(vec), n_results=n_results, **self._query_kwargs(where, include)
+        )
+        if self.result_cache is not None:
+            self.result_cache.put(query_text, n_results, filters, res, generation)
+        return res
+
+    def query_many(
+        self,
+        query_texts: List[str],
+        n_results: int = 5,
+        dedupe: bool = True,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        query() for several texts at once: one embedding pass and one multi-query
+        Chroma search for everything not already cached. Results in input order.
+        """
+        include = check_include(include)
 
-    def query(self, query_text: str, n_results: int = 5) -> Dict[str, Any]:
-        return self.collection.query(query_texts=[query_text], n_results=n_results)
+        def _search(texts: List[str]) -> List[Dict[str, Any]]:
+            vecs = self.embedder.embed_queries(texts)
+            res = self.collection.query(
+                query_embeddings=to_chroma_embeddings(vecs), n_results=n_results, **self._query_kwargs(where, include)
+            )
+            return split_results(res, len(texts))
+        return query_many(self.result_cache, query_texts, n_results, _search, dedupe=dedupe,
+                          filters=cache_filters(where, include))
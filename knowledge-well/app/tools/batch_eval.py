@@ -0,0 +1,64 @@
+"""
+Batch-evaluate the chat pipeline over a JSONL file of questions.
+
+    python -m app.tools.batch_eval questions.jsonl -o answers.jsonl --concurrency 8
+
+Input lines: {"question": "...", "id": "...", "k": 5, "temperature": 0.2} (only
+"question" is required; a bare JSON string also works). Each output line holds the
+answer, per-stage timing and llm_meta; the run summary goes to stderr (and to
+--summary if given).
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+
+from ..core.config import settings
+from ..services.batch import read_questions, run_batch
+from ..services.components import registry
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("questions", help="JSONL file with one question per line ('-' for stdin)")
+    ap.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    ap.add_argument("-c", "--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    ap.add_argument("--deadline-ms", type=float, default=None, help="wall-time cap of the whole run (default: none)")
+    ap.add_argument("--summary", help="also write the summary JSON to this file")
+    args = ap.parse_args(argv)
+
+    src = sys.stdin if args.questions == "-" else open(args.questions, encoding="utf-8")
+    with src:
+        questions = read_questions(src)
+
+    vs, graph, llm, rewriter = registry.get_components()
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    done = 0
+
+    def _emit(rec):
+        nonlocal done
+        done += 1
+        out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        out.flush()
+        print(f"[{done}/{len(questions)}] {rec['id']}: "
+              f"{'ERROR ' + rec['error'] if rec.get('error') else str(rec['timing'].get('total_ms')) + ' ms'}",
+              file=sys.stderr)
+
+    try:
+        result = run_batch(vs, graph, llm, rewriter, questions, concurrency=args.concurrency, on_result=_emit,
+                           deadline_ms=args.deadline_ms)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    summary = json.dumps(result["summary"], indent=2)
+    print(summary, file=sys.stderr)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(summary + "\n")
+    return 0 if result["summary"]["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
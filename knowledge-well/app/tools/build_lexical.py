@@ -0,0 +1,57 @@
+"""
+(Re)build the BM25 index of a collection (LEXICAL_INDEX_DIR/<collection>.sqlite3)
+from the chunks already in the vector store. Ingestion keeps the index in sync
+from then on; run this once for a collection ingested before the index existed,
+or to compact it. No embedding model is loaded.
+
+    python -m app.tools.build_lexical
+    python -m app.tools.build_lexical --page-size 2000 --query "d2w voids"
+
+Serve it with RETRIEVAL_MODE=lexical (BM25 only, no torch at startup) or
+RETRIEVAL_MODE=hybrid (vector + BM25 with reciprocal rank fusion).
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+
+from ..core.config import settings
+from ..services.components import registry
+from ..services.lexical_index import LexicalIndex, lexical_index_path
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--page-size", type=int, default=1000, help="chunks read from the vector store per page")
+    ap.add_argument("--no-rebuild", action="store_true", help="skip the rebuild (with --query)")
+    ap.add_argument("--query", action="append", default=[], help="show the top BM25 hits for a query")
+    ap.add_argument("-k", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    path = lexical_index_path(settings.VECTOR_COLLECTION)
+    lexical = LexicalIndex(path)
+    if not args.no_rebuild:
+        store = registry.record_store()
+        t0 = time.perf_counter()
+        count = lexical.rebuild(store.iter_records(args.page_size))
+        print(json.dumps({
+            "collection": settings.VECTOR_COLLECTION,
+            "path": path,
+            "indexed": count,
+            "size_mb": round(os.path.getsize(path) / 1e6, 2),
+            "elapsed_s": round(time.perf_counter() - t0, 2),
+        }, indent=2))
+
+    for q in args.query:
+        res = lexical.query(q, n_results=args.k, include=["metadatas", "distances"])
+        hits = [{"id": i, "source": (m or {}).get("source"), "bm25": round(d, 3)}
+                for i, m, d in zip(res["ids"][0], res["metadatas"][0], res["distances"][0])]
+        print(json.dumps({"query": q, "hits": hits}, indent=2))
+    lexical.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
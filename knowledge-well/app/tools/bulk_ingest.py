@@ -0,0 +1,284 @@
+"""
+Bulk-load a directory tree into the Chroma collection at VECTORSTORE_PATH.
+
+    python -m app.tools.bulk_ingest ./papers
+    python -m app.tools.bulk_ingest ./papers --collection documents --state ./Vectorstore/bulk_ingest.sqlite3
+
+Parse (extract + chunk), embed and write run as three threads joined by bounded
+queues, so the stages of consecutive files overlap. Each file is checkpointed
+once all its chunks are written. A re-run skips files whose content hash is
+unchanged and retries failed ones, so an interrupted run simply resumes.
+Changed files are synced chunk by chunk: chunk ids are deterministic
+(source:offset:hash), so only new chunks are embedded and written and chunks
+that are gone are deleted. Files that disappeared from the tree since the last
+run have their chunks and checkpoint rows removed (unless --no-prune, or the
+checkpoint belongs to another root). A file that fails to extract or embed is
+marked failed and keeps the chunks of its previous version until a later run
+succeeds. With LEXICAL_INDEX on, the BM25 index of the collection is updated
+alongside. Prints docs/s, chunks/s and peak RSS at the end.
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from ..core.config import settings
+from ..services.chunk_sync import chunk_metadata, chunk_ids_for
+from ..services.components import registry
+from ..services.embedder import Embedder
+from ..services.extract import SUPPORTED_EXTENSIONS, extract_documents
+from ..services.lexical_index import LexicalIndex, lexical_index_path
+from ..services.textsplitter import chunk_document
+from ..services.vector_store import VectorStore
+
+_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path    TEXT PRIMARY KEY,
+    sha256  TEXT NOT NULL,
+    chunks  INTEGER NOT NULL,
+    status  TEXT NOT NULL,
+    error   TEXT,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+_DONE = object()
+
+
+@dataclass
+class FileWork:
+    rel: str
+    sha: str
+    seen_before: bool = False
+    chunks: int = 0
+    texts: List[str] = field(default_factory=list)
+    metas: List[Dict[str, Any]] = field(default_factory=list)
+    ids: List[str] = field(default_factory=list)
+    stale_ids: List[str] = field(default_factory=list)
+    embeddings: Any = None
+    error: Optional[str] = None
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Checkpoint:
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_STATE_SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, rel: str):
+        with self._lock:
+            return self._db.execute("SELECT sha256, chunks, status FROM files WHERE path=?", (rel,)).fetchone()
+
+    def put(self, rel: str, sha: str, chunks: int, status: str, error: Optional[str] = None) -> None:
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                             (rel, sha, chunks, status, error, time.time()))
+
+    def paths(self) -> List[str]:
+        with self._lock:
+            return [p for (p,) in self._db.execute("SELECT path FROM files")]
+
+    def drop(self, rel: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM files WHERE path=?", (rel,))
+
+    def claim_root(self, root: str) -> bool:
+        """Record the tree this checkpoint tracks; False if it already tracks another one."""
+        root = os.path.abspath(root)
+        with self._lock, self._db:
+            row = self._db.execute("SELECT value FROM meta WHERE key='root'").fetchone()
+            if row is None:
+                self._db.execute("INSERT INTO meta(key, value) VALUES ('root', ?)", (root,))
+                return True
+            return row[0] == root
+
+
+def walk(root: str):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield os.path.join(dirpath, name)
+
+
+def prune(vs: VectorStore, state: Checkpoint, seen: set) -> int:
+    """Delete the chunks and checkpoint rows of files no longer in the tree; returns how many files."""
+    gone = [rel for rel in state.paths() if rel not in seen]
+    for rel in gone:
+        vs.delete_by_source(rel)
+        state.drop(rel)
+        print(f"REMOVED {rel}", file=sys.stderr)
+    return len(gone)
+
+
+def run(root: str, vs: VectorStore, state: Checkpoint, queue_depth: int = 4, prune_missing: bool = True) -> Dict[str, Any]:
+    stats = {"files_seen": 0, "skipped": 0, "docs": 0, "chunks": 0, "unchanged": 0, "deleted": 0,
+             "failed": 0, "files_written": 0, "files_removed": 0}
+    seen: set = set()
+    to_embed: "queue.Queue" = queue.Queue(maxsize=queue_depth)
+    to_write: "queue.Queue" = queue.Queue(maxsize=queue_depth)
+    errors: List[BaseException] = []
+
+    def parse():
+        try:
+            for path in walk(root):
+                rel = os.path.relpath(path, root).replace(os.sep, "/")
+                seen.add(rel)
+                stats["files_seen"] += 1
+                sha = file_sha256(path)
+                prev = state.get(rel)
+                if prev and prev[0] == sha and prev[2] == "done":
+                    stats["skipped"] += 1
+                    continue
+                work = FileWork(rel=rel, sha=sha, seen_before=prev is not None)
+                try:
+                    for text, doc_meta in extract_documents(path):
+                        stats["docs"] += 1
+                        for chunk in chunk_document(text):
+                            work.metas.append(doc_meta)
+                            work.texts.append(chunk)
+                except Exception as e:
+                    work.error = f"{type(e).__name__}: {e}"
+                work.metas = chunk_metadata(work.texts, work.metas, source=rel)
+                work.ids = chunk_ids_for(work.texts, work.metas)
+                work.chunks = len(work.ids)
+                to_embed.put(work)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            to_embed.put(_DONE)
+
+    def embed():
+        try:
+            while True:
+                work = to_embed.get()
+                if work is _DONE:
+                    break
+                try:
+                    if work.error is None and work.seen_before:
+                        # keep chunks already stored under the same id, drop the ones that are gone
+                        existing = vs.source_chunks(work.rel)
+                        keep = set(work.ids)
+                        work.stale_ids = [id_ for id_ in existing if id_ not in keep]
+                        new = [i for i, id_ in enumerate(work.ids) if id_ not in existing]
+                        work.texts = [work.texts[i] for i in new]
+                        work.metas = [work.metas[i] for i in new]
+                        work.ids = [work.ids[i] for i in new]
+                    if work.error is None and work.texts:
+                        work.embeddings = vs.embedder.embed_documents(work.texts)
+                except Exception as e:
+                    work.error = f"{type(e).__name__}: {e}"
+                to_write.put(work)
+        except BaseException as e:
+            errors.append(e)
+            while to_embed.get() is not _DONE:  # unblock the parser
+                pass
+        finally:
+            to_write.put(_DONE)
+
+    t_parse = threading.Thread(target=parse, name="bulk-parse", daemon=True)
+    t_embed = threading.Thread(target=embed, name="bulk-embed", daemon=True)
+    t_parse.start()
+    t_embed.start()
+
+    # write stage runs here; a file is checkpointed only after all its chunks are in
+    while True:
+        work = to_write.get()
+        if work is _DONE:
+            break
+        if work.error is not None:
+            # the previous version's chunks (if any) stay searchable until a run succeeds
+            stats["failed"] += 1
+            state.put(work.rel, work.sha, 0, "failed", work.error)
+            print(f"FAILED {work.rel}: {work.error}", file=sys.stderr)
+            continue
+        if work.stale_ids:
+            vs.delete(work.stale_ids)
+        if work.texts:
+            vs.upsert_embeddings(work.ids, work.embeddings, work.texts, work.metas)
+        state.put(work.rel, work.sha, work.chunks, "done")
+        stats["chunks"] += len(work.ids)
+        stats["unchanged"] += work.chunks - len(work.ids)
+        stats["deleted"] += len(work.stale_ids)
+        stats["files_written"] += 1
+        print(f"[{stats['files_written'] + stats['failed']}] {work.rel}: {work.chunks} chunks "
+              f"({len(work.ids)} new, {len(work.stale_ids)} deleted)", file=sys.stderr)
+
+    t_parse.join()
+    t_embed.join()
+    if errors:
+        raise errors[0]
+    # only after a complete walk: an interrupted run must not mistake unvisited files for deleted ones
+    if prune_missing:
+        if state.claim_root(root):
+            stats["files_removed"] = prune(vs, state, seen)
+        else:
+            print("checkpoint tracks another root; not pruning (use --state per tree)", file=sys.stderr)
+    return stats
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("root", help="directory to ingest")
+    ap.add_argument("--chroma", default=settings.VECTORSTORE_PATH)
+    ap.add_argument("--collection", default=settings.VECTOR_COLLECTION)
+    ap.add_argument("--state", help="checkpoint database (default: <chroma>/bulk_ingest.sqlite3)")
+    ap.add_argument("--queue-depth", type=int, default=4, help="files buffered between stages")
+    ap.add_argument("--no-prune", action="store_true", help="keep the chunks of files deleted from the tree")
+    ap.add_argument("--workers", type=int, default=settings.EMBED_WORKERS,
+                    help="embedding processes (default EMBED_WORKERS)")
+    args = ap.parse_args(argv)
+
+    state = Checkpoint(args.state or os.path.join(args.chroma, "bulk_ingest.sqlite3"))
+    if args.workers > 1:
+        embedder = Embedder(settings.EMBEDDING_MODEL, settings.DEVICE, settings.EMBED_BATCH,
+                            microbatch=False, workers=args.workers)
+    else:
+        embedder = registry.embedder()
+    lexical = LexicalIndex(lexical_index_path(args.collection)) if settings.LEXICAL_INDEX else None
+    vs = VectorStore(args.chroma, args.collection, embedder, lexical=lexical)
+
+    t0 = time.perf_counter()
+    stats = run(args.root, vs, state, queue_depth=args.queue_depth, prune_missing=not args.no_prune)
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({
+        **stats,
+        "elapsed_s": round(elapsed, 2),
+        "docs_per_s": round(stats["docs"] / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_s": round(stats["chunks"] / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "collection_count": vs.collection.count(),
+        "lexical_count": lexical.count() if lexical is not None else None,
+    }, indent=2))
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
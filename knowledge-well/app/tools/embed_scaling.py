@@ -0,0 +1,81 @@
+"""
+Document-embedding throughput vs number of worker processes.
+
+    python -m app.tools.embed_scaling --workers 1 2 4 8 --texts 4000
+    python -m app.tools.embed_scaling --input chunks.jsonl --workers 1 4
+
+Texts come from --input (JSONL, {"text": ...} per line, or plain text lines) or
+are synthesised from the parity sentences. The embedding cache is bypassed, so
+every run pays the full forward pass. Reports texts/s, speedup over the first
+entry, and parallel efficiency.
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+import time
+
+from ..core.config import settings
+from ..services.embedder import Embedder
+from ..services.embedding_backends import PARITY_TEXTS
+
+
+def load_texts(path, n: int):
+    if path:
+        texts = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                    texts.append(rec["text"] if isinstance(rec, dict) else str(rec))
+                except ValueError:
+                    texts.append(line)
+                if len(texts) >= n:
+                    break
+        return texts
+    # distinct texts of chunk-like length
+    return [" ".join(PARITY_TEXTS[(i + j) % len(PARITY_TEXTS)] for j in range(6)) + f" #{i}" for i in range(n)]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--texts", type=int, default=2000)
+    ap.add_argument("--input")
+    ap.add_argument("--batch", type=int, default=settings.EMBED_BATCH)
+    args = ap.parse_args(argv)
+
+    texts = load_texts(args.input, args.texts)
+    results = []
+    for w in args.workers:
+        emb = Embedder(settings.EMBEDDING_MODEL, settings.DEVICE, args.batch, microbatch=False, cache=False, workers=w)
+        emb.embed_documents(texts[: args.batch])  # warm-up outside the timing
+        t0 = time.perf_counter()
+        vecs = emb.embed_documents(texts)
+        elapsed = time.perf_counter() - t0
+        if hasattr(emb.backend, "close"):
+            emb.backend.close()
+        rate = len(texts) / elapsed
+        base = results[0]["texts_per_s"] / results[0]["workers"] if results else rate / w
+        res = {
+            "workers": w,
+            "threads_per_worker": getattr(emb.backend, "threads_per_worker", None),
+            "texts": len(vecs),
+            "elapsed_s": round(elapsed, 2),
+            "texts_per_s": round(rate, 1),
+            "speedup": round(rate / results[0]["texts_per_s"], 2) if results else 1.0,
+            "efficiency": round(rate / (base * w), 2),
+        }
+        print(json.dumps(res), file=sys.stderr)
+        results.append(res)
+
+    print(json.dumps({"model": settings.EMBEDDING_MODEL, "backend": settings.EMBEDDING_BACKEND,
+                      "batch": args.batch, "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+Run the shared embedding service: one process owns the embedding model (plus
+micro-batcher and cache) and every API worker on the host embeds through it.
+
+    python -m app.tools.embed_server --addr /tmp/kw-embed.sock
+    EMBED_SERVICE_ADDR=/tmp/kw-embed.sock uvicorn app.main:app --workers 4
+
+--addr also accepts host:port (TCP on loopback), e.g. where Unix sockets are
+unavailable.
+"""
+from __future__ import annotations
+import argparse
+import sys
+
+from ..core.config import settings
+from ..services.embedder import Embedder
+from ..services.embed_service import EmbeddingServer
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--addr", default=settings.EMBED_SERVICE_ADDR or "/tmp/kw-embed.sock",
+                    help="Unix socket path or host:port")
+    args = ap.parse_args(argv)
+
+    embedder = Embedder(settings.EMBEDDING_MODEL, settings.DEVICE, settings.EMBED_BATCH)
+    server = EmbeddingServer(args.addr, embedder)
+    print(f"embedding service for {embedder.model_key} listening on {args.addr}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
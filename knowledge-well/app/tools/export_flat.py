@@ -0,0 +1,53 @@
+"""
+Copy a Chroma collection (vectors, documents, metadata) into the memory-mapped
+exact-search store used when VECTOR_BACKEND=flat. Vectors are copied as stored,
+so nothing is re-embedded.
+
+    python -m app.tools.export_flat
+    python -m app.tools.export_flat --collection documents --out ./Vectorstore/flat
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from ..core.config import settings
+from ..services.flat_store import FlatVectorStore
+
+
+def export(chroma_path: str, collection: str, out: str, page: int = 1000) -> FlatVectorStore:
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(path=chroma_path, settings=Settings(anonymized_telemetry=False))
+    src = client.get_collection(collection)
+    space = (src.metadata or {}).get("hnsw:space", "l2")
+    dst = FlatVectorStore(out, collection, embedder=None, space=space)
+
+    offset = 0
+    while True:
+        got = src.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=offset)
+        if not got["ids"]:
+            break
+        dst.add_embeddings(got["ids"], np.asarray(got["embeddings"], dtype=np.float32), got["documents"], got["metadatas"])
+        offset += len(got["ids"])
+        print(f"copied {offset} / {src.count()}", file=sys.stderr)
+    return dst
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chroma", default=settings.VECTORSTORE_PATH, help="Chroma persist directory")
+    ap.add_argument("--collection", default=settings.VECTOR_COLLECTION)
+    ap.add_argument("--out", default=settings.FLAT_VECTORSTORE_PATH)
+    args = ap.parse_args(argv)
+
+    dst = export(args.chroma, args.collection, args.out)
+    print(json.dumps({"collection": args.collection, "dir": dst.dir, **dst.manifest}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
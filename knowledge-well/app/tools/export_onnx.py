@@ -0,0 +1,125 @@
+"""
+Export the sentence-transformers embedding model to ONNX (optionally int8) and
+check it against the torch output.
+
+    python -m app.tools.export_onnx --out ./models/bge-small-en-v1.5-onnx --quantize
+
+Then run the API with EMBEDDING_BACKEND=onnx EMBED_ONNX_PATH=<out>
+[EMBED_ONNX_QUANTIZED=true]. Export needs torch + transformers + onnx +
+onnxruntime; serving needs only onnxruntime + tokenizers.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+
+from ..core.config import settings
+from ..services.embedding_backends import (
+    ONNX_META_FILE,
+    ONNX_MODEL_FILE,
+    ONNX_QUANTIZED_FILE,
+    OnnxBackend,
+    SentenceTransformerBackend,
+    parity_check,
+    PARITY_TEXTS,
+)
+
+
+def export(model_name: str, out_dir: str, max_length: int = 512, opset: int = 17) -> SentenceTransformerBackend:
+    import torch
+
+    ref = SentenceTransformerBackend(model_name, device="cpu")
+    st = ref.model
+    transformer = st[0]
+    pooling = "cls" if getattr(st[1], "pooling_mode_cls_token", False) else "mean"
+    hf_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    class _LastHidden(torch.nn.Module):
+        def __init__(self, m):
+            super().__init__()
+            self.m = m
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.m(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+
+    os.makedirs(out_dir, exist_ok=True)
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    axes = {0: "batch", 1: "seq"}
+    torch.onnx.export(
+        _LastHidden(hf_model),
+        (sample["input_ids"], sample["attention_mask"], sample.get("token_type_ids", torch.zeros_like(sample["input_ids"]))),
+        os.path.join(out_dir, ONNX_MODEL_FILE),
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={"input_ids": axes, "attention_mask": axes, "token_type_ids": axes, "last_hidden_state": axes},
+        opset_version=opset,
+    )
+    tokenizer.save_pretrained(out_dir)  # writes tokenizer.json for the fast tokenizer
+
+    meta = {
+        "model_name": model_name,
+        "pooling": pooling,
+        "max_length": min(max_length, getattr(st, "max_seq_length", max_length) or max_length),
+        "dim": ref.dim,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    }
+    with open(os.path.join(out_dir, ONNX_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return ref
+
+
+def quantize(out_dir: str) -> None:
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(
+        os.path.join(out_dir, ONNX_MODEL_FILE),
+        os.path.join(out_dir, ONNX_QUANTIZED_FILE),
+        weight_type=QuantType.QInt8,
+    )
+
+
+def _bench(backend, n: int = 50) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        backend.encode([PARITY_TEXTS[i % len(PARITY_TEXTS)]], batch_size=1)
+    return round((time.perf_counter() - t0) * 1000 / n, 2)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    ap.add_argument("--out", default=settings.EMBED_ONNX_PATH)
+    ap.add_argument("--quantize", action="store_true", help="also write a dynamic int8 model")
+    ap.add_argument("--check-only", action="store_true", help="skip export, only run the parity check")
+    ap.add_argument("--min-cosine", type=float, default=0.99, help="fp32 parity threshold")
+    ap.add_argument("--min-cosine-int8", type=float, default=0.97, help="int8 parity threshold")
+    args = ap.parse_args(argv)
+
+    if args.check_only:
+        ref = SentenceTransformerBackend(args.model, device="cpu")
+    else:
+        ref = export(args.model, args.out)
+        if args.quantize:
+            quantize(args.out)
+
+    report = {"model": args.model, "torch_query_ms": _bench(ref)}
+    ok = True
+    variants = [("fp32", False, args.min_cosine)]
+    if os.path.exists(os.path.join(args.out, ONNX_QUANTIZED_FILE)):
+        variants.append(("int8", True, args.min_cosine_int8))
+    for label, quantized, threshold in variants:
+        cand = OnnxBackend(args.out, quantized=quantized)
+        parity = parity_check(ref, cand, min_cosine=threshold)
+        parity["query_ms"] = _bench(cand)
+        report[label] = parity
+        ok = ok and parity["ok"]
+
+    print(json.dumps(report, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
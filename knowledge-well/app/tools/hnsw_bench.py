@@ -0,0 +1,111 @@
+"""
+Query latency vs recall@k of Chroma HNSW parameter sets on our stored vectors.
+
+    python -m app.tools.hnsw_bench -k 5 --M 8 16 32 --construction-ef 100 200 --search-ef 10 32 64 128
+
+Every combination is built as a throw-away in-memory collection from the vectors
+of --collection. Sampled stored vectors are the queries, and exact
+(brute-force) top-k is the reference. Apply the chosen set with HNSW_* /
+HNSW_COLLECTION_PARAMS and app.tools.rebuild_hnsw.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import sys
+import time
+import uuid
+
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+
+from ..core.config import settings
+from ..services.batch import percentile
+from ..services.vector_store import hnsw_params, hnsw_metadata
+from .rebuild_hnsw import iter_collection
+
+
+def load(chroma_path: str, name: str):
+    client = chromadb.PersistentClient(path=chroma_path, settings=Settings(anonymized_telemetry=False))
+    col = client.get_collection(name)
+    ids, embs = [], []
+    for page_ids, page_embs, _, _ in iter_collection(col):
+        ids.extend(page_ids)
+        embs.extend(page_embs)
+    return ids, np.asarray(embs, dtype=np.float32), (col.metadata or {}).get("hnsw:space", "l2")
+
+
+def exact_topk(mat: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    if space == "l2":
+        scores = -(np.sum(mat ** 2, axis=1)[None, :] - 2.0 * queries @ mat.T)
+    else:
+        scores = queries @ mat.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top
+
+
+def bench(ids, mat, queries, truth, k: int, params, page: int = 5000):
+    client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False))
+    col = client.create_collection(f"bench-{uuid.uuid4().hex[:8]}", metadata=hnsw_metadata(params))
+    try:
+        t0 = time.perf_counter()
+        for start in range(0, len(ids), page):
+            col.add(ids=ids[start:start + page], embeddings=mat[start:start + page].tolist())
+        build_s = time.perf_counter() - t0
+
+        lat, hits = [], []
+        for q, t in zip(queries, truth):
+            t0 = time.perf_counter()
+            res = col.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+            lat.append((time.perf_counter() - t0) * 1000.0)
+            expected = {ids[i] for i in t}
+            hits.append(len(expected & set(res["ids"][0])) / len(expected))
+    finally:
+        client.delete_collection(col.name)
+    return {
+        **params,
+        "recall": round(float(np.mean(hits)), 4),
+        "p50_ms": percentile(lat, 50, 3),
+        "p99_ms": percentile(lat, 99, 3),
+        "build_s": round(build_s, 2),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chroma", default=settings.VECTORSTORE_PATH)
+    ap.add_argument("--collection", default=settings.VECTOR_COLLECTION)
+    ap.add_argument("-k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--M", type=int, nargs="+", default=[8, 16, 32])
+    ap.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    ap.add_argument("--search-ef", type=int, nargs="+", default=[10, 32, 64, 128])
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    ids, mat, space = load(args.chroma, args.collection)
+    if not ids:
+        print(f"collection '{args.collection}' is empty", file=sys.stderr)
+        return 1
+    k = min(args.k, len(ids))
+    rows = np.random.default_rng(args.seed).choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+    queries = mat[rows]
+    truth = exact_topk(mat, queries, k, space)
+
+    results = []
+    for m, cef, sef in itertools.product(args.M, args.construction_ef, args.search_ef):
+        params = hnsw_params(args.collection, {"space": space, "M": m, "construction_ef": cef, "search_ef": sef})
+        res = bench(ids, mat, queries, truth, k, params)
+        print(json.dumps(res), file=sys.stderr)
+        results.append(res)
+
+    print(json.dumps({
+        "collection": args.collection, "count": len(ids), "space": space, "k": k,
+        "queries": len(queries), "current": hnsw_params(args.collection), "results": results,
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""
+Drop the embedding-cache rows of models no longer in use. The cache keys every
+vector by model, so rows of an old EMBEDDING_MODEL (or backend) are never read
+but stay on disk until purged here. Without --keep, the rows of the model that
+last opened the cache are kept.
+
+    python -m app.tools.purge_embed_cache --list
+    python -m app.tools.purge_embed_cache --keep "BAAI/bge-small-en-v1.5|torch"
+"""
+from __future__ import annotations
+import argparse
+import json
+import sqlite3
+import sys
+
+from ..core.config import settings
+from ..services.embedding_cache import EmbeddingCache
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--path", default=settings.EMBED_CACHE_PATH)
+    ap.add_argument("--keep", action="append", default=[], help="model key to keep (repeatable)")
+    ap.add_argument("--list", action="store_true", help="only print the row count per model key")
+    args = ap.parse_args(argv)
+
+    with sqlite3.connect(args.path) as db:
+        row = db.execute("SELECT value FROM meta WHERE key='model'").fetchone()
+        before = dict(db.execute("SELECT model, COUNT(*) FROM embeddings GROUP BY model"))
+    if args.list:
+        print(json.dumps(before, indent=2))
+        return 0
+    keep = args.keep or ([row[0]] if row else [])
+    if not keep:
+        print("no model recorded in the cache; pass --keep", file=sys.stderr)
+        return 2
+
+    # opening it as the first kept model also records that model as the last used one
+    deleted = EmbeddingCache(args.path, model_key=keep[0]).purge_other_models(keep)
+    print(json.dumps({"kept": keep, "deleted_rows": deleted, "before": before}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
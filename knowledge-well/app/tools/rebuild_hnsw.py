@@ -0,0 +1,100 @@
+"""
+Rebuild a Chroma collection with new HNSW parameters. Stored vectors, documents
+and metadata are copied as-is (nothing is re-embedded) into a new collection,
+which then replaces the old one unless --as is given.
+
+    python -m app.tools.rebuild_hnsw --M 32 --construction-ef 200 --search-ef 64
+    python -m app.tools.rebuild_hnsw --space cosine --as documents_cosine
+
+Without flags the collection is rebuilt with hnsw_params() for its name
+(HNSW_* / HNSW_COLLECTION_PARAMS). The copy is built in "<collection>__rebuild"
+and renamed when complete; an existing --as target is refused, never replaced.
+
+Stop the API (and any running ingestion) before replacing a collection in
+place: a running process keeps a handle on the old collection, which is gone
+once the rebuilt one takes its name, so its searches and writes fail until it
+is restarted. To switch without downtime, rebuild --as a new name, set
+VECTOR_COLLECTION to it and restart.
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+
+import chromadb
+from chromadb.config import Settings
+
+from ..core.config import settings
+from ..services.query_cache import stamp_for
+from ..services.vector_store import hnsw_params, hnsw_metadata
+
+
+def iter_collection(col, page: int = 1000):
+    """Pages of (ids, embeddings, documents, metadatas) from a Chroma collection."""
+    offset = 0
+    while True:
+        got = col.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=offset)
+        if not got["ids"]:
+            return
+        yield got["ids"], got["embeddings"], got["documents"], got["metadatas"]
+        offset += len(got["ids"])
+
+
+def _exists(client, name: str) -> bool:
+    try:
+        client.get_collection(name)
+        return True
+    except Exception:
+        return False
+
+
+def rebuild(client, name: str, params, target=None, page: int = 1000):
+    src = client.get_collection(name)
+    if target and _exists(client, target):
+        raise ValueError(f"collection '{target}' already exists; delete it or pick another --as name")
+    tmp_name = f"{name}__rebuild"
+    if _exists(client, tmp_name):
+        client.delete_collection(tmp_name)  # leftovers of an interrupted run
+    dst = client.create_collection(tmp_name, metadata=hnsw_metadata(params))
+    step = min(page, int(client.get_max_batch_size()))
+    for ids, embs, docs, metas in iter_collection(src, page=step):
+        dst.add(ids=ids, embeddings=embs, documents=docs, metadatas=metas)
+    if dst.count() != src.count():
+        raise RuntimeError(f"copy incomplete: {dst.count()} of {src.count()} records")
+    if target:
+        dst.modify(name=target)
+        return client.get_collection(target)
+    client.delete_collection(name)
+    dst.modify(name=name)
+    return client.get_collection(name)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chroma", default=settings.VECTORSTORE_PATH)
+    ap.add_argument("--collection", default=settings.VECTOR_COLLECTION)
+    ap.add_argument("--as", dest="target", help="write to this collection instead of replacing the source")
+    ap.add_argument("--space", choices=["l2", "cosine", "ip"])
+    ap.add_argument("--M", type=int)
+    ap.add_argument("--construction-ef", type=int)
+    ap.add_argument("--search-ef", type=int)
+    args = ap.parse_args(argv)
+
+    overrides = {k: v for k, v in {
+        "space": args.space, "M": args.M, "construction_ef": args.construction_ef, "search_ef": args.search_ef,
+    }.items() if v is not None}
+    params = hnsw_params(args.collection, overrides)
+
+    client = chromadb.PersistentClient(path=args.chroma, settings=Settings(anonymized_telemetry=False))
+    try:
+        col = rebuild(client, args.collection, params, target=args.target)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    stamp_for(args.chroma, col.name).bump()  # running servers drop cached results of the old collection
+    print(json.dumps({"collection": col.name, "count": col.count(), "metadata": col.metadata}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
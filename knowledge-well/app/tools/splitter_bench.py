@@ -0,0 +1,80 @@
+"""
+Compare the character splitter with the token/sentence-aware splitter on real files.
+
+    python -m app.tools.splitter_bench ./papers/*.txt
+    python -m app.tools.splitter_bench big.txt --max-tokens 256 --overlap 32
+
+For each splitter it reports the chunk count, MB/s, tokens per chunk (mean and
+max), and how many chunks (and tokens) exceed the model window, i.e. are
+embedded but never seen by the model.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+
+from ..core.config import settings
+from ..services.textsplitter import simple_chunk_text, iter_token_chunks, token_counter
+
+MODEL_WINDOW = 510  # bge-small: 512 minus [CLS]/[SEP]
+
+
+def measure(name: str, chunks_of, paths, count) -> dict:
+    chunks, total_bytes = 0, 0
+    tokens, over, lost, biggest = 0, 0, 0, 0
+    t_split = 0.0
+    for path in paths:
+        total_bytes += os.path.getsize(path)
+        t0 = time.perf_counter()
+        out = list(chunks_of(path))
+        t_split += time.perf_counter() - t0
+        for i in range(0, len(out), 256):
+            for n in count(out[i:i + 256]):
+                tokens += n
+                biggest = max(biggest, n)
+                if n > MODEL_WINDOW:
+                    over += 1
+                    lost += n - MODEL_WINDOW
+        chunks += len(out)
+    return {
+        "splitter": name,
+        "chunks": chunks,
+        "mb_per_s": round(total_bytes / (1024 * 1024) / t_split, 2) if t_split else 0.0,
+        "mean_tokens": round(tokens / chunks, 1) if chunks else 0.0,
+        "max_tokens": biggest,
+        "chunks_over_window": over,
+        "tokens_truncated": lost,
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", nargs="+")
+    ap.add_argument("--chunk-size", type=int, default=settings.CHUNK_SIZE)
+    ap.add_argument("--chunk-overlap", type=int, default=settings.CHUNK_OVERLAP)
+    ap.add_argument("--max-tokens", type=int, default=settings.CHUNK_TOKENS)
+    ap.add_argument("--overlap", type=int, default=settings.CHUNK_OVERLAP_TOKENS)
+    args = ap.parse_args(argv)
+
+    count = token_counter()
+
+    def chars(path):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return simple_chunk_text(f.read(), args.chunk_size, args.chunk_overlap)
+
+    def tokens(path):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield from iter_token_chunks(f, args.max_tokens, args.overlap, count_tokens=count)
+
+    results = [
+        measure(f"chars({args.chunk_size}/{args.chunk_overlap})", chars, args.files, count),
+        measure(f"tokens({args.max_tokens}/{args.overlap})", tokens, args.files, count),
+    ]
+    print(json.dumps({"files": len(args.files), "model": settings.EMBEDDING_MODEL, "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
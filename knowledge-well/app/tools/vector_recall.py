@@ -0,0 +1,90 @@
+"""
+Recall@k and latency of the quantized flat index against exact search, so the
+memory/accuracy trade-off (FLAT_QUANTIZATION, FLAT_RESCORE_FACTOR) is picked
+from our own vectors.
+
+    python -m app.tools.vector_recall -k 5 --queries 200 --rescore 1 2 4 8
+
+Queries are stored vectors sampled from the collection, searched for k+1 hits
+with each one's own row dropped from both the exact and the quantized lists
+(so a trivially found self-match cannot inflate recall), or the texts of
+--questions (JSONL, embedded as queries with the configured model).
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..services.flat_store import FlatVectorStore
+from ..services.batch import read_questions, percentile
+
+
+def _queries(store: FlatVectorStore, n: int, questions_path, seed: int) -> Tuple[np.ndarray, Optional[List[str]]]:
+    """(query vectors, id of each query's own stored row, or None for --questions)."""
+    if questions_path:
+        from ..services.embedder import Embedder
+        with open(questions_path, encoding="utf-8") as f:
+            texts = [q["question"] for q in read_questions(f)]
+        return Embedder(settings.EMBEDDING_MODEL, settings.DEVICE, settings.EMBED_BATCH).embed_queries(texts), None
+    live = store._db.execute("SELECT row, id FROM records ORDER BY row").fetchall()  # deleted rows excluded
+    pick = np.random.default_rng(seed).choice(len(live), size=min(n, len(live)), replace=False)
+    pick.sort()
+    rows = [live[i][0] for i in pick]
+    return np.asarray(store._matrix()[rows]), [live[i][1] for i in pick]
+
+
+def _run(store: FlatVectorStore, queries: np.ndarray, k: int, own: Optional[List[str]]):
+    ids, lat = [], []
+    extra = 1 if own is not None else 0
+    store.search(queries[0], n_results=k + extra)  # builds codes outside the timing
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        res = store.search(q, n_results=k + extra)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        hits = res["ids"][0]
+        ids.append([h for h in hits if own is None or h != own[i]][:k])
+    return ids, lat
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--path", default=settings.FLAT_VECTORSTORE_PATH)
+    ap.add_argument("--collection", default=settings.VECTOR_COLLECTION)
+    ap.add_argument("-k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=200, help="stored vectors to sample as queries")
+    ap.add_argument("--questions", help="JSONL questions to embed and use as queries instead")
+    ap.add_argument("--rescore", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    exact = FlatVectorStore(args.path, args.collection, embedder=None)
+    if not exact.count():
+        print(f"collection '{args.collection}' under {args.path} is empty (see app.tools.export_flat)", file=sys.stderr)
+        return 1
+    queries, own = _queries(exact, args.queries, args.questions, args.seed)
+    truth, lat = _run(exact, queries, args.k, own)
+
+    rows = [{"quantization": "none", "rescore": None, "recall": 1.0,
+             "p50_ms": percentile(lat, 50, 3), "p99_ms": percentile(lat, 99, 3),
+             "memory_bytes": exact.index_info()["float32_bytes"]}]
+    for quant in ("int8", "binary"):
+        for factor in args.rescore:
+            store = FlatVectorStore(args.path, args.collection, embedder=None, quantization=quant, rescore=factor)
+            got, lat = _run(store, queries, args.k, own)
+            recall = float(np.mean([len(set(g) & set(t)) / len(t) for g, t in zip(got, truth) if t]))
+            rows.append({"quantization": quant, "rescore": factor, "recall": round(recall, 4),
+                         "p50_ms": percentile(lat, 50, 3), "p99_ms": percentile(lat, 99, 3),
+                         "memory_bytes": store.index_info()["code_bytes"]})
+
+    print(json.dumps({"collection": args.collection, "count": exact.count(), "k": args.k,
+                      "queries": len(queries), "results": rows}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())